@@ -14,5 +14,6 @@ mkdir -p ${DIST}
 ${ROOT}/${ENV}/bin/python3 ${TEST}/compile.py build_ext --inplace
 mv ${SRC}/*.so ${DIST}
 cp ${SRC}/__init__.py ${DIST}
+cp ${SRC}/__main__.py ${DIST}
 cp ${SRC}/*.xml ${DIST}
 cd ${RUNDIR}
@@ -13,5 +13,6 @@ if not exist %DIST%\nul mkdir %DIST%
 call %ROOT%\%ENV%\Scripts\python %TEST%\compile.py build_ext --inplace
 move /Y %SRC%\*.pyd %DIST%\
 copy /Y %SRC%\__init__.py %DIST%\
+copy /Y %SRC%\__main__.py %DIST%\
 copy /Y %SRC%\*.xml %DIST%\
 cd %RUNDIR%
@@ -1,5 +1,5 @@
 try:
     from Cython.Build import cythonize
-    ext_modules = cythonize(['sic/core.py', 'sic/implicit.py'], compiler_directives={'language_level': '3'})
+    ext_modules = cythonize(['sic/core.py', 'sic/implicit.py', 'sic/kernel.pyx'], compiler_directives={'language_level': '3'})
 except:
     pass
@@ -18,6 +18,9 @@ setup(
     author_email='p.golovatenko@gmail.com',
     packages=['sic'],
     ext_modules=ext_modules,
+    entry_points={
+        'console_scripts': ['sic=sic.__main__:main']
+    },
     include_package_data=True,
     license='MIT',
     platforms=['any'],
@@ -1,2 +1,2 @@
-from .core import Normalizer, Builder, Rule, SplitToken, ReplaceToken, ReplaceCharacter, Model
-from .implicit import __getattr__, build_normalizer, normalize, reset, result, save, load
+from .core import Normalizer, Builder, Rule, SplitToken, ReplaceToken, ReplaceCharacter, Model, CompactTrie, NormalizerResult, NormalizerStats, ColumnarResult
+from .implicit import __getattr__, build_normalizer, normalize, normalize_ex, normalize_parallel, normalize_columnar, normalize_column, normalize_tokens, normalize_stream, anormalize_many, preload, evict, clear, reset, result, save, load
@@ -0,0 +1,206 @@
+import sys
+import io
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from collections import deque
+from .core import Builder, Normalizer, chunk_iterable, init_parallel_worker, run_parallel_worker
+
+BUFFER_SIZE = 1 << 20
+
+def parse_arguments(argv=None):
+    """This function parses command line arguments and returns argparse.Namespace object.
+
+    Args:
+        *argv* is list of command line arguments (defaults to sys.argv[1:])
+    """
+    parser = argparse.ArgumentParser(prog='sic', description='Normalize lines, TSV columns, or JSONL fields read from files or standard input.')
+    parser.add_argument('files', nargs='*', help='input files (standard input if none or "-")')
+    parser.add_argument('-t', '--tokenizer', default=None, help='tokenizer config (XML) to build normalizer with (default is sic/tokenizer.standard.xml)')
+    parser.add_argument('-m', '--model', default=None, help='normalizer saved with sic.Normalizer.save() to use instead of tokenizer config')
+    parser.add_argument('-f', '--format', choices=['lines', 'tsv', 'jsonl'], default='lines', help='input format (default is lines)')
+    parser.add_argument('-c', '--column', type=int, action='append', default=None, help='1-based TSV column to normalize (can be repeated, default is 1)')
+    parser.add_argument('-k', '--field', action='append', default=None, help='JSONL field to normalize (can be repeated, required with -f jsonl)')
+    parser.add_argument('--header', action='store_true', help='pass the first line of each TSV input through as is')
+    parser.add_argument('-w', '--word-separator', default=' ', help='word separator (single character, default is space)')
+    parser.add_argument('-n', '--normalizer-option', type=int, choices=[0, 1, 2, 3], default=0, help='0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)')
+    parser.add_argument('--control-character', default='\x00', help='character masking word separator (single character, default is \\x00)')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='number of worker processes (0 for number of CPUs, default is 1)')
+    parser.add_argument('-b', '--batch-size', type=int, default=10000, help='number of lines read and normalized at once (default is 10000)')
+    parser.add_argument('-o', '--output', default=None, help='output file (standard output if not given)')
+    parser.add_argument('--encoding', default='utf8', help='encoding of input and output (default is utf8)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not report throughput to standard error')
+    args = parser.parse_args(argv)
+    if args.format == 'jsonl' and not args.field:
+        parser.error('-k/--field is required with -f jsonl')
+    if args.column is not None and any([x < 1 for x in args.column]):
+        parser.error('-c/--column must be positive integer')
+    if len(args.word_separator) != 1 or len(args.control_character) != 1:
+        parser.error('word separator and control character must be single characters')
+    if args.workers < 0 or args.batch_size < 1:
+        parser.error('-j/--workers must not be negative, and -b/--batch-size must be positive integer')
+    return args
+
+def read_lines(filenames, encoding):
+    """This generator yields tuple (line, first) for each line (with line break stripped) of each file
+    in *filenames* ("-" is standard input), where "first" is True for the first line of a file.
+
+    Args:
+        *filenames* is list of files to read
+        *encoding* is encoding of the files
+    """
+    for filename in filenames or ['-']:
+        if filename == '-':
+            f = io.open(sys.stdin.fileno(), mode='r', encoding=encoding, buffering=BUFFER_SIZE, closefd=False)
+        else:
+            f = io.open(filename, mode='r', encoding=encoding, buffering=BUFFER_SIZE)
+        with f:
+            first = True
+            for line in f:
+                yield (line[:-1] if line.endswith('\n') else line, first)
+                first = False
+
+def extract_values(lines, args):
+    """This function takes batch of input lines, and returns tuple (records, values) where "records" is list
+    of parsed lines (strings, lists of TSV columns, or decoded JSON objects) and "values" is list of strings
+    to normalize, in the order they are put back by merge_values(). JSONL lines that are not valid JSON
+    are kept as is.
+
+    Args:
+        *lines* is list of tuples (line, first) (see read_lines())
+        *args* is argparse.Namespace object (see parse_arguments())
+    """
+    records, values = [], []
+    if args.format == 'lines':
+        records = [line for (line, _) in lines]
+        values = records
+    elif args.format == 'tsv':
+        columns = [x - 1 for x in args.column or [1]]
+        for (line, first) in lines:
+            record = line.split('\t')
+            if first and args.header:
+                record = None
+            else:
+                values.extend([record[x] for x in columns if x < len(record)])
+            records.append((line, record))
+    else:
+        for (line, _) in lines:
+            try:
+                record = json.loads(line) if line.strip() != '' else None
+            except ValueError:
+                # malformed line is passed through as is, same as any record that is not JSON object
+                record = None
+            if isinstance(record, dict):
+                values.extend([record[x] for x in args.field if isinstance(record.get(x), str)])
+            records.append((line, record))
+    return (records, values)
+
+def merge_values(records, normalized, args):
+    """This function puts normalized values back to the records returned by extract_values(),
+    and returns output lines as one string.
+
+    Args:
+        *records* is list of parsed lines
+        *normalized* is list of normalized values
+        *args* is argparse.Namespace object (see parse_arguments())
+    """
+    if args.format == 'lines':
+        return '\n'.join(normalized) + '\n' if len(normalized) > 0 else ''
+    ret = []
+    normalized = iter(normalized)
+    if args.format == 'tsv':
+        columns = [x - 1 for x in args.column or [1]]
+        for (line, record) in records:
+            if record is None:
+                ret.append(line)
+                continue
+            for x in columns:
+                if x < len(record):
+                    record[x] = next(normalized)
+            ret.append('\t'.join(record))
+    else:
+        for (line, record) in records:
+            if not isinstance(record, dict):
+                ret.append(line)
+                continue
+            for x in args.field:
+                if isinstance(record.get(x), str):
+                    record[x] = next(normalized)
+            ret.append(json.dumps(record, ensure_ascii=False))
+    return '\n'.join(ret) + '\n' if len(ret) > 0 else ''
+
+def run(normalizer, args, output):
+    """This function normalizes input described by *args* with *normalizer*, writes the result to *output*,
+    and returns tuple (lines, values, characters) with numbers of lines read, values normalized, and characters
+    in normalized values. With more than one worker, batches are normalized in a pool of worker processes;
+    no more than two batches per worker are in flight at once, and output keeps the order of input.
+
+    Args:
+        *normalizer* is sic.Normalizer object
+        *args* is argparse.Namespace object (see parse_arguments())
+        *output* is text stream to write to
+    """
+    (lines, values, characters) = (0, 0, 0)
+    batches = chunk_iterable(read_lines(args.files, args.encoding), args.batch_size)
+    task_args = (args.word_separator, args.normalizer_option, args.control_character, False)
+    if args.workers == 1:
+        for batch in batches:
+            (records, strings) = extract_values(batch, args)
+            normalized = list(normalizer.normalize_batch(strings, *task_args))
+            output.write(merge_values(records, normalized, args))
+            (lines, values, characters) = (lines + len(batch), values + len(strings), characters + sum([len(x) for x in strings]))
+        return (lines, values, characters)
+    workers = args.workers or os.cpu_count() or 1
+    pending = deque()
+    with multiprocessing.Pool(workers, initializer=init_parallel_worker, initargs=(normalizer.tokenizer_name, normalizer.content)) as pool:
+        for batch in batches:
+            (records, strings) = extract_values(batch, args)
+            pending.append((records, pool.apply_async(run_parallel_worker, ((strings,) + task_args,))))
+            (lines, values, characters) = (lines + len(batch), values + len(strings), characters + sum([len(x) for x in strings]))
+            while len(pending) > 2 * workers:
+                (records, result) = pending.popleft()
+                output.write(merge_values(records, result.get(), args))
+        while len(pending) > 0:
+            (records, result) = pending.popleft()
+            output.write(merge_values(records, result.get(), args))
+    return (lines, values, characters)
+
+def main(argv=None):
+    """This function is entry point of command line interface (python -m sic, or sic console script).
+    It returns exit code.
+
+    Args:
+        *argv* is list of command line arguments (defaults to sys.argv[1:])
+    """
+    args = parse_arguments(argv)
+    if args.model is not None:
+        normalizer = Normalizer()
+        normalizer.load(args.model)
+    else:
+        normalizer = Builder().build_normalizer(args.tokenizer)
+    normalizer.check_arguments(args.word_separator, args.control_character)
+    if args.output is None:
+        output = io.open(sys.stdout.fileno(), mode='w', encoding=args.encoding, buffering=BUFFER_SIZE, closefd=False)
+    else:
+        output = io.open(args.output, mode='w', encoding=args.encoding, buffering=BUFFER_SIZE)
+    started = time.perf_counter()
+    try:
+        with output:
+            (lines, values, characters) = run(normalizer, args, output)
+    except BrokenPipeError:
+        # reader has gone away (e.g. output piped to head), nothing is left to report
+        sys.stderr.close()
+        return 1
+    duration = time.perf_counter() - started
+    if not args.quiet:
+        sys.stderr.write(
+            'sic: normalized %d values (%d characters) in %d lines in %.3f seconds (%.0f lines/s, %.0f characters/s)\n' % (
+                values, characters, lines, duration, lines / duration if duration > 0 else 0, characters / duration if duration > 0 else 0
+            )
+        )
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -30,11 +30,20 @@ cdef class Normalizer():
     cdef public bint verbose
     cdef public logger
     cdef public str tokenizer_name
-    cdef public dict content
-    cdef public dict normalizer_result
+    cdef public object content
+    cdef public object normalizer_result
+    cdef public str engine
+    cdef public tuple automaton
+    cdef public tuple flat_trie
+    cdef public bytes char_classes
+    cdef public tuple replacement_index
+    cdef public object cache
+    cdef public object instrumentation
 
     @cython.locals(
-        next_nodes=cython.set
+        reachable=cython.dict,
+        stack=cython.list,
+        node=cython.str
     )
     cpdef set expand_instruction(
         self,
@@ -45,8 +54,26 @@ cdef class Normalizer():
     )
 
     @cython.locals(
-        ret=cython.str,
+        resolved=cython.dict,
+        visiting=cython.set,
+        seed=cython.str,
+        stack=cython.list,
+        node=cython.str,
+        depth=cython.int,
+        next_node=cython.str,
+        terminals=cython.dict,
+        x=cython.str,
+        y=cython.str
+    )
+    cpdef dict resolve_instructions(
+        self,
+        dict g
+    )
+
+    @cython.locals(
+        ret=cython.list,
         replacements=cython.dict,
+        resolved=cython.dict,
         line=cython.str,
         action=cython.str,
         parameter=cython.str,
@@ -59,7 +86,6 @@ cdef class Normalizer():
     )
 
     @cython.locals(
-        updated = cython.str,
         x = cython.str
     )
     cpdef str update_str_with_chmap(
@@ -78,7 +104,8 @@ cdef class Normalizer():
         parameter_key=cython.str,
         parameter_keylet=cython.str,
         parameter_value=cython.str,
-        subtrie=cython.dict
+        subtrie=cython.dict,
+        compacted=cython.bint
     )
     cpdef bint make_tokenizer(
         self,
@@ -86,6 +113,161 @@ cdef class Normalizer():
         bint update=*
     )
 
+    @cython.locals(
+        ret=cython.dict,
+        line=cython.str,
+        rule=cython.tuple
+    )
+    cpdef list parse_rules(
+        self,
+        rules
+    )
+
+    @cython.locals(
+        special=cython.tuple,
+        targets=cython.dict,
+        sources=cython.dict,
+        nodes=cython.dict,
+        stack=cython.list,
+        path=cython.str,
+        node=cython.dict
+    )
+    cpdef tuple index_replacements(
+        self
+    )
+
+    @cython.locals(
+        seen=cython.set
+    )
+    cpdef str resolve_replacement(
+        self,
+        str token,
+        dict targets
+    )
+
+    @cython.locals(
+        targets=cython.dict,
+        sources=cython.dict,
+        nodes=cython.dict,
+        queue=cython.list,
+        seen=cython.set
+    )
+    cpdef bint update_replacements(
+        self,
+        str token
+    ) except *
+
+    cpdef bint merge_subtries(
+        self,
+        dict source,
+        dict target
+    ) except *
+
+    @cython.locals(
+        chmap=cython.dict,
+        special=cython.tuple,
+        stack=cython.list,
+        node=cython.dict,
+        subtrie=cython.dict
+    )
+    cpdef bint replace_character(
+        self,
+        str parameter,
+        str subject
+    ) except *
+
+    @cython.locals(
+        actions=cython.dict,
+        compacted=cython.bint,
+        trie=cython.dict,
+        action=cython.str,
+        parameter=cython.str,
+        subject=cython.str,
+        subtrie=cython.dict,
+        targets=cython.dict,
+        sources=cython.dict,
+        nodes=cython.dict,
+        token=cython.str,
+        target=cython.str,
+        chain=cython.str
+    )
+    cpdef bint add_rules(
+        self,
+        rules
+    ) except *
+
+    @cython.locals(
+        actions=cython.dict,
+        compacted=cython.bint,
+        trie=cython.dict,
+        action=cython.str,
+        parameter=cython.str,
+        subject=cython.str,
+        path=cython.list,
+        targets=cython.dict,
+        sources=cython.dict,
+        nodes=cython.dict,
+        token=cython.str,
+        i=cython.int
+    )
+    cpdef bint remove_rules(
+        self,
+        rules
+    ) except *
+
+    cpdef bint compact(
+        self
+    ) except *
+
+    @cython.locals(
+        chmap=cython.dict,
+        links=cython.dict,
+        special=cython.tuple,
+        chmap_table=cython.dict,
+        stack=cython.list,
+        node=cython.dict,
+        depth=cython.int,
+        head=cython.int,
+        rescan=cython.dict,
+        stopped=cython.bint,
+        x=cython.str
+    )
+    cpdef tuple compile_automaton(
+        self
+    )
+
+    @cython.locals(
+        chmap=cython.dict,
+        classes=cython.bytes,
+        table=cython.bytearray,
+        x=cython.str
+    )
+    cpdef bytes compile_char_classes(
+        self
+    )
+
+    @cython.locals(
+        i=cython.int,
+        x=cython.str
+    )
+    cpdef tuple compile_kernel(
+        self
+    )
+
+    @cython.locals(
+        originals=cython.list,
+        offsets=cython.list,
+        positions=cython.list,
+        i=cython.int
+    )
+    cpdef tuple map_positions(
+        self,
+        str parsed_string,
+        str original_string,
+        dict chmap,
+        dict chmap_table
+    )
+
     cpdef int chargroup(
         self,
         str s
@@ -99,21 +281,241 @@ cdef class Normalizer():
     )
 
     @cython.locals(
-        ret=cython.list,
+        i=cython.int
+    )
+    cpdef list reverse_map(
+        self,
+        list m
+    )
+
+    cpdef bint check_arguments(
+        self,
+        str word_separator,
+        str control_character
+    ) except *
+
+    @cython.locals(
+        settings=cython.dict,
+        bypass=cython.bint,
+        case_sensitive=cython.bint
+    )
+    cpdef tuple read_settings(
+        self
+    )
+
+    @cython.locals(
+        cache_key=cython.tuple
+    )
+    cpdef str normalize(
+        self,
+        str source_string,
+        str word_separator=*,
+        int normalizer_option=*,
+        str control_character=*,
+        bint with_map=*
+    )
+
+    @cython.locals(
+        module=cython.str,
+        codes=object,
+        normalized=cython.list
+    )
+    cpdef normalize_column(
+        self,
+        column,
+        str word_separator=*,
+        int normalizer_option=*,
+        str control_character=*,
+        workers=*,
+        int chunksize=*
+    )
+
+    @cython.locals(
+        strings=cython.list
+    )
+    cpdef list normalize_distinct(
+        self,
+        list uniques,
+        str word_separator,
+        int normalizer_option,
+        str control_character,
+        workers,
+        int chunksize
+    )
+
+    @cython.locals(
+        data=cython.bytearray,
+        normalized=cython.str,
+        f_map=cython.list
+    )
+    cpdef normalize_columnar(
+        self,
+        source_strings,
+        str word_separator=*,
+        int normalizer_option=*,
+        str control_character=*,
+        bint with_map=*
+    )
+
+    @cython.locals(
+        chmap=cython.dict,
+        stack=cython.list,
+        node=cython.dict
+    )
+    cpdef bint splits_at(
+        self,
+        str word_separator
+    ) except *
+
+    @cython.locals(
+        i=cython.int,
+        head=cython.str,
+        tail_fragment=cython.str,
+        tail_length=cython.int,
+        fragment=cython.str,
+        f_map=cython.list
+    )
+    cpdef tuple joint_of(
+        self,
+        str tail,
+        str segment,
+        str word_separator,
+        int normalizer_option,
+        str control_character,
+        bint case_sensitive
+    )
+
+    @cython.locals(
+        i=cython.int
+    )
+    cpdef str tail_of(
+        self,
+        str segment,
+        str word_separator,
+        int normalizer_option,
+        str control_character,
+        bint case_sensitive
+    )
+
+    @cython.locals(
+        bypass=cython.bint,
+        case_sensitive=cython.bint,
+        normalized=cython.str,
+        f_map=cython.list
+    )
+    cpdef normalize_ex(
+        self,
+        str source_string,
+        str word_separator=*,
+        int normalizer_option=*,
+        str control_character=*,
+        bint with_map=*,
+        list counters=*
+    )
+
+    @cython.locals(
+        bypass=cython.bint,
+        case_sensitive=cython.bint,
+        fragment=cython.str,
+        f_map=cython.list,
+        total_length=cython.int
+    )
+    cpdef normalize_tokens(
+        self,
+        str source_string,
+        str word_separator=*,
+        int normalizer_option=*,
+        str control_character=*,
+        bint as_arrays=*
+    )
+
+    @cython.locals(
+        kept=cython.list,
+        n=cython.int,
+        spans=cython.list,
         i=cython.int,
         j=cython.int,
+        tokens=cython.list,
+        starts=cython.list,
+        ends=cython.list,
+        rest=cython.int,
+        next_start=cython.int,
+        token_map=cython.list,
+        last=cython.int,
+        end=cython.int,
+        seen=cython.dict,
         k=cython.int
     )
-    cpdef list reverse_map(
+    cpdef tuple split_tokens(
         self,
-        list m
+        str source_string,
+        str fragment,
+        list f_map,
+        str word_separator,
+        int normalizer_option,
+        str control_character,
+        int total_length
+    )
+
+    cpdef bint set_cache(
+        self,
+        int cache_size,
+        str cache_policy=*
+    ) except *
+
+    cpdef dict cache_info(
+        self
+    )
+
+    cpdef bint set_instrumentation(
+        self,
+        bint enabled=*,
+        callback=*,
+        int slowest=*
+    ) except *
+
+    @cython.locals(
+        ret=cython.dict
+    )
+    cpdef dict stats(
+        self,
+        bint reset=*
+    )
+
+    @cython.locals(
+        fragment=cython.str,
+        f_map=cython.list,
+        total_length=cython.int
+    )
+    cpdef tuple scan(
+        self,
+        str source_string,
+        str word_separator,
+        int normalizer_option,
+        str control_character,
+        bint case_sensitive,
+        bint with_map=*,
+        list counters=*
     )
 
     @cython.locals(
         original_string=cython.str,
         parsed_string=cython.str,
-        subtrie=cython.dict,
-        this_fragment=cython.str,
+        chmap=cython.dict,
+        separators=cython.tuple,
+        flat_trie=cython.tuple,
+        scanned=cython.tuple,
+        char_classes=cython.bytes,
+        classes=cython.bytes,
+        automaton=cython.tuple,
+        links=cython.dict,
+        mapped_original=cython.str,
+        mapped_offsets=cython.list,
+        mapped_positions=cython.list,
+        depth=cython.int,
+        head=cython.int,
+        next_index=cython.int,
+        this_fragment=cython.list,
         buffer=cython.str,
         last_buffer=cython.str,
         last_replacement=cython.str,
@@ -133,26 +535,48 @@ cdef class Normalizer():
         on_the_left=cython.bint,
         on_the_right=cython.bint,
         added_separator=cython.bint,
-        normalized=cython.str,
+        steps=cython.int,
+        backtracks=cython.int,
+        replacements=cython.int,
+        splits=cython.int,
+        rescanned=cython.int,
         i=cython.int,
         x=cython.str
     )
-    cpdef str normalize(
+    cpdef tuple scan_fragment(
         self,
         str source_string,
-        str word_separator=*,
-        int normalizer_option=*,
-        str control_character=*
+        str word_separator,
+        int normalizer_option,
+        str control_character,
+        bint case_sensitive,
+        bint with_map=*,
+        list counters=*
+    )
+
+    cpdef tuple finish_scan(
+        self,
+        str normalized,
+        list f_map,
+        str word_separator,
+        int normalizer_option,
+        str control_character,
+        int total_length
     )
 
     cpdef save(
         self,
-        str filename
+        str filename,
+        bint pickled=*
     )
 
+    @cython.locals(
+        magic=cython.bytes
+    )
     cpdef load(
         self,
-        str filename
+        str filename,
+        bint mapped=*
     )
 
 cdef class Builder():
@@ -160,6 +584,15 @@ cdef class Builder():
     cdef public bint debug
     cdef public bint verbose
     cdef public logger
+    cdef public str cache_dir
+    cdef public int cache_size
+    cdef public list imports
+
+    cpdef bint emit_rule(
+        self,
+        element,
+        dict rules
+    ) except *
 
     cpdef bint wrap_result(
         self,
@@ -172,7 +605,11 @@ cdef class Builder():
     )
 
     @cython.locals(
-        result=cython.dict
+        result=cython.dict,
+        path=cython.str,
+        depth=cython.int,
+        event=cython.str,
+        import_filename=cython.str
     )
     cpdef dict convert_xml(
         self,
@@ -182,11 +619,7 @@ cdef class Builder():
     )
 
     @cython.locals(
-        data=cython.dict,
-        ret=cython.str,
-        key=cython.str,
-        prop=cython.str,
-        value=cython.str
+        data=cython.dict
     )
     cpdef tuple expose_tokenizer(
         self,
@@ -194,8 +627,68 @@ cdef class Builder():
     )
 
     @cython.locals(
+        rules=cython.dict,
+        cs=cython.list,
+        rule=cython.tuple,
+        ret=cython.list,
+        key=cython.str
+    )
+    cpdef str dump_rules(
+        self,
+        dict data,
+        str file_xml
+    )
+
+    @cython.locals(
+        chunk=cython.bytes
+    )
+    cpdef str hash_file(
+        self,
+        str filename
+    )
+
+    @cython.locals(
+        content=cython.str
+    )
+    cpdef str cache_key(
+        self,
+        endpoint
+    )
+
+    @cython.locals(
+        manifest_filename=cython.str,
+        manifest=cython.dict,
+        root=cython.str,
+        filename=cython.str,
+        digest=cython.str
+    )
+    cpdef load_cached(
+        self,
+        str key,
+        endpoint
+    )
+
+    @cython.locals(
+        root=cython.str,
+        manifest=cython.dict,
+        temp_filename=cython.str,
+        manifests=cython.list,
+        filename=cython.str
+    )
+    cpdef bint store_cached(
+        self,
+        str key,
+        endpoint,
+        machine,
+        list imports
+    ) except *
+
+    @cython.locals(
+        key=cython.str,
+        imports=cython.list,
         batch_name=cython.str,
         data=cython.str,
+        xml_data=cython.dict,
         built=cython.bint
     )
     cpdef build_normalizer(
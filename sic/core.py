@@ -2,6 +2,25 @@ import os
 import xml.etree.ElementTree as et
 import logging
 import pickle
+import multiprocessing
+import bisect
+import mmap
+import json
+import struct
+import sys
+import tempfile
+import hashlib
+import asyncio
+import concurrent.futures
+import heapq
+import time
+from array import array
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+try:
+    from .kernel import scan as kernel_scan
+except ImportError:
+    kernel_scan = None
 
 class Rule():
     """Generic tokenization rule for ad hoc model creation."""
@@ -91,10 +110,614 @@ class Model():
                     if len(self.rules[rule.action]) == 0:
                         del self.rules[rule.action]
 
+class CompactTrie():
+    """This class represents trie compiled into flat arrays. It can be used instead of nested dictionary
+    structure built by Normalizer.make_tokenizer() (see Normalizer.compact()), and supports same lookups.
+
+    Nodes are numbered in breadth-first order (root is node 0); outgoing edges of node *n* are stored
+    in edge_chars (sorted code points, or -1 - i for edges labelled with multicharacter strings[i])
+    and edge_targets (node numbers) at positions first_edge[n] to first_edge[n+1]; actions of node *n*
+    are stored as bit flags at flags[n] (see CompactTrie.action_flags), and replacement token of node *n*
+    is strings[replacements[n]] (replacements[n] is -1 if there is none).
+    """
+
+    action_flags = {'~_': 1, '~l': 2, '~m': 4, '~r': 8}
+    magic = b'SICM'
+    version = 1
+
+    def __init__(self, trie=None):
+        self.settings = dict()
+        self.chmap = dict()
+        self.first_edge = array('i', [0])
+        self.edge_chars = array('i')
+        self.edge_targets = array('i')
+        self.flags = array('B')
+        self.replacements = array('i')
+        self.strings = []
+        self.filename = None
+        self.buffer = None
+        if trie is not None:
+            self.compile(trie)
+
+    def __getstate__(self):
+        if self.filename is not None:
+            # memory-mapped trie is passed around as filename, so that other processes map the same pages
+            return {'filename': self.filename}
+        return self.__dict__
+
+    def __setstate__(self, state):
+        if 'filename' in state and len(state) == 1:
+            self.__init__()
+            self.read(state['filename'], True)
+        else:
+            self.__dict__.update(state)
+
+    def __contains__(self, key):
+        if key == '_settings' or key == '_chmap':
+            return True
+        return self.find(0, key) > -1
+
+    def __getitem__(self, key):
+        if key == '_settings':
+            return self.settings
+        if key == '_chmap':
+            return self.chmap
+        state = self.find(0, key)
+        if state == -1:
+            raise KeyError(key)
+        return CompactNode(self, state)
+
+    def __len__(self):
+        return len(self.flags)
+
+    def compile(self, trie):
+        """This function populates arrays with the content of *trie* (nested dictionary structure
+        built by Normalizer.make_tokenizer()).
+
+        Args:
+            *trie* is dict object to compile
+        """
+        self.settings = dict(trie['_settings']) if '_settings' in trie else dict()
+        self.chmap = dict(trie['_chmap']) if '_chmap' in trie else dict()
+        first_edge, edge_chars, edge_targets, flags, replacements = [0], [], [], [], []
+        strings, string_ids = [], dict()
+        nodes = [trie]
+        i = 0
+        while i < len(nodes):
+            node = nodes[i]
+            flag, replacement, edges = 0, -1, []
+            for key in node:
+                if (i == 0 and key in ('_settings', '_chmap')) or key == '~=':
+                    continue
+                if key not in self.action_flags and len(key) == 1:
+                    edges.append((ord(key), node[key]))
+                    continue
+                if key in self.action_flags:
+                    flag |= self.action_flags[key]
+                    if key != '~_':
+                        continue
+                value = node[key] if key == '~_' else key
+                if value not in string_ids:
+                    string_ids[value] = len(strings)
+                    strings.append(value)
+                if key == '~_':
+                    replacement = string_ids[value]
+                else:
+                    edges.append((-1 - string_ids[value], node[key]))
+            for (code, child) in sorted(edges, key=lambda x: x[0]):
+                edge_chars.append(code)
+                edge_targets.append(len(nodes))
+                nodes.append(child)
+            first_edge.append(len(edge_chars))
+            flags.append(flag)
+            replacements.append(replacement)
+            i += 1
+        self.first_edge = array('i', first_edge)
+        self.edge_chars = array('i', edge_chars)
+        self.edge_targets = array('i', edge_targets)
+        self.flags = array('B', flags)
+        self.replacements = array('i', replacements)
+        self.strings = strings
+        return True
+
+    def decompile(self):
+        """This function converts arrays back into nested dictionary structure and returns it."""
+        trie = {'_settings': dict(self.settings), '_chmap': dict(self.chmap)}
+        nodes = [trie]
+        for i in range(len(self.flags)):
+            node = nodes[i]
+            for key in self.action_flags:
+                if self.flags[i] & self.action_flags[key]:
+                    node[key] = self.strings[self.replacements[i]] if key == '~_' else ''
+            for j in range(self.first_edge[i], self.first_edge[i+1]):
+                child = dict()
+                node[chr(self.edge_chars[j]) if self.edge_chars[j] > -1 else self.strings[-1 - self.edge_chars[j]]] = child
+                nodes.append(child)
+        return trie
+
+    def write(self, filename):
+        """This function writes trie to binary model file (written to temporary file first, then moved to *filename*).
+
+        File layout:
+            4 bytes => magic string b'SICM'
+            4 bytes => format version (unsigned int, little-endian)
+            4 bytes => length of header (unsigned int, little-endian)
+            header => JSON object with byte order, settings, character map, and sections (name => [offset, length, typecode])
+            sections => arrays first_edge, edge_chars, edge_targets, flags, replacements, string_offsets, and string_data
+                (UTF-8 encoded strings), each aligned to 8 bytes; offsets are relative to the end of header (aligned to 8 bytes)
+
+        Args:
+            *filename* is path/filename to write trie to
+        """
+        encoded = [self.strings[i].encode('utf8') for i in range(len(self.strings))]
+        string_offsets = array('i', [0])
+        for x in encoded:
+            string_offsets.append(string_offsets[-1] + len(x))
+        sections = [
+            ('first_edge', 'i', self.first_edge),
+            ('edge_chars', 'i', self.edge_chars),
+            ('edge_targets', 'i', self.edge_targets),
+            ('flags', 'B', self.flags),
+            ('replacements', 'i', self.replacements),
+            ('string_offsets', 'i', string_offsets),
+            ('string_data', 'B', b''.join(encoded))
+        ]
+        chunks, offset, layout = [], 0, dict()
+        for (name, typecode, data) in sections:
+            chunk = bytes(data)
+            layout[name] = [offset, len(chunk), typecode]
+            chunks.append(chunk + b'\x00' * (-len(chunk) % 8))
+            offset += len(chunks[-1])
+        header = json.dumps({'byteorder': sys.byteorder, 'itemsize': array('i').itemsize, 'settings': self.settings, 'chmap': self.chmap, 'sections': layout}).encode('utf8')
+        preamble = self.magic + struct.pack('<II', self.version, len(header)) + header
+        (handle, temp_filename) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)))
+        with os.fdopen(handle, mode='wb') as f:
+            f.write(preamble + b'\x00' * (-len(preamble) % 8))
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(temp_filename, filename)
+        return True
+
+    def read(self, filename, mapped=False):
+        """This function reads trie from binary model file. When *mapped* is True, the file is memory-mapped
+        and arrays are queried in place (pages are shared by all processes that map the same file, and the file
+        must not be removed or overwritten while in use on Windows); otherwise, arrays are copied to memory.
+
+        Args:
+            *filename* is path/filename to read trie from
+            *mapped*: when True, the file is memory-mapped rather than read
+        """
+        with open(filename, mode='rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if mapped else f.read()
+        view = memoryview(buffer)
+        if bytes(view[0:len(self.magic)]) != self.magic:
+            raise ValueError('File %s is not a sic model file' % (filename))
+        (version, header_length) = struct.unpack('<II', view[4:12])
+        if version != self.version:
+            raise ValueError('File %s has unsupported model format version %d (expected %d)' % (filename, version, self.version))
+        header = json.loads(bytes(view[12:12+header_length]).decode('utf8'))
+        if header['itemsize'] != array('i').itemsize:
+            raise ValueError('File %s was written on a platform with incompatible integer size' % (filename))
+        swap = header['byteorder'] != sys.byteorder
+        data_start = 12 + header_length + (-(12 + header_length) % 8)
+        sections = dict()
+        for name in header['sections']:
+            (offset, length, typecode) = header['sections'][name]
+            section = view[data_start+offset:data_start+offset+length]
+            if name == 'string_data':
+                sections[name] = section if mapped else bytes(section)
+            elif mapped and not swap:
+                sections[name] = section.cast(typecode)
+            else:
+                sections[name] = array(typecode)
+                sections[name].frombytes(section)
+                if swap:
+                    sections[name].byteswap()
+        self.settings = header['settings']
+        self.chmap = header['chmap']
+        self.first_edge = sections['first_edge']
+        self.edge_chars = sections['edge_chars']
+        self.edge_targets = sections['edge_targets']
+        self.flags = sections['flags']
+        self.replacements = sections['replacements']
+        self.strings = StringTable(sections['string_data'], sections['string_offsets'])
+        self.filename = os.path.abspath(filename) if mapped else None
+        self.buffer = buffer if mapped else None
+        return True
+
+    def find(self, state, character):
+        """This function returns number of node reached from node *state* by *character*, or -1 if there is no such edge."""
+        lo, hi = self.first_edge[state], self.first_edge[state+1]
+        if len(character) != 1:
+            for i in range(lo, hi):
+                if self.edge_chars[i] > -1:
+                    break
+                if self.strings[-1 - self.edge_chars[i]] == character:
+                    return self.edge_targets[i]
+            return -1
+        code = ord(character)
+        i = bisect.bisect_left(self.edge_chars, code, lo, hi)
+        if i < hi and self.edge_chars[i] == code:
+            return self.edge_targets[i]
+        return -1
+
+class StringTable():
+    """This class is read-only list of strings stored in a buffer as UTF-8 encoded bytes (see CompactTrie.read()).
+    Strings are decoded on first access.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+        self.decoded = dict()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i not in self.decoded:
+            if i < 0 or i >= len(self.offsets) - 1:
+                raise IndexError('string index out of range')
+            self.decoded[i] = bytes(self.data[self.offsets[i]:self.offsets[i+1]]).decode('utf8')
+        return self.decoded[i]
+
+class CompactNode():
+    """This class is lightweight view of a node in CompactTrie that supports same lookups as nested dictionary."""
+
+    __slots__ = ('trie', 'state')
+
+    def __init__(self, trie, state):
+        self.trie = trie
+        self.state = state
+
+    def __contains__(self, key):
+        if key in CompactTrie.action_flags:
+            return self.trie.flags[self.state] & CompactTrie.action_flags[key] != 0
+        return self.trie.find(self.state, key) > -1
+
+    def __getitem__(self, key):
+        if key in CompactTrie.action_flags:
+            if self.trie.flags[self.state] & CompactTrie.action_flags[key] == 0:
+                raise KeyError(key)
+            return self.trie.strings[self.trie.replacements[self.state]] if key == '~_' else ''
+        state = self.trie.find(self.state, key)
+        if state == -1:
+            raise KeyError(key)
+        return CompactNode(self.trie, state)
+
+class ResultCache():
+    """This class is bounded cache of normalization results used by Normalizer.normalize().
+    When the cache is full, either least recently used ('lru') or oldest ('fifo') entry is evicted.
+    """
+
+    policies = ('lru', 'fifo')
+
+    def __init__(self, size, policy='lru'):
+        assert size > 0, 'cache size must be positive integer'
+        assert policy in self.policies, 'cache policy must be one of: %s' % (', '.join(self.policies))
+        self.size = size
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """This function returns cached value for *key* (or None if there is none) and updates counters."""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.policy == 'lru':
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """This function caches *value* for *key*, evicting entries if the cache is full."""
+        self.entries[key] = value
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key):
+        """This function removes entry for *key* and returns its value (or None if there is none)."""
+        return self.entries.pop(key, None)
+
+    def clear(self):
+        """This function removes all entries (counters are kept)."""
+        self.entries.clear()
+
+    def info(self):
+        """This function returns dictionary with cache parameters and counters."""
+        return {
+            'size': self.size,
+            'policy': self.policy,
+            'length': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+class NormalizerStats():
+    """This class collects metrics of Normalizer.normalize() calls when instrumentation is enabled
+    (see Normalizer.set_instrumentation()): totals of scanner counters, histogram of latencies,
+    and the slowest inputs with arguments they were normalized with.
+    Scanner counters (in order of Normalizer.scan_fragment() *counters*) are:
+        characters => characters read by the scanner (including those read again after backtracks)
+        steps => steps taken along the trie
+        backtracks => times the scanner went back to potential head of a token after partial match failed
+        replacements => token replacements applied
+        splits => split rules applied
+    """
+
+    counters = ('characters', 'steps', 'backtracks', 'replacements', 'splits')
+
+    def __init__(self, slowest=0, callback=None):
+        assert slowest >= 0, 'number of slowest inputs to keep must not be negative'
+        assert callback is None or callable(callback), 'callback must be callable'
+        self.slowest = slowest
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        """This function resets all metrics."""
+        self.calls = 0
+        self.cached = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.totals = [0] * len(self.counters)
+        self.histogram = dict()
+        self.slowest_inputs = []
+
+    @staticmethod
+    def bucket(nanoseconds):
+        """This function returns index of latency histogram bucket for *nanoseconds*. There are 4 buckets
+        per power of 2, so latency is known within 25%.
+        """
+        n = nanoseconds.bit_length()
+        if n < 3:
+            return nanoseconds
+        return (n - 2) * 4 + ((nanoseconds >> (n - 3)) & 3)
+
+    @staticmethod
+    def bounds(bucket):
+        """This function returns tuple (lowest, highest) of nanoseconds that fall into latency histogram *bucket*
+        (the highest is not included).
+        """
+        if bucket < 4:
+            return (bucket, bucket + 1)
+        shift = bucket // 4 - 1
+        return ((4 + bucket % 4) << shift, (5 + bucket % 4) << shift)
+
+    def record(self, source_string, arguments, counters, seconds, cached):
+        """This function adds metrics of one call, and passes them to callback (if any).
+
+        Args:
+            *source_string* is input string
+            *arguments* is tuple (word_separator, normalizer_option, control_character, with_map) of the call
+            *counters* is list of scanner counters of the call
+            *seconds* is duration of the call
+            *cached*: when True, result was taken from result cache
+        """
+        self.calls += 1
+        self.cached += int(cached)
+        self.seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        for i in range(len(self.totals)):
+            self.totals[i] += counters[i]
+        bucket = self.bucket(int(seconds * 1e9))
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+        if self.slowest > 0 and (len(self.slowest_inputs) < self.slowest or seconds > self.slowest_inputs[0][0]):
+            # min-heap keeps the fastest of the slowest inputs on top, calls counter breaks ties
+            entry = (seconds, self.calls, source_string, arguments, tuple(counters), cached)
+            if len(self.slowest_inputs) < self.slowest:
+                heapq.heappush(self.slowest_inputs, entry)
+            else:
+                heapq.heapreplace(self.slowest_inputs, entry)
+        if self.callback is not None:
+            self.callback(source_string, self.metrics(len(source_string), counters, seconds, cached))
+
+    def metrics(self, length, counters, seconds, cached):
+        """This function returns dictionary with metrics of one call (see self.record())."""
+        ret = {'length': length, 'seconds': seconds, 'cached': cached}
+        ret.update(zip(self.counters, counters))
+        return ret
+
+    def percentile(self, q):
+        """This function returns upper bound of latency (in seconds) that *q* (fraction) of calls did not exceed."""
+        if self.calls == 0:
+            return 0.0
+        count = 0
+        for bucket in sorted(self.histogram):
+            count += self.histogram[bucket]
+            if count >= q * self.calls:
+                return min(self.bounds(bucket)[1] / 1e9, self.max_seconds)
+        return self.max_seconds
+
+    def info(self):
+        """This function returns dictionary with numbers of calls (and of those served by result cache),
+        totals of scanner counters, latency statistics (in seconds), latency histogram as list of tuples
+        (lowest, highest, calls), and the slowest inputs (slowest first) as list of dictionaries with
+        input string, arguments, and metrics of the call.
+        """
+        ret = {
+            'calls': self.calls,
+            'cached': self.cached,
+            'seconds': self.seconds,
+            'mean': self.seconds / self.calls if self.calls > 0 else 0.0,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': self.max_seconds
+        }
+        ret.update(zip(self.counters, self.totals))
+        ret['histogram'] = [tuple([x / 1e9 for x in self.bounds(bucket)]) + (self.histogram[bucket],) for bucket in sorted(self.histogram)]
+        ret['slowest'] = []
+        for (seconds, _, source_string, arguments, counters, cached) in sorted(self.slowest_inputs, reverse=True):
+            entry = {'source_string': source_string, 'word_separator': arguments[0], 'normalizer_option': arguments[1], 'control_character': arguments[2], 'with_map': arguments[3]}
+            entry.update(self.metrics(len(source_string), counters, seconds, cached))
+            ret['slowest'].append(entry)
+        return ret
+
+class NormalizerResult(Mapping):
+    """This class is immutable dictionary-like result of normalization (see Normalizer.result) with keys 'original',
+    'normalized', 'map', and 'r_map'. Character location maps are kept in typed arrays and exposed as read-only
+    memoryviews ('r_map' is two-dimensional, with pair of indexes per character of original string); 'r_map'
+    is computed on first access.
+    """
+
+    __slots__ = ('original', 'normalized', 'f_map', 'r_map')
+
+    fields = ('original', 'normalized', 'map', 'r_map')
+
+    def __init__(self, original='', normalized='', f_map=None):
+        object.__setattr__(self, 'original', original)
+        object.__setattr__(self, 'normalized', normalized)
+        object.__setattr__(self, 'f_map', f_map if f_map is not None else array('l'))
+        object.__setattr__(self, 'r_map', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('NormalizerResult object is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('NormalizerResult object is immutable')
+
+    def __reduce__(self):
+        return (NormalizerResult, (self.original, self.normalized, self.f_map))
+
+    def __getitem__(self, key):
+        if key == 'original':
+            return self.original
+        if key == 'normalized':
+            return self.normalized
+        if key == 'map':
+            return readonly_view(self.f_map)
+        if key == 'r_map':
+            if self.r_map is None:
+                # computed at most once per thread that reads it first, and never changed afterwards
+                object.__setattr__(self, 'r_map', self.reverse(self.f_map))
+            if len(self.r_map) == 0:
+                return readonly_view(self.r_map)
+            return readonly_view(self.r_map).cast('B').cast(self.r_map.typecode, (len(self.r_map) // 2, 2))
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __eq__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return self.to_dict() == NormalizerResult.to_dict(other)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def to_dict(self):
+        """This function returns result as dictionary where character location maps are lists."""
+        return {key: value.tolist() if isinstance(value, memoryview) else value for (key, value) in self.items()}
+
+    @staticmethod
+    def reverse(f_map):
+        """This function takes character location map (see Normalizer.scan()) and returns flat array of pairs,
+        where pair index is character index in original string, and pair is lowest and highest character index
+        in normalized string.
+        """
+        if len(f_map) == 0:
+            return array('l')
+        ret = array('l', [-1]) * (2 * (f_map[-1] + 1))
+        for (i, j) in enumerate(f_map):
+            if ret[2*j] == -1:
+                ret[2*j] = i
+            ret[2*j+1] = i
+        first = -1
+        for j in range(0, len(ret), 2):
+            if ret[j] != -1:
+                if first == -1:
+                    first = j
+            elif first > -1:
+                ret[j] = ret[j-2]
+                ret[j+1] = ret[j-1]
+        ret[0:first] = ret[first:first+2] * (first // 2)
+        return ret
+
+class ColumnarResult():
+    """This class is immutable result of batch normalization in columnar layout (see Normalizer.normalize_columnar()).
+    Normalized strings are concatenated into one UTF-8 encoded buffer ('data'), and string *i* is bytes
+    data[offsets[i]:offsets[i+1]]; if character location maps are tracked, they are concatenated into one array
+    ('maps'), and map of string *i* is maps[map_offsets[i]:map_offsets[i+1]]. Offsets and maps are 64-bit integers,
+    and all buffers are exposed as read-only memoryviews, so they can be handed to NumPy (numpy.frombuffer())
+    or Arrow (pyarrow.py_buffer(), large_string type) without copying and without Python object per string.
+    """
+
+    __slots__ = ('normalized', 'normalized_offsets', 'f_map', 'f_map_offsets')
+
+    def __init__(self, normalized=None, normalized_offsets=None, f_map=None, f_map_offsets=None):
+        object.__setattr__(self, 'normalized', normalized if normalized is not None else bytearray())
+        object.__setattr__(self, 'normalized_offsets', normalized_offsets if normalized_offsets is not None else array('q', [0]))
+        object.__setattr__(self, 'f_map', f_map)
+        object.__setattr__(self, 'f_map_offsets', f_map_offsets)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ColumnarResult object is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('ColumnarResult object is immutable')
+
+    def __reduce__(self):
+        return (ColumnarResult, (self.normalized, self.normalized_offsets, self.f_map, self.f_map_offsets))
+
+    def __len__(self):
+        return len(self.normalized_offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError('ColumnarResult index out of range')
+        return self.normalized[self.normalized_offsets[i]:self.normalized_offsets[i+1]].decode('utf8', 'surrogatepass')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.normalized[self.normalized_offsets[i]:self.normalized_offsets[i+1]].decode('utf8', 'surrogatepass')
+
+    @property
+    def data(self):
+        return readonly_view(self.normalized)
+
+    @property
+    def offsets(self):
+        return readonly_view(self.normalized_offsets)
+
+    @property
+    def maps(self):
+        return readonly_view(self.f_map) if self.f_map is not None else None
+
+    @property
+    def map_offsets(self):
+        return readonly_view(self.f_map_offsets) if self.f_map_offsets is not None else None
+
+    def get_map(self, i):
+        """This function returns character location map of *i*-th string (see Normalizer.result) as read-only memoryview."""
+        if self.f_map is None:
+            raise ValueError('Character location maps were not tracked')
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError('ColumnarResult index out of range')
+        return readonly_view(memoryview(self.f_map)[self.f_map_offsets[i]:self.f_map_offsets[i+1]])
+
 class Normalizer():
     """This class includes functions and methods for normalizing strings."""
 
-    def __init__(self, tokenizer_name='', debug_mode=False, verbose_mode=False):
+    def __init__(self, tokenizer_name='', debug_mode=False, verbose_mode=False, engine='automaton', cache_size=0, cache_policy='lru'):
         logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s')
         self.debug = debug_mode
         self.verbose = verbose_mode
@@ -104,8 +727,16 @@ class Normalizer():
         if self.debug:
             logging.root.setLevel(logging.DEBUG)
         self.tokenizer_name = tokenizer_name
-        self.normalizer_result = {'original': '', 'normalized': '', 'map': [], 'r_map': []}
+        self.normalizer_result = NormalizerResult()
         self.content = dict()
+        self.engine = engine
+        self.automaton = None
+        self.flat_trie = None
+        self.char_classes = None
+        self.replacement_index = None
+        self.cache = None
+        self.set_cache(cache_size, cache_policy)
+        self.instrumentation = None
 
     @property
     def name(self):
@@ -126,28 +757,80 @@ class Normalizer():
     @data.setter
     def data(self, obj):
         self.content = obj
+        self.automaton = None
+        self.flat_trie = None
+        self.char_classes = None
+        self.replacement_index = None
+        if self.cache is not None:
+            self.cache.clear()
 
     def expand_instruction(self, g, seed, nodes=set(), hops=0):
-        """Helper function that traverses a path and returns set of terminal nodes.
-        For a directed graph *g*, it is assumed that each node has at most 1 descendant.
+        """Deprecated: use self.resolve_instructions(). This function returns set with the terminal node
+        that *seed* is eventually replaced with in a directed graph *g*, resolved by self.resolve_instructions()
+        for the part of *g* reachable from *seed*.
 
         Args:
             *g* is a dict(str, set) representing a graph
             *seed* is a node (str) to expand
-            *nodes* is a set of nodes on the way of expansion
-            *hops* is depth of expansion so far
-        """
-        next_nodes = set()
-        if hops == 0:
-            nodes = {seed}
-        elif seed in nodes:
-            raise RecursionError('Circular reference in replacement instruction regarding "%s"' % (seed))
-        for node in nodes:
-            if node in g:
-                next_nodes = next_nodes.union(self.expand_instruction(g, seed, g[node], hops + 1))
-            else:
-                next_nodes.add(node)
-        return next_nodes
+            *nodes* and *hops* are ignored (kept for backward compatibility)
+
+        Raises:
+            RecursionError if replacements are circular
+            ValueError if node is eventually replaced with more than one terminal node
+        """
+        reachable = dict()
+        stack = [seed]
+        while stack:
+            node = stack.pop()
+            if node in g and node not in reachable:
+                reachable[node] = g[node]
+                stack.extend(g[node])
+        if seed not in reachable:
+            return {seed}
+        return {self.resolve_instructions(reachable)[seed]}
+
+    def resolve_instructions(self, g):
+        """This function resolves chains of replacements in a directed graph *g* (dict(str, set) where each node
+        is mapped to set of nodes it is replaced with), and returns dict where each node of *g* is mapped to
+        the terminal node it is eventually replaced with. Each node is visited once.
+
+        Raises:
+            RecursionError if replacements are circular
+            ValueError if node is eventually replaced with more than one terminal node
+        """
+        resolved = dict()
+        visiting = set()
+        for seed in g:
+            stack = [seed]
+            while stack:
+                node = stack[-1]
+                if node in resolved:
+                    stack.pop()
+                    continue
+                if node not in g:
+                    resolved[node] = node
+                    stack.pop()
+                    continue
+                if node not in visiting:
+                    visiting.add(node)
+                    depth = len(stack)
+                    for next_node in g[node]:
+                        if next_node in visiting:
+                            raise RecursionError('Circular reference in replacement instruction regarding "%s"' % (next_node))
+                        if next_node not in resolved:
+                            stack.append(next_node)
+                    if len(stack) > depth:
+                        continue
+                terminals = dict()
+                for next_node in g[node]:
+                    terminals[resolved[next_node]] = next_node
+                if len(terminals) > 1:
+                    [x, y] = sorted(terminals)[0:2]
+                    raise ValueError('Conflicting instruction: (replace "%s" --> "%s") vs (replace "%s" --> "%s")' % (node, terminals[x], node, terminals[y]))
+                resolved[node] = next(iter(terminals))
+                visiting.discard(node)
+                stack.pop()
+        return {x: resolved[x] for x in g}
 
     def merge_replacements(self, sdata):
         """This function takes *sdata* config string, merges classes of "c" and "r" tokenization rules,
@@ -156,7 +839,7 @@ class Normalizer():
         Args:
             *sdata* is string with set of tokrules
         """
-        ret = ''
+        ret = []
         replacements = dict()
         for line in sdata.splitlines():
             if not line.strip().startswith('#'):
@@ -168,23 +851,18 @@ class Normalizer():
                         replacements[action][subject] = set()
                     replacements[action][subject].add(parameter)
                     continue
-            ret += '%s\n' % (line)
+            ret.append('%s\n' % (line))
         for action in replacements:
-            for node in replacements[action]:
-                replacements[action][node] = self.expand_instruction(replacements[action], node)
-                if len(replacements[action][node]) > 1:
-                    raise ValueError('Conflicting instruction: (replace "%s" --> "%s") vs (replace "%s" --> "%s")' % (subject, replacements[action][subject], subject, parameter))
-                ret += '%s\t%s\t%s\n' % (action, next(iter(replacements[action][node])), node)
-        return ret
+            resolved = self.resolve_instructions(replacements[action])
+            for node in resolved:
+                ret.append('%s\t%s\t%s\n' % (action, resolved[node], node))
+        return ''.join(ret)
 
     def update_str_with_chmap(self, value, chmap):
         """This function zooms through a string *value*, replaces characters
         according to *chmap* dictionary object, and returns the updated string.
         """
-        updated = ''
-        for x in value:
-            updated += chmap[x] if x in chmap else x
-        return updated
+        return ''.join([chmap[x] if x in chmap else x for x in value])
 
     def make_tokenizer(self, sdata, update=False):
         """This function loads static set of tokienization rules stored in
@@ -221,8 +899,9 @@ class Normalizer():
             's': {'l': '~l', 'm': '~m', 'r': '~r'},
             'c': {'': '~='}
         }
+        compacted = isinstance(self.content, CompactTrie)
         if update:
-            trie = self.content
+            trie = self.content.decompile() if compacted else self.content
         else:
             trie = dict()
             trie['_settings'] = dict()
@@ -269,9 +948,370 @@ class Normalizer():
                         subtrie[actions[action][parameter_keylet]] = parameter_value
                 else:
                     subtrie[actions[action][parameter_key]] = parameter_value
-        self.content = trie
+        self.content = CompactTrie(trie) if compacted else trie
+        self.automaton = None
+        self.flat_trie = None
+        self.char_classes = self.compile_char_classes()
+        self.replacement_index = None
+        if self.cache is not None:
+            self.cache.clear()
+        return True
+
+    def parse_rules(self, rules):
+        """This function takes either tokenization rules string (see make_tokenizer()) or iterable of Rule instances,
+        and returns list of tuples (action, parameter, subject) with character replacements and settings first.
+        """
+        if not isinstance(rules, str):
+            rules = ''.join([x.decode() for x in rules])
+        ret = {'set': [], 'c': [], '': []}
+        for line in rules.splitlines():
+            if line.strip() != '' and not line.strip().startswith('#'):
+                rule = tuple(line.strip().split('\t')[0:3])
+                ret[rule[0] if rule[0] in ret else ''].append(rule)
+        return ret['set'] + ret['c'] + ret['']
+
+    def index_replacements(self):
+        """This function indexes token replacements stored in the trie, and returns tuple (targets, sources, nodes):
+            targets => dict where key is token (as it is spelled in the trie), and value is its replacement
+            sources => dict where key is replacement, and value is set of tokens replaced with it
+            nodes => dict where key is token, and value is trie node where replacement is stored
+        Replacement chains that are already resolved in the trie are indexed as direct replacements.
+        """
+        special = ('_settings', '_chmap', '~_', '~=', '~l', '~m', '~r')
+        targets = dict()
+        sources = dict()
+        nodes = dict()
+        stack = [('', self.content)]
+        while stack:
+            (path, node) = stack.pop()
+            if '~_' in node and path != '':
+                targets[path] = node['~_']
+                if node['~_'] not in sources:
+                    sources[node['~_']] = set()
+                sources[node['~_']].add(path)
+                nodes[path] = node
+            stack.extend([(path + x, node[x]) for x in node if x not in special])
+        return (targets, sources, nodes)
+
+    def resolve_replacement(self, token, targets):
+        """This function follows chain of replacements in *targets* starting with *token*, and returns the final one."""
+        seen = {token}
+        while token in targets:
+            token = targets[token]
+            if token in seen:
+                raise RecursionError('Circular reference in replacement instruction regarding "%s"' % (token))
+            seen.add(token)
+        return token
+
+    def update_replacements(self, token):
+        """This function rewrites replacements in the trie for *token* and all tokens that are replaced with it
+        (directly or transitively) according to the index of replacements (see index_replacements()).
+        """
+        (targets, sources, nodes) = self.replacement_index
+        queue = [token]
+        seen = set()
+        while queue:
+            token = queue.pop()
+            if token in seen:
+                continue
+            seen.add(token)
+            if token in targets:
+                nodes[token]['~_'] = self.resolve_replacement(token, targets)
+            if token in sources:
+                queue.extend(sources[token])
+        return True
+
+    def merge_subtries(self, source, target):
+        """This function merges trie node *source* into *target* (actions already present in *target* are kept)."""
+        for x in source:
+            if x not in target:
+                target[x] = source[x]
+            elif not x.startswith('~'):
+                self.merge_subtries(source[x], target[x])
+        return True
+
+    def replace_character(self, parameter, subject):
+        """This function adds character replacement (*subject* --> *parameter*) to the trie, and rewrites existing
+        trie edges and token replacements accordingly.
+        """
+        chmap = self.content['_chmap']
+        if subject in chmap:
+            if chmap[subject] != parameter:
+                raise ValueError('Conflicting instruction: (replace "%s" --> "%s") vs (replace "%s" --> "%s")' % (subject, chmap[subject], subject, parameter))
+            return False
+        parameter = chmap[parameter] if parameter in chmap else parameter
+        if parameter == subject:
+            raise RecursionError('Circular reference in replacement instruction regarding "%s"' % (subject))
+        for x in chmap:
+            if chmap[x] == subject:
+                chmap[x] = parameter
+        chmap[subject] = parameter
+        special = ('_settings', '_chmap', '~=', '~l', '~m', '~r')
+        stack = [self.content]
+        while stack:
+            node = stack.pop()
+            if subject in node:
+                subtrie = node.pop(subject)
+                if parameter in node:
+                    self.merge_subtries(subtrie, node[parameter])
+                else:
+                    node[parameter] = subtrie
+            if '~_' in node and subject in node['~_']:
+                node['~_'] = node['~_'].replace(subject, parameter)
+            stack.extend([node[x] for x in node if x not in special and x != '~_'])
+        self.replacement_index = None
+        return True
+
+    def add_rules(self, rules):
+        """This function adds tokenization rules to compiled trie in place, in time proportional to the number
+        of rules (and replacements depending on them). Replacements are resolved transitively against the rules
+        already in the trie. Character replacement is the exception: it rewrites every trie edge it applies to,
+        and cannot redefine replacement of a character already in the trie.
+
+        Args:
+            *rules* is either string with set of tokrules (see make_tokenizer()), or iterable of Rule instances
+        """
+        actions = {'l': '~l', 'm': '~m', 'r': '~r'}
+        compacted = isinstance(self.content, CompactTrie)
+        if compacted:
+            self.content = self.content.decompile()
+            if self.replacement_index is not None:
+                # replacements are still indexed, but trie nodes are new
+                self.replacement_index = self.replacement_index[0:2] + self.index_replacements()[2:]
+        trie = self.content
+        if '_settings' not in trie:
+            trie['_settings'] = dict()
+        if '_chmap' not in trie:
+            trie['_chmap'] = dict()
+        try:
+            for (action, parameter, subject) in self.parse_rules(rules):
+                if action == 'set':
+                    trie['_settings'][parameter] = subject
+                    continue
+                if 'cs' not in trie['_settings'] or trie['_settings']['cs'] == '0':
+                    parameter = parameter.lower()
+                    subject = subject.lower()
+                if action == 'c':
+                    self.replace_character(parameter, subject)
+                    continue
+                if action == 'r':
+                    if self.replacement_index is None:
+                        self.replacement_index = self.index_replacements()
+                    (targets, sources, nodes) = self.replacement_index
+                    token = self.update_str_with_chmap(subject, trie['_chmap'])
+                    target = self.update_str_with_chmap(parameter, trie['_chmap'])
+                    chain = target
+                    while chain != token and chain in targets:
+                        chain = targets[chain]
+                    if chain == token:
+                        raise RecursionError('Circular reference in replacement instruction regarding "%s"' % (token))
+                subtrie = trie
+                for character in subject:
+                    if character in trie['_chmap']:
+                        character = trie['_chmap'][character]
+                    if character not in subtrie:
+                        subtrie[character] = dict()
+                    subtrie = subtrie[character]
+                if action == 's':
+                    for parameter_keylet in parameter:
+                        subtrie[actions[parameter_keylet]] = ''
+                    continue
+                if token in targets:
+                    sources[targets.pop(token)].discard(token)
+                targets[token] = target
+                if target not in sources:
+                    sources[target] = set()
+                sources[target].add(token)
+                nodes[token] = subtrie
+                self.update_replacements(token)
+        finally:
+            self.content = CompactTrie(trie) if compacted else trie
+            self.automaton = None
+            self.flat_trie = None
+            self.char_classes = None
+            if self.cache is not None:
+                self.cache.clear()
         return True
 
+    def remove_rules(self, rules):
+        """This function removes tokenization rules from compiled trie in place, in time proportional to the number
+        of rules (and replacements depending on them). Replacement rule removes replacement of its token regardless
+        of what the token is replaced with. Character replacements cannot be removed.
+
+        Args:
+            *rules* is either string with set of tokrules (see make_tokenizer()), or iterable of Rule instances
+        """
+        actions = {'l': '~l', 'm': '~m', 'r': '~r'}
+        compacted = isinstance(self.content, CompactTrie)
+        if compacted:
+            self.content = self.content.decompile()
+            if self.replacement_index is not None:
+                # replacements are still indexed, but trie nodes are new
+                self.replacement_index = self.replacement_index[0:2] + self.index_replacements()[2:]
+        trie = self.content
+        try:
+            for (action, parameter, subject) in self.parse_rules(rules):
+                if action == 'set':
+                    if parameter in trie['_settings']:
+                        del trie['_settings'][parameter]
+                    continue
+                if 'cs' not in trie['_settings'] or trie['_settings']['cs'] == '0':
+                    parameter = parameter.lower()
+                    subject = subject.lower()
+                if action == 'c':
+                    raise ValueError('Instruction (replace "%s" --> "%s") cannot be removed from compiled tokenizer' % (subject, parameter))
+                path = [trie]
+                for character in subject:
+                    if character in trie['_chmap']:
+                        character = trie['_chmap'][character]
+                    if character not in path[-1]:
+                        break
+                    path.append(path[-1][character])
+                if len(path) != len(subject) + 1:
+                    continue
+                if action == 's':
+                    for parameter_keylet in parameter:
+                        if actions[parameter_keylet] in path[-1]:
+                            del path[-1][actions[parameter_keylet]]
+                elif '~_' in path[-1]:
+                    if self.replacement_index is None:
+                        self.replacement_index = self.index_replacements()
+                    (targets, sources, nodes) = self.replacement_index
+                    token = self.update_str_with_chmap(subject, trie['_chmap'])
+                    del path[-1]['~_']
+                    sources[targets[token]].discard(token)
+                    del targets[token]
+                    del nodes[token]
+                    self.update_replacements(token)
+                # prune nodes that no longer lead to any rule
+                for i in range(len(subject), 0, -1):
+                    if len(path[i]) > 0:
+                        break
+                    del path[i-1][[x for x in path[i-1] if path[i-1][x] is path[i]][0]]
+        finally:
+            self.content = CompactTrie(trie) if compacted else trie
+            self.automaton = None
+            self.flat_trie = None
+            self.char_classes = None
+            if self.cache is not None:
+                self.cache.clear()
+        return True
+
+    def compact(self):
+        """This function replaces trie stored as nested dictionary structure with its CompactTrie
+        representation (which takes several times less memory at the cost of slower lookups).
+        Automaton engine is not used with compacted trie.
+        """
+        if not isinstance(self.content, CompactTrie):
+            self.data = CompactTrie(self.content)
+        return True
+
+    def compile_automaton(self):
+        """This function compiles failure links for the trie stored in self.content, and returns
+        the automaton as tuple (links, chmap_table), where *chmap_table* is translation table for
+        str.translate() or None if character replacements are not all single characters.
+        Failure links are stored in dict object where key is id() of trie node, and value is tuple (depth, head, rescan):
+            depth => number of characters on the path leading to the node
+            head => offset of the first character on the path (other than leading one) that is also
+                at the root of the trie, or -1 if there is none (this is where scanning is resumed
+                when the match fails)
+            rescan => node reached by walking the path from *head* down the trie, i.e. node the scanner
+                ends up in after the characters that follow *head* are read once again
+        """
+        content = self.content
+        if not isinstance(content, dict):
+            return (None, None)
+        special = ('_settings', '_chmap', '~_', '~=', '~l', '~m', '~r')
+        chmap = content['_chmap'] if '_chmap' in content else dict()
+        chmap_table = str.maketrans(chmap)
+        for x in chmap:
+            if len(x) != 1 or len(chmap[x]) != 1:
+                chmap_table = None
+                break
+        links = dict()
+        stack = [(content[x], 1, -1, None, False) for x in content if x not in special]
+        while stack:
+            (node, depth, head, rescan, stopped) = stack.pop()
+            links[id(node)] = (depth, head, rescan)
+            for x in node:
+                if x in special:
+                    continue
+                if head > -1:
+                    if not stopped and x in rescan:
+                        stack.append((node[x], depth + 1, head, rescan[x], False))
+                    else:
+                        stack.append((node[x], depth + 1, head, rescan, True))
+                elif x in content:
+                    stack.append((node[x], depth + 1, depth, content[x], False))
+                else:
+                    stack.append((node[x], depth + 1, -1, None, False))
+        return (links, chmap_table)
+
+    def compile_char_classes(self):
+        """This function returns table for str.translate() that maps every character of Basic Multilingual Plane
+        to its class as the scanner sees it: group of the character (see self.chargroup()) after character
+        replacements are applied, plus 4 if the character is to be replaced. Characters beyond the table
+        are left intact by str.translate(), and the scanner classifies them one by one.
+        """
+        chmap = self.content['_chmap'] if '_chmap' in self.content else dict()
+        classes = base_char_classes()
+        if len(chmap) == 0:
+            return classes
+        table = bytearray(classes)
+        for x in chmap:
+            if len(x) == 1 and ord(x) < len(table):
+                table[ord(x)] = self.chargroup(chmap[x]) + 4
+        return bytes(table)
+
+    def compile_kernel(self):
+        """This function packs the trie stored in self.content into flat arrays walked by compiled kernel
+        (see sic/kernel.pyx), and returns them as tuple (first_edge, edge_chars, edge_targets, flags, replacements,
+        string_offsets, string_data, chmap_keys, chmap_offsets, chmap_data):
+            first_edge, edge_chars, edge_targets, flags, replacements => arrays of CompactTrie (see CompactTrie)
+            string_offsets, string_data => CompactTrie.strings as code points, string *i* is string_data[string_offsets[i]:string_offsets[i+1]]
+            chmap_keys => sorted code points of replaced characters
+            chmap_offsets, chmap_data => code points of replacements, replacement of chmap_keys[i] is chmap_data[chmap_offsets[i]:chmap_offsets[i+1]]
+        """
+        trie = self.content if isinstance(self.content, CompactTrie) else CompactTrie(self.content)
+        string_offsets, string_data = array('i', [0]), array('I')
+        for i in range(len(trie.strings)):
+            string_data.extend([ord(x) for x in trie.strings[i]])
+            string_offsets.append(len(string_data))
+        chmap_keys, chmap_offsets, chmap_data = array('i'), array('i', [0]), array('I')
+        for x in sorted([x for x in trie.chmap if len(x) == 1]):
+            chmap_keys.append(ord(x))
+            chmap_data.extend([ord(y) for y in trie.chmap[x]])
+            chmap_offsets.append(len(chmap_data))
+        return (trie.first_edge, trie.edge_chars, trie.edge_targets, trie.flags, trie.replacements, string_offsets, string_data, chmap_keys, chmap_offsets, chmap_data)
+
+    def map_positions(self, parsed_string, original_string, chmap, chmap_table):
+        """This function applies *chmap* to the string being normalized and returns tuple (mapped, expanded, offsets, positions)
+        used by automaton engine to copy characters without reading them one by one:
+            mapped => sequence where item is replaced character (as scanner sees it) at given position in *parsed_string*
+            expanded => string of replaced characters (as they are added to normalized string) at all positions
+            offsets => list where item is where character at given position starts in *expanded* (None if all replacements are single characters)
+            positions => list where item is position of *expanded* character in *parsed_string* (None if all replacements are single characters)
+
+        Args:
+            *parsed_string* is string being normalized (lowercased if normalization is case-insensitive)
+            *original_string* is string characters are copied from when no replacement is applied
+            *chmap* is dict object with character replacements
+            *chmap_table* is translation table for str.translate() compiled by self.compile_automaton() (or None)
+        """
+        if chmap_table is not None:
+            mapped = parsed_string.translate(chmap_table)
+            if original_string is parsed_string:
+                return (mapped, mapped, None, None)
+            return (mapped, ''.join([mapped[i] if parsed_string[i] in chmap else original_string[i] for i in range(len(parsed_string))]), None, None)
+        mapped = [chmap[x] if x in chmap else x for x in parsed_string]
+        originals = [mapped[i] if parsed_string[i] in chmap else original_string[i] for i in range(len(parsed_string))]
+        offsets = [0]
+        positions = []
+        for i in range(len(originals)):
+            offsets.append(offsets[-1] + len(originals[i]))
+            positions += [i] * len(originals[i])
+        return (mapped, ''.join(originals), offsets, positions)
+
     def chargroup(self, s):
         """This function takes a character and returns an integer designating
         group the character belongs to:
@@ -307,25 +1347,29 @@ class Normalizer():
         and returns list where item index is character index in original string, and item value is pair
         of lowest and highest character index in normalized string.
         """
-        ret = [None] * (m[-1] + 1)
-        for i in range(len(m)):
-            if ret[m[i]] is None:
-                ret[m[i]] = [i, i]
-            else:
-                ret[m[i]][1] = i
-        j = 0
-        for i in range(0, len(ret)):
-            if ret[i] is not None:
-                j = i
-                for k in range(0, j):
-                    ret[k] = ret[j]
-                break
-        for i in range(j+1, len(ret)):
-            if ret[i] is None:
-                ret[i] = ret[i-1]
-        return ret
+        ret = NormalizerResult.reverse(m)
+        return [[ret[i], ret[i+1]] for i in range(0, len(ret), 2)]
 
-    def normalize(self, source_string, word_separator=' ', normalizer_option=0, control_character='\x00'):
+    def check_arguments(self, word_separator, control_character):
+        """This function validates arguments shared by all normalization methods.
+
+        Args:
+            *word_separator* is word separator to consider (must be single character)
+            *control_character* is character masking word separator (must be single character)
+        """
+        assert len(word_separator) == 1, 'word_separator is not a single character (it must be)'
+        assert len(control_character) == 1, 'control_character is not a single character (it must be)'
+        assert word_separator != control_character, 'word_separator and control_character are same (they must not be)'
+        return True
+
+    def read_settings(self):
+        """This function reads settings of compiled tokenizer and returns tuple (bypass, case_sensitive)."""
+        settings = self.content['_settings'] if '_settings' in self.content else dict()
+        bypass = 'bypass' in settings and settings['bypass'] == '1'
+        case_sensitive = 'cs' in settings and settings['cs'] == '1'
+        return (bypass, case_sensitive)
+
+    def normalize(self, source_string, word_separator=' ', normalizer_option=0, control_character='\x00', with_map=True):
         """This function zooms through the provided string character by character
         and returns string which is normalized representation of a given string.
 
@@ -333,27 +1377,637 @@ class Normalizer():
             *source_string* is input string to normalize
             *word_separator* is word separator to consider (must be single character)
             *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *with_map*: when False, character location maps are neither tracked nor stored in self.normalizer_result
+
+        If result cache is enabled (see *cache_size*), results of repeated calls are taken from the cache
+        (self.normalizer_result is then same object as the one stored in the cache).
+        If instrumentation is enabled (see self.set_instrumentation()), metrics of the call are recorded.
         """
-        assert len(word_separator) == 1, 'word_separator is not a single character (it must be)'
-        assert len(control_character) == 1, 'control_character is not a single character (it must be)'
-        assert word_separator != control_character, 'word_separator and control_character are same (they must not be)'
-        # TODO: review for refactoring
-        self.normalizer_result = {'original': source_string, 'normalized': '', 'map': [], 'r_map': []}
+        counters = None
+        if self.instrumentation is not None:
+            counters = [0] * len(NormalizerStats.counters)
+            started = time.perf_counter()
+        if self.cache is not None:
+            cache_key = (source_string, word_separator, normalizer_option, control_character, with_map)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.normalizer_result = cached
+                if counters is not None:
+                    self.instrumentation.record(source_string, cache_key[1:], counters, time.perf_counter() - started, True)
+                return cached.normalized
+        self.normalizer_result = self.normalize_ex(source_string, word_separator, normalizer_option, control_character, with_map, counters)
+        if self.cache is not None and source_string != '':
+            self.cache.put(cache_key, self.normalizer_result)
+        if counters is not None:
+            self.instrumentation.record(source_string, (word_separator, normalizer_option, control_character, with_map), counters, time.perf_counter() - started, False)
+        return self.normalizer_result.normalized
+
+    def normalize_ex(self, source_string, word_separator=' ', normalizer_option=0, control_character='\x00', with_map=True, counters=None):
+        """This function normalizes the provided string and returns NormalizerResult object (same as self.normalizer_result
+        after self.normalize() call). It neither touches self.normalizer_result nor uses result cache, so one Normalizer
+        may be shared by many threads, as long as compiled tokenizer is not changed while they are running.
+
+        Args:
+            *source_string* is input string to normalize
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *with_map*: when False, character location maps are not tracked
+            *counters* is list that scanner counters are added to (see NormalizerStats), or None
+        """
+        self.check_arguments(word_separator, control_character)
         if source_string == '':
-            return ''
+            return NormalizerResult(source_string)
+        (bypass, case_sensitive) = self.read_settings()
+        if bypass:
+            return NormalizerResult(source_string, source_string, array('l', range(len(source_string))) if with_map else None)
+        (normalized, f_map) = self.scan(source_string, word_separator, normalizer_option, control_character, case_sensitive, with_map, counters)
+        return NormalizerResult(source_string, normalized, array('l', f_map) if len(f_map) > 0 else None)
+
+    def normalize_tokens(self, source_string, word_separator=' ', normalizer_option=0, control_character='\x00', as_arrays=False):
+        """This function normalizes the provided string and returns list of tuples (token, start, end), where "token"
+        is token of normalized string (same as non-empty items of self.normalize(...).split(*word_separator*)),
+        and *source_string*[start:end] is where it comes from (characters dropped by normalization belong
+        to preceding token, unless they are trailing word separators). Tokens are cut from output of the scanner
+        as is, so normalized string is neither joined nor split, and self.normalizer_result is not touched.
+        With *normalizer_option* 1 tokens are sorted, with 2 they are sorted and deduplicated (first occurrence is kept).
+
+        Args:
+            *source_string* is input string to normalize
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *as_arrays*: when True, tuple (tokens, starts, ends) is returned instead, where "tokens" is list,
+                and "starts" and "ends" are parallel arrays of 64-bit integers
+        """
+        self.check_arguments(word_separator, control_character)
+        (bypass, case_sensitive) = self.read_settings()
+        if source_string == '':
+            (fragment, f_map, total_length) = ('', [], 0)
+        elif bypass:
+            (fragment, f_map, total_length) = (source_string, [i for i in range(len(source_string))], len(source_string))
+            normalizer_option = 0
+        else:
+            (fragment, f_map, total_length) = self.scan_fragment(source_string, word_separator, normalizer_option, control_character, case_sensitive, True)
+        (tokens, starts, ends) = self.split_tokens(source_string, fragment, f_map, word_separator, normalizer_option, control_character, total_length)
+        if as_arrays:
+            return (tokens, starts, ends)
+        return list(zip(tokens, starts, ends))
+
+    def split_tokens(self, source_string, fragment, f_map, word_separator, normalizer_option, control_character, total_length):
+        """This function cuts string assembled by the scanner into tokens, and returns tuple (tokens, starts, ends)
+        where "tokens" is list of tokens, and "starts" and "ends" are arrays of their offsets in the string
+        being normalized (see self.normalize_tokens()).
+
+        Args:
+            *source_string* is string being normalized
+            *fragment* is string assembled by the scanner (see self.scan_fragment())
+            *f_map* is character location map of *fragment*
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *total_length* is length of string being normalized
+        """
+        if normalizer_option == 3:
+            kept = [i for i in range(len(fragment)) if fragment[i] != control_character]
+            fragment = ''.join([fragment[i] for i in kept])
+            f_map = [f_map[i] for i in kept]
+        else:
+            fragment = fragment.replace(control_character, word_separator)
+        n = len(fragment)
+        spans = []
+        i = 0
+        while i < n:
+            j = fragment.find(word_separator, i)
+            if j == -1:
+                j = n
+            if j > i:
+                spans.append((i, j))
+            i = j + 1
+        # token ends where the rest of fragment starts in the string being normalized,
+        # so spans are walked backwards keeping the lowest offset seen so far
+        tokens, starts, ends = [], [], []
+        rest, next_start = total_length, n
+        for (i, j) in reversed(spans):
+            if next_start > j:
+                rest = min(rest, min(f_map[j:next_start]))
+            token_map = f_map[i:j]
+            last = max(token_map)
+            end = rest if j < n and rest > last else last + 1
+            while end > last + 1 and end <= len(source_string) and source_string[end-1] == word_separator:
+                end -= 1
+            tokens.append(fragment[i:j])
+            starts.append(min(token_map))
+            ends.append(end)
+            rest, next_start = min(rest, starts[-1]), i
+        tokens.reverse()
+        starts.reverse()
+        ends.reverse()
+        if normalizer_option in (1, 2):
+            order = range(len(tokens))
+            if normalizer_option == 2:
+                seen = dict()
+                order = [seen.setdefault(tokens[k], k) for k in order if tokens[k] not in seen]
+            order = sorted(order, key=tokens.__getitem__)
+            tokens = [tokens[k] for k in order]
+            starts = [starts[k] for k in order]
+            ends = [ends[k] for k in order]
+        return (tokens, array('q', starts), array('q', ends))
+
+    def set_cache(self, cache_size, cache_policy='lru'):
+        """This function enables (or disables, if *cache_size* is 0) result cache used by self.normalize().
+        Cache is cleared whenever compiled tokenizer is changed.
+
+        Args:
+            *cache_size* is maximum number of results to keep
+            *cache_policy* is eviction policy, either 'lru' (least recently used, default) or 'fifo' (oldest)
+        """
+        self.cache = ResultCache(cache_size, cache_policy) if cache_size > 0 else None
+        return True
+
+    def cache_info(self):
+        """This function returns dictionary with size, policy, length, and hit/miss/eviction counters
+        of result cache, or None if the cache is not enabled.
+        """
+        return self.cache.info() if self.cache is not None else None
+
+    def set_instrumentation(self, enabled=True, callback=None, slowest=0):
+        """This function enables (or disables, if *enabled* is False) instrumentation of self.normalize():
+        scanner counters, latency, and the slowest inputs are recorded for each call (see NormalizerStats).
+        Metrics collected so far are dropped. When instrumentation is disabled, nothing is counted.
+
+        Args:
+            *enabled*: when False, instrumentation is disabled
+            *callback* is function called after each call with input string and dictionary of metrics of the call
+                (length, seconds, cached, and scanner counters), or None
+            *slowest* is number of the slowest inputs to keep for reproduction
+        """
+        self.instrumentation = NormalizerStats(slowest, callback) if enabled else None
+        return True
+
+    def stats(self, reset=False):
+        """This function returns dictionary with metrics recorded by instrumentation of self.normalize()
+        (see NormalizerStats.info()), or None if instrumentation is not enabled.
+
+        Args:
+            *reset*: when True, metrics are reset after they are returned
+        """
+        if self.instrumentation is None:
+            return None
+        ret = self.instrumentation.info()
+        if reset:
+            self.instrumentation.reset()
+        return ret
+
+    def normalize_batch(self, source_strings, word_separator=' ', normalizer_option=0, control_character='\x00', with_map=False):
+        """This generator normalizes each string in *source_strings* and yields results in the same order.
+        Arguments and tokenizer settings are validated once per batch, and self.normalizer_result is not touched.
+        Unless *with_map* is True, character location maps are not tracked.
+
+        Args:
+            *source_strings* is iterable of input strings to normalize
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *with_map*: when True, NormalizerResult objects (same as self.normalizer_result) are yielded instead of strings
+        """
+        for (source_string, normalized, f_map) in self.scan_batch(source_strings, word_separator, normalizer_option, control_character, with_map):
+            if not with_map:
+                yield normalized
+            else:
+                yield NormalizerResult(source_string, normalized, array('l', f_map))
+
+    def normalize_columnar(self, source_strings, word_separator=' ', normalizer_option=0, control_character='\x00', with_map=False):
+        """This function normalizes each string in *source_strings* and returns ColumnarResult object where normalized
+        strings (and character location maps, if *with_map* is True) are concatenated into flat buffers with offsets,
+        so no object is kept per string. Arguments and tokenizer settings are validated once per batch,
+        and self.normalizer_result is not touched.
+
+        Args:
+            *source_strings* is iterable of input strings to normalize
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *with_map*: when True, character location maps are concatenated as well
+        """
+        data = bytearray()
+        offsets = array('q', [0])
+        f_maps = array('q') if with_map else None
+        map_offsets = array('q', [0]) if with_map else None
+        for (_, normalized, f_map) in self.scan_batch(source_strings, word_separator, normalizer_option, control_character, with_map):
+            data += normalized.encode('utf8', 'surrogatepass')
+            offsets.append(len(data))
+            if with_map:
+                f_maps.extend(f_map)
+                map_offsets.append(len(f_maps))
+        return ColumnarResult(data, offsets, f_maps, map_offsets)
+
+    def normalize_column(self, column, word_separator=' ', normalizer_option=0, control_character='\x00', workers=1, chunksize=1000):
+        """This function normalizes column of strings with many repeated values: the column is factorized,
+        each distinct string is normalized once, and results are broadcast back to rows, so the work depends
+        on the number of distinct values rather than on the number of rows. Values that are not strings
+        (missing values included) are kept as is. Column is pandas.Series (pandas.Series with same index
+        is returned), pyarrow.Array or pyarrow.ChunkedArray (array of the same kind is returned), or any other
+        iterable (list is returned); pandas and pyarrow are only imported if column is one of their objects.
+
+        Args:
+            *column* is pandas.Series, pyarrow.Array, pyarrow.ChunkedArray, or iterable of input strings to normalize
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *workers* is number of worker processes distinct strings are normalized in (see self.normalize_parallel())
+            *chunksize* is number of strings sent to a worker process at once
+        """
+        module = type(column).__module__.split('.')[0]
+        if module == 'pandas':
+            import numpy
+            import pandas
+            (codes, uniques) = pandas.factorize(column)
+            normalized = self.normalize_distinct(list(uniques), word_separator, normalizer_option, control_character, workers, chunksize)
+            values = numpy.asarray(normalized + [None], dtype=object)[codes]
+            # missing values are coded as -1, and they are copied from the column
+            missing = codes == -1
+            if missing.any():
+                values[missing] = column.to_numpy(dtype=object)[missing]
+            ret = pandas.Series(values, index=column.index, name=column.name, dtype=object)
+            if isinstance(column.dtype, pandas.CategoricalDtype):
+                return ret.astype('category')
+            if isinstance(column.dtype, pandas.StringDtype):
+                return ret.astype(column.dtype)
+            return ret
+        if module == 'pyarrow':
+            import pyarrow
+            import pyarrow.compute
+            uniques = pyarrow.compute.unique(column)
+            normalized = self.normalize_distinct(uniques.to_pylist(), word_separator, normalizer_option, control_character, workers, chunksize)
+            value_type = column.type if pyarrow.types.is_string(column.type) or pyarrow.types.is_large_string(column.type) else None
+            return pyarrow.compute.take(pyarrow.array(normalized, type=value_type), pyarrow.compute.index_in(column, value_set=uniques))
+        codes, uniques = [], dict()
+        for x in column:
+            codes.append(uniques.setdefault(x, len(uniques)))
+        normalized = self.normalize_distinct(list(uniques), word_separator, normalizer_option, control_character, workers, chunksize)
+        return [normalized[i] for i in codes]
+
+    def normalize_distinct(self, uniques, word_separator, normalizer_option, control_character, workers, chunksize):
+        """This function normalizes strings in list *uniques* (keeping other values as is) and returns list
+        of results in the same order (used by self.normalize_column()).
+
+        Args:
+            *uniques* is list of distinct values to normalize
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *workers* is number of worker processes (see self.normalize_parallel())
+            *chunksize* is number of strings sent to a worker process at once
+        """
+        strings = [x for x in uniques if isinstance(x, str)]
+        normalized = iter(self.normalize_parallel(strings, word_separator, normalizer_option, control_character, False, workers, chunksize))
+        return [next(normalized) if isinstance(x, str) else x for x in uniques]
+
+    def scan_batch(self, source_strings, word_separator, normalizer_option, control_character, with_map):
+        """This generator normalizes each string in *source_strings* and yields tuple (source, normalized, map)
+        (see self.scan()), with arguments and tokenizer settings validated once (used by self.normalize_batch()
+        and self.normalize_columnar()).
+
+        Args:
+            *source_strings* is iterable of input strings to normalize
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *with_map*: when False, character location maps are not tracked
+        """
+        self.check_arguments(word_separator, control_character)
+        (bypass, case_sensitive) = self.read_settings()
+        scan = self.scan
+        no_map = ('', [])
+        for source_string in source_strings:
+            if source_string == '':
+                (normalized, f_map) = no_map
+            elif bypass:
+                (normalized, f_map) = (source_string, [i for i in range(len(source_string))] if with_map else [])
+            else:
+                (normalized, f_map) = scan(source_string, word_separator, normalizer_option, control_character, case_sensitive, with_map)
+            yield (source_string, normalized, f_map)
+
+    def normalize_stream(self, chunks, word_separator=' ', normalizer_option=0, control_character='\x00', with_map=False):
+        """This generator normalizes text that comes in *chunks* (such as blocks read from a file) and yields
+        normalized text piece by piece, so that concatenation of the pieces is same as self.normalize(''.join(*chunks*)).
+        Each chunk is cut after its last word separator, and only the text that follows is carried over to the next one,
+        so memory taken is bounded by size of chunk plus the longest stretch of text without word separator.
+        With *normalizer_option* 1 and 2 tokens are collected, and yielded in the end as one piece. If *word_separator*
+        is found in tokenizer rules (see self.splits_at()), text cannot be cut, and it is normalized once it is read in full.
+
+        Args:
+            *chunks* is iterable of strings to normalize as one text
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *with_map*: when True, tuples (piece, map) are yielded instead of strings, where "map" is array of 64-bit integers
+                with locations of characters of the piece in the whole text (only populated when *normalizer_option* is 0)
+        """
+        self.check_arguments(word_separator, control_character)
+        (bypass, case_sensitive) = self.read_settings()
+        if bypass:
+            offset = 0
+            for chunk in chunks:
+                if chunk != '':
+                    yield (chunk, array('q', range(offset, offset + len(chunk)))) if with_map else chunk
+                    offset += len(chunk)
+            return
+        if not self.splits_at(word_separator):
+            source_string = ''.join(chunks)
+            if source_string != '':
+                result = self.normalize_ex(source_string, word_separator, normalizer_option, control_character, with_map)
+                if result.normalized != '':
+                    yield (result.normalized, array('q', result.f_map if result.f_map is not None else [])) if with_map else result.normalized
+            return
+        track = with_map and normalizer_option == 0
+        chunks = iter(chunks)
+        (offset, pending, tail, held, held_offset, tokens, done) = (0, '', '', '', 0, [], False)
+        while not done:
+            chunk = next(chunks, None)
+            if chunk is None:
+                (segment, pending, done) = (pending, '', True)
+            else:
+                pending += chunk
+                cut = pending.rfind(word_separator) + 1
+                if cut == 0:
+                    continue
+                (segment, pending) = (pending[:cut], pending[cut:])
+            if segment == '':
+                continue
+            (fragment, f_map, total_length) = self.scan_fragment(segment, word_separator, normalizer_option, control_character, case_sensitive, track)
+            if fragment != '':
+                if normalizer_option in (1, 2):
+                    tokens.extend(fragment.replace(control_character, word_separator).split(word_separator))
+                else:
+                    if tail != '':
+                        # segments are joined with word separator, or control character if tokenizer put one there
+                        (joiner, joiner_offset) = self.joint_of(tail, segment, word_separator, normalizer_option, control_character, case_sensitive)
+                        fragment = joiner + fragment
+                        if track:
+                            f_map.insert(0, joiner_offset)
+                    if normalizer_option == 3:
+                        piece = fragment.replace(control_character, '')
+                        if piece != '':
+                            yield (piece, array('q')) if with_map else piece
+                    elif track:
+                        # last character is held back: its location is moved to the end of text if nothing follows
+                        piece = held + fragment.replace(control_character, word_separator)
+                        f_map = [held_offset] + [x + offset for x in f_map] if held != '' else [x + offset for x in f_map]
+                        if len(piece) > 1:
+                            yield (piece[:-1], array('q', f_map[:-1]))
+                        (held, held_offset) = (piece[-1], f_map[-1])
+                    else:
+                        yield fragment.replace(control_character, word_separator)
+                tail = self.tail_of(segment, word_separator, normalizer_option, control_character, case_sensitive)
+            offset += total_length
+        if held != '':
+            yield (held, array('q', [offset - 1]))
+        if len(tokens) > 0:
+            piece = word_separator.join(sorted(tokens) if normalizer_option == 1 else sorted(set(tokens)))
+            yield (piece, array('q')) if with_map else piece
+
+    def splits_at(self, word_separator):
+        """This function returns True if *word_separator* is neither found in tokens of compiled tokenizer
+        nor replaced or used as replacement by character replacement rules. Normalized string then
+        can be assembled from normalized parts of the string cut after word separator (see self.normalize_stream()).
+
+        Args:
+            *word_separator* is word separator to consider (must be single character)
+        """
+        content = self.content
+        chmap = content['_chmap']
+        if word_separator in chmap or word_separator in ''.join(chmap.values()):
+            return False
+        if isinstance(content, CompactTrie):
+            for x in content.edge_chars:
+                if x == ord(word_separator) or (x < 0 and word_separator in content.strings[-1 - x]):
+                    return False
+            return True
+        stack = [content]
+        while len(stack) > 0:
+            node = stack.pop()
+            for x in node:
+                if x == word_separator:
+                    return False
+                if x != '_chmap' and isinstance(node[x], dict):
+                    stack.append(node[x])
+        return True
+
+    def joint_of(self, tail, segment, word_separator, normalizer_option, control_character, case_sensitive):
+        """This function returns tuple (joiner, offset) where "joiner" is character (either *word_separator*
+        or *control_character*) that goes between normalized *tail* and normalized *segment* when they are
+        normalized as one string, and "offset" is its location relative to the beginning of *segment*
+        (used by self.normalize_stream()). The joiner only depends on the tokens that meet at the joint, so
+        only *tail* and the shortest part of *segment* cut after word separator that is not normalized to
+        empty string are scanned.
+
+        Args:
+            *tail* is the end of preceding text (see self.tail_of())
+            *segment* is the text that follows, it must not be normalized to empty string
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *case_sensitive*: when False, string is lowercased before processing
+        """
+        i = 0
+        while True:
+            i = segment.find(word_separator, len(segment) - len(segment[i:].lstrip(word_separator))) + 1
+            head = segment[:i] if i > 0 else segment
+            if i == 0 or self.scan_fragment(head, word_separator, normalizer_option, control_character, case_sensitive, False)[0] != '':
+                break
+        (tail_fragment, _, tail_length) = self.scan_fragment(tail, word_separator, normalizer_option, control_character, case_sensitive, False)
+        (fragment, f_map, _) = self.scan_fragment(tail + head, word_separator, normalizer_option, control_character, case_sensitive, True)
+        return (fragment[len(tail_fragment)], f_map[len(tail_fragment)] - tail_length)
+
+    def tail_of(self, segment, word_separator, normalizer_option, control_character, case_sensitive):
+        """This function returns the shortest end of *segment* that starts after word separator (or at the beginning
+        of *segment*) and is not normalized to empty string (used by self.normalize_stream()).
+
+        Args:
+            *segment* is the text to look at, it must not be normalized to empty string
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *case_sensitive*: when False, string is lowercased before processing
+        """
+        i = len(segment)
+        while True:
+            i = segment.rfind(word_separator, 0, len(segment[:i].rstrip(word_separator))) + 1
+            if i == 0 or self.scan_fragment(segment[i:], word_separator, normalizer_option, control_character, case_sensitive, False)[0] != '':
+                return segment[i:]
+
+    def normalize_parallel(self, source_strings, word_separator=' ', normalizer_option=0, control_character='\x00', with_map=False, workers=None, chunksize=1000):
+        """This generator normalizes strings from *source_strings* in a pool of worker processes
+        and yields results in the same order as in input. Compiled trie is passed to each worker
+        process once (at the time worker is initialized), while tasks only carry chunks of input strings.
+
+        Args:
+            *source_strings* is iterable of input strings to normalize
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *with_map*: when True, NormalizerResult objects (same as self.normalizer_result) are yielded instead of strings
+            *workers* is number of worker processes (defaults to number of CPUs)
+            *chunksize* is number of strings sent to a worker process at once
+        """
+        self.check_arguments(word_separator, control_character)
+        assert chunksize > 0, 'chunksize must be positive integer'
+        if workers == 1:
+            yield from self.normalize_batch(source_strings, word_separator, normalizer_option, control_character, with_map)
+            return
+        tasks = (
+            (chunk, word_separator, normalizer_option, control_character, with_map) for chunk in chunk_iterable(source_strings, chunksize)
+        )
+        with multiprocessing.Pool(workers, initializer=init_parallel_worker, initargs=(self.tokenizer_name, self.content)) as pool:
+            for results in pool.imap(run_parallel_worker, tasks):
+                yield from results
+
+    def anormalize_many(self, source_strings, word_separator=' ', normalizer_option=0, control_character='\x00', with_map=False, executor=None, workers=None, chunksize=1000, max_pending=4):
+        """This function returns asynchronous generator that normalizes strings from *source_strings* (iterable or asynchronous iterable)
+        in batches offloaded to executor, and yields results in the same order as in input without blocking event loop.
+        No more than *max_pending* batches are in flight at once: input is not read further until the earliest of them is done.
+        Arguments are validated at the time of call, and executor is only created once the generator is iterated.
+
+        Args:
+            *source_strings* is iterable or asynchronous iterable of input strings to normalize
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *with_map*: when True, NormalizerResult objects (same as self.normalizer_result) are yielded instead of strings
+            *executor* is either None (default executor of event loop), 'thread' or 'process' (pool of *workers* threads
+                or processes is created for this call), or concurrent.futures.Executor instance; worker processes
+                load compiled trie from model file once (see run_model_worker()) rather than receive it with each batch
+            *workers* is number of workers when *executor* is 'thread' or 'process'
+            *chunksize* is number of strings in a batch
+            *max_pending* is maximum number of batches being normalized at once
+        """
+        self.check_arguments(word_separator, control_character)
+        assert chunksize > 0, 'chunksize must be positive integer'
+        assert max_pending > 0, 'max_pending must be positive integer'
+        assert executor is None or executor in ('thread', 'process') or isinstance(executor, concurrent.futures.Executor), 'executor must be None, "thread", "process", or concurrent.futures.Executor instance'
+        async def generate():
+            loop = asyncio.get_event_loop()
+            pool = None
+            if executor == 'thread':
+                pool = concurrent.futures.ThreadPoolExecutor(workers)
+            elif executor == 'process':
+                pool = concurrent.futures.ProcessPoolExecutor(workers)
+            model, temp_filename = None, None
+            if executor == 'process' or isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+                content = self.content
+                if isinstance(content, CompactTrie) and content.filename is not None:
+                    model = (self.tokenizer_name, content.filename, True)
+                else:
+                    (handle, temp_filename) = tempfile.mkstemp(suffix='.model')
+                    os.close(handle)
+                    self.save(temp_filename)
+                    model = (self.tokenizer_name, temp_filename, False)
+            pending = deque()
+            chunk = []
+            asynchronous = hasattr(source_strings, '__aiter__')
+            iterator = source_strings.__aiter__() if asynchronous else iter(source_strings)
+            exhausted = False
+            try:
+                while not exhausted or chunk or pending:
+                    if not exhausted and len(chunk) < chunksize:
+                        try:
+                            chunk.append(await iterator.__anext__() if asynchronous else next(iterator))
+                            continue
+                        except (StopIteration, StopAsyncIteration):
+                            exhausted = True
+                    if chunk and len(pending) < max_pending:
+                        task = (chunk, word_separator, normalizer_option, control_character, with_map)
+                        if model is not None:
+                            pending.append(loop.run_in_executor(pool if pool is not None else executor, run_model_worker, model, task))
+                        else:
+                            pending.append(loop.run_in_executor(pool if pool is not None else executor, run_batch, self, task))
+                        chunk = []
+                        continue
+                    for result in await pending.popleft():
+                        yield result
+            finally:
+                for future in pending:
+                    future.cancel()
+                if pool is not None:
+                    pool.shutdown(wait=False)
+                if temp_filename is not None:
+                    try:
+                        os.remove(temp_filename)
+                    except OSError:
+                        pass
+        return generate()
+
+    def scan(self, source_string, word_separator, normalizer_option, control_character, case_sensitive, with_map=True, counters=None):
+        """This function zooms through non-empty string character by character and returns tuple (normalized, map)
+        where "normalized" is normalized representation of a given string, and "map" is character location map
+        (only populated when *normalizer_option* is 0 and *with_map* is True). Arguments are assumed to be validated
+        by the caller.
+
+        Args:
+            *source_string* is input string to normalize
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *case_sensitive*: when False, string is lowercased before processing
+            *with_map*: when False, character location map is not tracked at all
+            *counters* is list that scanner counters are added to (see self.scan_fragment()), or None
+        """
+        (fragment, f_map, total_length) = self.scan_fragment(source_string, word_separator, normalizer_option, control_character, case_sensitive, with_map, counters)
+        return self.finish_scan(fragment, f_map, word_separator, normalizer_option, control_character, total_length)
+
+    def scan_fragment(self, source_string, word_separator, normalizer_option, control_character, case_sensitive, with_map=True, counters=None):
+        """This function zooms through non-empty string character by character and returns tuple (fragment, map, length)
+        where "fragment" is normalized string before post-processing (with word separators inserted by tokenizer
+        masked by *control_character*, see self.finish_scan()), "map" is character location map of "fragment"
+        (if *with_map* is True), and "length" is length of the string being scanned. Arguments are assumed
+        to be validated by the caller.
+
+        Args:
+            *source_string* is input string to normalize
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *case_sensitive*: when False, string is lowercased before processing
+            *with_map*: when False, character location map is not tracked at all
+            *counters* is list of 5 integers that numbers of characters read, trie steps, backtracks, replacements,
+                and splits (see NormalizerStats) are added to, or None
+        """
+        # TODO: review for refactoring
         original_string = source_string
         parsed_string = source_string
-        subtrie = self.content
-        if '_settings' in subtrie and 'bypass' in subtrie['_settings'] and subtrie['_settings']['bypass'] == '1':
-            self.normalizer_result['normalized'] = original_string
-            self.normalizer_result['map'] = [i for i in range(len(original_string))]
-            self.normalizer_result['r_map'] = [(i, i) for i in range(len(original_string))]
-            return original_string
-        if '_settings' not in subtrie or 'cs' not in subtrie['_settings'] or subtrie['_settings']['cs'] != '1':
+        content = self.content
+        chmap = content['_chmap']
+        separators = (word_separator, control_character)
+        subtrie = content
+        if not case_sensitive:
             parsed_string = parsed_string.lower()
             if normalizer_option != 3:
                 original_string = parsed_string
-        this_fragment = ''
+        assert control_character not in parsed_string and control_character not in original_string, 'Operation aborted: control character is found in parsed string'
+        if self.engine == 'kernel' and kernel_scan is not None and len(original_string) == len(parsed_string):
+            # flat trie is packed once and then only read, so concurrent calls at worst pack it twice
+            flat_trie = self.flat_trie
+            if flat_trie is None:
+                flat_trie = self.compile_kernel()
+                self.flat_trie = flat_trie
+            scanned = kernel_scan(flat_trie, parsed_string, original_string, word_separator, control_character, normalizer_option, with_map, self.align_case, counters)
+            if scanned is not None:
+                return (scanned[0], scanned[1], len(parsed_string))
+        automaton, links, mapped_string, mapped_original, mapped_offsets, mapped_positions, rescan_node = None, None, None, None, None, None, None
+        if self.engine in ('automaton', 'kernel') and len(original_string) == len(parsed_string):
+            # automaton is compiled once and then only read, so concurrent calls at worst compile it twice
+            automaton = self.automaton
+            if automaton is None:
+                automaton = self.compile_automaton()
+                self.automaton = automaton
+            links = automaton[0]
+        # normalized string is assembled in a list of characters, so appending and rolling back are cheap
+        this_fragment = []
+        # buffer only holds the token being matched (it is flushed to this_fragment once the match ends), so it is
+        # never longer than the longest rule plus its replacement, and prepending to it (and to b_map) costs no more than that
         buffer = ''
         last_buffer = ''
         last_replacement = ''
@@ -361,6 +2015,12 @@ class Normalizer():
         b_map = []
         l_map = []
         t_map = []
+        char_classes = self.char_classes
+        if char_classes is None:
+            char_classes = self.compile_char_classes()
+            self.char_classes = char_classes
+        # classes of all characters are looked up at once, characters beyond the table are classified as "?" (63)
+        classes = parsed_string.translate(char_classes).encode('latin-1', 'replace')
         this_group = last_group = self.chargroup(parsed_string[0])
         total_length = int(len(parsed_string))
         character = parsed_string[0]
@@ -372,151 +2032,245 @@ class Normalizer():
         on_the_left = True
         on_the_right = False
         added_separator = False
+        # counters are kept whether or not they are asked for, it is cheaper than checking
+        steps, backtracks, replacements, splits, rescanned = 0, 0, 0, 0, 0
         while current_index < total_length:
             character, original_character = parsed_string[current_index], original_string[current_index]
-            assert control_character not in (character, original_character), 'Operation aborted: control character is found in parsed string'
-            if character in self.content['_chmap']:
-                character = self.content['_chmap'][character]
-                original_character = character
-            this_group = self.chargroup(character)
+            this_group = classes[current_index]
+            if this_group > 3:
+                # character is to be replaced, or it is beyond the table
+                if character in chmap:
+                    character = chmap[character]
+                    original_character = character
+                this_group = this_group & 3 if this_group < 8 else self.chargroup(character)
             on_the_right = False
             added_separator = False
-            if character not in (word_separator, control_character) and last_character not in (word_separator, control_character):
-                if (this_group == 0 or this_group != last_group) and (subtrie is self.content or character not in subtrie):
+            if character not in separators and last_character not in separators:
+                if (this_group == 0 or this_group != last_group) and (subtrie is content or character not in subtrie):
                     if not buffer.endswith(word_separator) and not buffer.endswith(control_character):
                         buffer += control_character
-                        if len(b_map) == len(buffer):
-                            b_map[-1] = current_index
-                        else:
-                            b_map.append(current_index)
+                        if with_map:
+                            if len(b_map) == len(buffer):
+                                b_map[-1] = current_index
+                            else:
+                                b_map.append(current_index)
                     began_reading = False
                     on_the_right = True
                     added_separator = True
-            if not (subtrie is self.content) and character in self.content and temp_index == -1:
+            if not (subtrie is content) and character in content and temp_index == -1:
                 # mark this as potential head
                 temp_index, temp_buffer, t_map = current_index, buffer, list(b_map)
             if character in subtrie:
                 if not began_reading:
-                    if on_the_left and this_fragment != '' and this_fragment[-1:] not in (word_separator, control_character):
-                        this_fragment += control_character
-                        if len(f_map) == len(this_fragment):
-                            f_map[-1] = current_index
-                        else:
-                            f_map.append(current_index)
-                    if (this_fragment.endswith(word_separator) or this_fragment.endswith(control_character)) and (buffer.startswith(word_separator) or buffer.startswith(control_character)):
-                        f_map.pop()
-                        this_fragment = this_fragment[:-1]
+                    if on_the_left and len(this_fragment) > 0 and this_fragment[-1] not in separators:
+                        this_fragment.append(control_character)
+                        if with_map:
+                            if len(f_map) == len(this_fragment):
+                                f_map[-1] = current_index
+                            else:
+                                f_map.append(current_index)
+                    if len(this_fragment) > 0 and this_fragment[-1] in separators and (buffer.startswith(word_separator) or buffer.startswith(control_character)):
+                        if with_map:
+                            f_map.pop()
+                        this_fragment.pop()
                     f_map += b_map
-                    this_fragment += buffer
+                    this_fragment.extend(buffer)
                     buffer = ''
                     b_map = []
-                on_the_left = on_the_left or added_separator or last_character in (word_separator, control_character)
+                on_the_left = on_the_left or added_separator or last_character in separators
                 began_reading = True
                 subtrie = subtrie[character]
+                steps += 1
                 buffer += original_character
-                b_map += [current_index for x in character]
+                if with_map:
+                    b_map += [current_index for x in character]
             else:
-                on_the_right = on_the_right or character in (word_separator, control_character)
-                on_the_left = this_fragment == '' or this_fragment[-1:] in (word_separator, control_character)
+                on_the_right = on_the_right or character in separators
+                on_the_left = len(this_fragment) == 0 or this_fragment[-1] in separators
                 began_reading = False
                 # check what's in the buffer, and do the right thing
                 if '~_' in subtrie:
                     # we may need to apply this replacement in future, so keep buffer value and subtrie['~_']
                     last_buffer = buffer
                     last_replacement = self.align_case(subtrie['~_'], last_buffer, normalizer_option)
-                    l_map = [b_map[0] for i in range(len(last_replacement))]
+                    if with_map:
+                        l_map = [b_map[0] for i in range(len(last_replacement))]
                 if '~_' in subtrie and ((on_the_left and on_the_right) or '~m' in subtrie or ('~l' in subtrie and on_the_left) or ('~r' in subtrie and on_the_right)):
                     # now buffer has token to be replaced
                     buffer = self.align_case(subtrie['~_'], buffer, normalizer_option) + control_character #if not buffer.endswith(word_separator) else ''
-                    b_map = [b_map[0] for i in range(len(buffer))]
+                    if with_map:
+                        b_map = [b_map[0] for i in range(len(buffer))]
                     last_buffer = ''
                     l_map = []
                     temp_index = -1
+                    replacements += 1
                     # now buffer has replaced token
                 if '~l' in subtrie and on_the_left:
+                    splits += 1
                     if not buffer.endswith(word_separator) and not buffer.endswith(control_character):
                         buffer += control_character
-                        if len(b_map) == len(buffer):
-                            b_map[-1] = current_index
-                        else:
-                            b_map.append(current_index)
+                        if with_map:
+                            if len(b_map) == len(buffer):
+                                b_map[-1] = current_index
+                            else:
+                                b_map.append(current_index)
                     temp_index = -1
                 if '~m' in subtrie and not on_the_left and not on_the_right:
+                    splits += 1
                     if not buffer.startswith(word_separator) and not buffer.startswith(control_character):
                         buffer = control_character + buffer
-                        b_map.insert(0, current_index)
+                        if with_map:
+                            b_map.insert(0, current_index)
                     if not buffer.endswith(word_separator) and not buffer.endswith(control_character):
                         buffer += control_character
-                        if len(b_map) == len(buffer):
-                            b_map[-1] = current_index
-                        else:
-                            b_map.append(current_index)
+                        if with_map:
+                            if len(b_map) == len(buffer):
+                                b_map[-1] = current_index
+                            else:
+                                b_map.append(current_index)
                     if last_buffer != '':
-                        f_map = f_map[:-len(last_buffer)] + l_map
-                        this_fragment = this_fragment[:-len(last_buffer)] + last_replacement
+                        if with_map:
+                            del f_map[-len(last_buffer):]
+                            f_map += l_map
+                        del this_fragment[-len(last_buffer):]
+                        this_fragment.extend(last_replacement)
+                        replacements += 1
                     temp_index = -1
                 if '~r' in subtrie and on_the_right:
+                    splits += 1
                     if not buffer.startswith(word_separator) and not buffer.startswith(control_character):
                         buffer = control_character + buffer
-                        b_map.insert(0, current_index)
+                        if with_map:
+                            b_map.insert(0, current_index)
                     temp_index = -1
-                subtrie = self.content
                 if temp_index > -1:
-                    current_index, buffer, b_map = temp_index, temp_buffer, list(t_map) # plain jumping back which causes performance hit, think about better solution
+                    if links is not None:
+                        # remember where reading from potential head will end up, so it is not done character by character
+                        rescan_node = links[id(subtrie)][2]
+                    subtrie = content
+                    backtracks += 1
+                    rescanned += current_index - temp_index + 1
+                    current_index, buffer, b_map = temp_index, temp_buffer, list(t_map)
                     temp_index, temp_buffer, t_map = -1, '', []
                     continue
-                if on_the_left and this_fragment != '' and this_fragment[-1:] not in (word_separator, control_character) and character not in (word_separator, control_character) and not added_separator:
-                    this_fragment += control_character
-                    if len(f_map) == len(this_fragment):
-                        f_map[-1] = current_index
-                    else:
-                        f_map.append(current_index)
-                if (this_fragment.endswith(word_separator) or this_fragment.endswith(control_character)) and (buffer.startswith(word_separator) or buffer.startswith(control_character)):
-                    f_map.pop()
-                    this_fragment = this_fragment[:-1]
+                subtrie = content
+                if on_the_left and len(this_fragment) > 0 and this_fragment[-1] not in separators and character not in separators and not added_separator:
+                    this_fragment.append(control_character)
+                    if with_map:
+                        if len(f_map) == len(this_fragment):
+                            f_map[-1] = current_index
+                        else:
+                            f_map.append(current_index)
+                if len(this_fragment) > 0 and this_fragment[-1] in separators and (buffer.startswith(word_separator) or buffer.startswith(control_character)):
+                    if with_map:
+                        f_map.pop()
+                    this_fragment.pop()
                 f_map += b_map
-                this_fragment += buffer
+                this_fragment.extend(buffer)
                 buffer = original_character
-                b_map = [current_index for x in character]
+                b_map = [current_index for x in character] if with_map else []
                 on_the_left = False
-                if character in self.content:
-                    on_the_left = added_separator or last_character in (word_separator, control_character)
+                if character in content:
+                    on_the_left = added_separator or last_character in separators
                     began_reading = True
-                    subtrie = self.content[character]
+                    subtrie = content[character]
+                    steps += 1
             last_group = this_group
             last_character = character
             current_index += 1
+            if rescan_node is not None:
+                # follow failure link: jump over characters that would be read along the trie path once again
+                (depth, head, _) = links[id(rescan_node)]
+                next_index = current_index - 1 + depth
+                if next_index > current_index:
+                    if mapped_string is None:
+                        (mapped_string, mapped_original, mapped_offsets, mapped_positions) = self.map_positions(parsed_string, original_string, chmap, automaton[1])
+                    if head > -1:
+                        temp_index = current_index - 1 + head
+                        if mapped_offsets is None:
+                            temp_buffer = buffer + mapped_original[current_index:temp_index]
+                            if with_map:
+                                t_map = b_map + list(range(current_index, temp_index))
+                        else:
+                            temp_buffer = buffer + mapped_original[mapped_offsets[current_index]:mapped_offsets[temp_index]]
+                            if with_map:
+                                t_map = b_map + mapped_positions[mapped_offsets[current_index]:mapped_offsets[temp_index]]
+                    if not on_the_left:
+                        on_the_left = word_separator in mapped_string[current_index-1:next_index-1] or control_character in mapped_string[current_index-1:next_index-1]
+                    if mapped_offsets is None:
+                        buffer += mapped_original[current_index:next_index]
+                        if with_map:
+                            b_map += range(current_index, next_index)
+                    else:
+                        buffer += mapped_original[mapped_offsets[current_index]:mapped_offsets[next_index]]
+                        if with_map:
+                            b_map += mapped_positions[mapped_offsets[current_index]:mapped_offsets[next_index]]
+                    subtrie = rescan_node
+                    rescanned -= next_index - current_index
+                    last_character = mapped_string[next_index-1]
+                    last_group = self.chargroup(last_character)
+                    current_index = next_index
+                rescan_node = None
         # check what's in the buffer, and do the right thing
         # DRY!
         on_the_right = True
-        on_the_left = this_fragment == '' or this_fragment[-1:] in (word_separator, control_character)
+        on_the_left = len(this_fragment) == 0 or this_fragment[-1] in separators
         if '~_' in subtrie and ((on_the_left and on_the_right) or '~m' in subtrie or ('~l' in subtrie and on_the_left) or ('~r' in subtrie and on_the_right)):
             buffer = self.align_case(subtrie['~_'], buffer, normalizer_option)
-            b_map = [b_map[0] for i in range(len(buffer))]
+            if with_map:
+                b_map = [b_map[0] for i in range(len(buffer))]
             last_buffer = ''
             l_map = []
+            replacements += 1
         if '~r' in subtrie and on_the_right:
+            splits += 1
             if not buffer.startswith(word_separator) and not buffer.startswith(control_character):
                 buffer = word_separator + buffer
-                b_map.insert(0, total_length - 1)
+                if with_map:
+                    b_map.insert(0, total_length - 1)
             if last_buffer != '':
                 f_map += l_map
-                this_fragment = this_fragment[:-len(last_buffer)] + last_replacement
-        if on_the_left and this_fragment[-1:] not in (word_separator, control_character):
-            this_fragment += control_character
-            f_map.append(total_length - 1)
-        if (this_fragment.endswith(word_separator) or this_fragment.endswith(control_character)) and (buffer.startswith(word_separator) or buffer.startswith(control_character)):
-            f_map.pop()
-            this_fragment = this_fragment[:-1]
+                del this_fragment[-len(last_buffer):]
+                this_fragment.extend(last_replacement)
+                replacements += 1
+        if on_the_left and (len(this_fragment) == 0 or this_fragment[-1] not in separators):
+            this_fragment.append(control_character)
+            if with_map:
+                f_map.append(total_length - 1)
+        if len(this_fragment) > 0 and this_fragment[-1] in separators and (buffer.startswith(word_separator) or buffer.startswith(control_character)):
+            if with_map:
+                f_map.pop()
+            this_fragment.pop()
         f_map += b_map
-        this_fragment += buffer
-        while this_fragment.startswith(word_separator) or this_fragment.startswith(control_character):
-            this_fragment = this_fragment[len(word_separator):]
-            f_map = f_map[len(word_separator):]
-        while this_fragment.endswith(word_separator) or this_fragment.endswith(control_character):
-            this_fragment = this_fragment[:-len(word_separator)]
-            f_map = f_map[:-len(word_separator)]
-        normalized = this_fragment
+        this_fragment.extend(buffer)
+        i = 0
+        while i < len(this_fragment) and this_fragment[i] in separators:
+            i += 1
+        del this_fragment[:i]
+        del f_map[:i]
+        while len(this_fragment) > 0 and this_fragment[-1] in separators:
+            this_fragment.pop()
+            del f_map[-1:]
+        if counters is not None:
+            counters[0] += total_length + rescanned
+            counters[1] += steps
+            counters[2] += backtracks
+            counters[3] += replacements
+            counters[4] += splits
+        return (''.join(this_fragment), f_map, total_length)
+
+    def finish_scan(self, normalized, f_map, word_separator, normalizer_option, control_character, total_length):
+        """This function takes string assembled by the scanner (with word separators masked by control character)
+        and its character location map, and returns tuple (normalized, map) as described in self.scan().
+
+        Args:
+            *normalized* is string assembled by the scanner
+            *f_map* is character location map of *normalized*
+            *word_separator* is word separator to consider (must be single character)
+            *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+            *control_character* is character masking word separator (must be single character)
+            *total_length* is length of string being normalized
+        """
         if normalizer_option == 3:
             normalized = normalized.replace(control_character, '')
         else:
@@ -527,33 +2281,127 @@ class Normalizer():
             normalized = word_separator.join(sorted(set(normalized.split(word_separator))))
         elif len(f_map) > 0 and normalizer_option == 0:
             f_map[-1] = total_length - 1
-            self.normalizer_result['map'] = f_map
-            self.normalizer_result['r_map'] = self.reverse_map(self.normalizer_result['map'])
-        self.normalizer_result['normalized'] = normalized
-        return normalized
+            return (normalized, f_map)
+        return (normalized, [])
 
-    def save(self, filename):
-        """This method pickles normalizer to a file.
+    def save(self, filename, pickled=False):
+        """This method saves compiled tokenizer to a file, either in binary model format (see CompactTrie.write()),
+        or pickled (for backward compatibility).
 
         Args:
             *filename* is path/filename to save Normalizer object to
+            *pickled*: when True, trie is pickled as nested dictionary structure
         """
-        with open(filename, mode='wb') as f:
-            pickle.dump(self.data, f)
+        if pickled:
+            with open(filename, mode='wb') as f:
+                pickle.dump(self.data.decompile() if isinstance(self.data, CompactTrie) else self.data, f)
+        elif isinstance(self.data, CompactTrie):
+            self.data.write(filename)
+        else:
+            CompactTrie(self.data).write(filename)
 
-    def load(self, filename):
-        """This function unpickles normalizer from a file.
+    def load(self, filename, mapped=False):
+        """This function loads compiled tokenizer from a file, either in binary model format, or pickled.
+        Trie read from binary model file is unpacked into nested dictionary structure, so that automaton engine
+        can be used, unless *mapped* is True (the tokenizer is then kept as CompactTrie).
 
         Args:
             *filename* is path/filename to load Normalizer object from
+            *mapped*: when True, binary model file is memory-mapped and queried in place
         """
         with open(filename, mode='rb') as f:
-            self.data = pickle.load(f)
+            magic = f.read(len(CompactTrie.magic))
+        if magic == CompactTrie.magic:
+            trie = CompactTrie()
+            trie.read(filename, mapped)
+            self.data = trie if mapped else trie.decompile()
+        else:
+            with open(filename, mode='rb') as f:
+                self.data = pickle.load(f)
+
+__parallel_normalizer__ = None
+__parallel_model__ = None
+__char_classes__ = None
+
+def base_char_classes():
+    """This function returns table for str.translate() that maps every character of Basic Multilingual Plane
+    to its group (see Normalizer.chargroup()). The table does not depend on tokenizer, so it is built once.
+    """
+    global __char_classes__
+    if __char_classes__ is None:
+        __char_classes__ = bytes([1 if x.isalpha() else 2 if x.isnumeric() else 0 for x in map(chr, range(0x10000))])
+    return __char_classes__
+
+def readonly_view(data):
+    """This function returns read-only memoryview of *data* (object that supports buffer protocol).
+    Before Python 3.8, memoryview cannot be made read-only, so the view of immutable copy of *data* is returned.
+    """
+    view = memoryview(data)
+    if hasattr(view, 'toreadonly'):
+        return view.toreadonly()
+    return memoryview(bytes(view)).cast(view.format)
+
+def chunk_iterable(items, chunksize):
+    """This generator splits iterable *items* into lists of at most *chunksize* items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def init_parallel_worker(tokenizer_name, content):
+    """This function is the initializer of worker process used by Normalizer.normalize_parallel():
+    it keeps Normalizer with given compiled trie in global scope of worker process.
+
+    Args:
+        *tokenizer_name* is name of tokenizer
+        *content* is compiled trie (Normalizer.data)
+    """
+    global __parallel_normalizer__
+    __parallel_normalizer__ = Normalizer(tokenizer_name)
+    __parallel_normalizer__.data = content
+
+def run_parallel_worker(task):
+    """This function normalizes chunk of strings in worker process used by Normalizer.normalize_parallel().
+
+    Args:
+        *task* is tuple (chunk, word_separator, normalizer_option, control_character, with_map)
+    """
+    return run_batch(__parallel_normalizer__, task)
+
+def run_model_worker(model, task):
+    """This function normalizes chunk of strings in worker process used by Normalizer.anormalize_many(),
+    loading Normalizer from model file on first call in the process (and keeping it in global scope).
+
+    Args:
+        *model* is tuple (tokenizer_name, filename, mapped) (see Normalizer.load())
+        *task* is tuple (chunk, word_separator, normalizer_option, control_character, with_map)
+    """
+    global __parallel_normalizer__, __parallel_model__
+    if __parallel_model__ != model:
+        normalizer = Normalizer(model[0])
+        normalizer.load(model[1], model[2])
+        (__parallel_normalizer__, __parallel_model__) = (normalizer, model)
+    return run_batch(__parallel_normalizer__, task)
+
+def run_batch(normalizer, task):
+    """This function normalizes chunk of strings with *normalizer* and returns list of results
+    (used by Normalizer.normalize_parallel() and Normalizer.anormalize_many()).
+
+    Args:
+        *normalizer* is Normalizer object
+        *task* is tuple (chunk, word_separator, normalizer_option, control_character, with_map)
+    """
+    (chunk, word_separator, normalizer_option, control_character, with_map) = task
+    return list(normalizer.normalize_batch(chunk, word_separator, normalizer_option, control_character, with_map))
 
 class Builder():
     """This class is the builder for Normalizer."""
 
-    def __init__(self, debug_mode=False, verbose_mode=False):
+    def __init__(self, debug_mode=False, verbose_mode=False, cache_dir=None, cache_size=16):
         self.debug = debug_mode
         self.verbose = verbose_mode
         self.logger = logging.info if self.verbose else logging.debug
@@ -561,6 +2409,31 @@ class Builder():
             logging.root.setLevel(logging.INFO)
         if self.debug:
             logging.basicConfig(level=logging.DEBUG)
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        # absolute paths of files imported by configuration of most recently built Normalizer
+        self.imports = []
+
+    def emit_rule(self, element, rules):
+        """This function adds tokenization rule defined by XML element *element* to dict object *rules*
+        as a key (action, parameter, subject), so that repeated rules are only kept once and in order of appearance.
+        Elements that do not define tokenization rules are ignored.
+
+        Args:
+            xml.etree.ElementTree.Element *element* is XML element object
+            dict *rules* is dict object to populate
+        """
+        if element.tag == 'setting':
+            rules[('set', element.attrib['name'], element.attrib['value'])] = None
+        elif element.tag == 'split':
+            rules[('s', element.attrib['where'], element.attrib['value'])] = None
+        elif element.tag == 'token':
+            rules[('r', element.attrib['to'], element.attrib['from'])] = None
+        elif element.tag == 'character':
+            rules[('c', element.attrib['to'], element.attrib['from'])] = None
+        else:
+            return False
+        return True
 
     def wrap_result(self, root, address, keyhole, key, parent, child):
         """This function populates dict object *keyhole* with the data retrieved from XML element *root* as follows:
@@ -584,28 +2457,42 @@ class Builder():
         return True
 
     def convert_xml(self, filename, res, batch_name):
-        """This function zooms through XML file with a tokenizer config,
-        resolves imports, and returns list of tokenization rules as a dict object.
+        """This function streams through XML file with a tokenizer config,
+        resolves imports, and returns tokenization rules as a dict object.
+        Each file is parsed only once per build, no matter how many times it is imported.
 
         Args:
             str *filename* is XML file defining the configuration of a tokenizer
-            dict *res* is initial dict with tokenization rules
+            dict *res* is dict with tokenization rules collected so far (None to start a new build)
             str *batch_name* is name of tokenizer
         """
-        result = res if res else {'name': filename if batch_name == '' else batch_name}
-        tree = et.parse(filename)
-        root = tree.getroot()
-        if 'name' in root.attrib and batch_name == '':
-            result['name'] = root.attrib['name']
-        import_elements = root.findall('./import')
-        if import_elements:
-            for import_element in import_elements:
-                import_filename = '{0}/{1}'.format(os.path.dirname(filename), import_element.attrib['file']) if os.path.dirname(filename) else import_element.attrib['file']
-                result = {**result, **self.convert_xml(import_filename, result, result['name'])}
-        self.wrap_result(root, './setting', result, 'set', 'name', 'value')
-        self.wrap_result(root, './split', result, 's', 'where', 'value')
-        self.wrap_result(root, './token', result, 'r', 'to', 'from')
-        self.wrap_result(root, './character', result, 'c', 'to', 'from')
+        result = res if res else {'name': filename if batch_name == '' else batch_name, 'rules': dict(), 'loaded': set(), 'loading': []}
+        path = os.path.abspath(filename)
+        if path in result['loading']:
+            raise RecursionError('Circular import of tokenizer config "%s"' % (filename))
+        if path in result['loaded']:
+            return result
+        result['loading'].append(path)
+        depth, root = 0, None
+        for event, element in et.iterparse(filename, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 1:
+                    root = element
+                    if 'name' in root.attrib and batch_name == '':
+                        result['name'] = root.attrib['name']
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            if element.tag == 'import':
+                import_filename = '{0}/{1}'.format(os.path.dirname(filename), element.attrib['file']) if os.path.dirname(filename) else element.attrib['file']
+                self.convert_xml(import_filename, result, result['name'])
+            else:
+                self.emit_rule(element, result['rules'])
+            root.clear()
+        result['loading'].pop()
+        result['loaded'].add(path)
         return result
 
     def expose_tokenizer(self, file_xml):
@@ -617,32 +2504,139 @@ class Builder():
             str *file_xml* is XML file defining the configuration of a tokenizer
         """
         data = self.convert_xml(file_xml, None, '')
-        if 'cs' in data['set'] and len(data['set']['cs']) > 1:
-            del data['set']['cs']
+        return (data['name'], self.dump_rules(data, file_xml))
+
+    def dump_rules(self, data, file_xml):
+        """This function returns tokenization rules collected by Builder.convert_xml() as str
+        (one rule per line, grouped by action).
+
+        Args:
+            dict *data* is dict object returned by Builder.convert_xml()
+            str *file_xml* is XML file the rules were collected from
+        """
+        rules = data['rules']
+        cs = [rule for rule in rules if rule[0] == 'set' and rule[1] == 'cs']
+        if len(cs) > 1:
+            for rule in cs:
+                del rules[rule]
             logging.warning('Multiple values for "cs" setting of tokenizer in {0} - ignoring this setting!'.format(file_xml))
-        ret = ''
+        ret = []
         for key in ['set', 's', 'r', 'c']:
-            for prop in data[key]:
-                for value in data[key][prop]:
-                    ret += '%s\t%s\t%s\n' % (key, prop, value)
-        return (data['name'], ret)
+            ret.extend(['%s\t%s\t%s\n' % rule for rule in rules if rule[0] == key])
+        return ''.join(ret)
+
+    def hash_file(self, filename):
+        """This function returns SHA-256 hex digest of the content of file *filename*."""
+        digest = hashlib.sha256()
+        with open(filename, mode='rb') as f:
+            chunk = f.read(1048576)
+            while chunk:
+                digest.update(chunk)
+                chunk = f.read(1048576)
+        return digest.hexdigest()
+
+    def cache_key(self, endpoint):
+        """This function returns key under which compiled model built from *endpoint* is cached:
+        SHA-256 hex digest of the content of XML file (imported files are checked against cache manifest),
+        or of str(Model) for Model instance.
+
+        Args:
+            *endpoint* is either Model instance, or path to XML file defining the configuration of a tokenizer
+        """
+        if isinstance(endpoint, Model):
+            content = hashlib.sha256(str(endpoint).encode('utf8')).hexdigest()
+        else:
+            content = self.hash_file(endpoint)
+        return hashlib.sha256(('%s:%d' % (content, CompactTrie.version)).encode('utf8')).hexdigest()
+
+    def load_cached(self, key, endpoint):
+        """This function loads compiled model cached under *key* and returns Normalizer object,
+        or None if there is no such model in cache, or if any of files imported by *endpoint* has changed since.
+        Trie of the model is unpacked into nested dictionary structure (see Normalizer.load()), so the Normalizer
+        normalizes strings as fast as freshly built one.
+
+        Args:
+            str *key* is cache key (see Builder.cache_key())
+            *endpoint* is either Model instance, or path to XML file defining the configuration of a tokenizer
+        """
+        manifest_filename = '%s/%s.json' % (self.cache_dir, key)
+        try:
+            with open(manifest_filename, mode='r', encoding='utf8') as f:
+                manifest = json.load(f)
+            root = os.path.dirname(os.path.abspath(endpoint)) if manifest['imports'] else ''
+            for (filename, digest) in manifest['imports']:
+                if self.hash_file(os.path.join(root, filename)) != digest:
+                    return None
+            machine = Normalizer(manifest['name'], self.debug, self.verbose)
+            machine.load('%s/%s.model' % (self.cache_dir, key))
+            os.utime(manifest_filename)
+            self.imports = [os.path.abspath(os.path.join(root, filename)) for (filename, digest) in manifest['imports']]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        self.logger('Endpoint %s: Loaded compiled model from cache (%s)' % (endpoint, key))
+        return machine
+
+    def store_cached(self, key, endpoint, machine, imports):
+        """This function saves compiled model of Normalizer *machine* to cache under *key*,
+        and evicts least recently used models if there are more than Builder.cache_size of them.
+
+        Args:
+            str *key* is cache key (see Builder.cache_key())
+            *endpoint* is either Model instance, or path to XML file defining the configuration of a tokenizer
+            Normalizer *machine* is Normalizer object to cache
+            list *imports* is list of paths to files imported by *endpoint*
+        """
+        root = os.path.dirname(os.path.abspath(endpoint)) if imports else ''
+        manifest = {'name': machine.name, 'imports': [[os.path.relpath(filename, root), self.hash_file(filename)] for filename in imports]}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        machine.save('%s/%s.model' % (self.cache_dir, key))
+        (handle, temp_filename) = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(handle, mode='w', encoding='utf8') as f:
+            json.dump(manifest, f)
+        os.replace(temp_filename, '%s/%s.json' % (self.cache_dir, key))
+        if self.cache_size > 0:
+            manifests = sorted([entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.json')], key=os.path.getmtime, reverse=True)
+            for entry in manifests[self.cache_size:]:
+                for filename in [entry.path, '%s.model' % (entry.path[:-5])]:
+                    try:
+                        os.remove(filename)
+                    except OSError:
+                        pass
+        return True
 
     def build_normalizer(self, endpoint=None):
         """This function loads configuration, constructs Normalizer with this configuration,
-        and returns created Normalizer object.
+        and returns created Normalizer object. If Builder.cache_dir is set, compiled model is loaded from cache
+        when neither configuration nor any of its imports has changed, and is saved to cache otherwise.
+        Files imported by the configuration are listed in Builder.imports afterwards.
 
         Args:
             *endpoint* is either Model instance, or path to XML file defining the configuration of a tokenizer
         """
         if not endpoint:
             endpoint = '%s/tokenizer.standard.xml' % (os.path.abspath(os.path.dirname(__file__)))
+        self.imports = []
+        key = self.cache_key(endpoint) if self.cache_dir else None
+        if key:
+            machine = self.load_cached(key, endpoint)
+            if machine is not None:
+                return machine
+        imports = []
         if isinstance(endpoint, Model):
             batch_name, data = None, str(endpoint)
             machine = Normalizer(batch_name, self.debug, self.verbose)
         else:
-            (batch_name, data) = self.expose_tokenizer(endpoint)
+            xml_data = self.convert_xml(endpoint, None, '')
+            (batch_name, data) = (xml_data['name'], self.dump_rules(xml_data, endpoint))
+            imports = sorted(xml_data['loaded'] - {os.path.abspath(endpoint)})
             machine = Normalizer(batch_name, self.debug, self.verbose)
+        self.imports = imports
         built = machine.make_tokenizer(data)
         if not built:
             logging.critical('Endpoint %s: Could not build normalizer' % (endpoint))
+        elif key:
+            try:
+                self.store_cached(key, endpoint, machine, imports)
+            except OSError as e:
+                logging.warning('Endpoint %s: Could not save compiled model to cache %s (%s)' % (endpoint, self.cache_dir, e))
         return machine
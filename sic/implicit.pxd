@@ -1,16 +1,101 @@
 import cython
 
 cdef public __normalizer__
-cdef public dict __normalizer_result__
+cdef public __normalizer_result__
 
 cpdef build_normalizer(
+    endpoint=*,
+    str cache_dir=*,
+    int cache_size=*
+)
+
+cpdef str registry_key(
+    endpoint
+)
+
+cpdef tuple registry_stamp(
+    endpoint,
+    list imports
+)
+
+@cython.locals(
+    key=cython.str,
+    entry=cython.tuple,
+    stamp=cython.tuple
+)
+cpdef registered_normalizer(
+    endpoint
+)
+
+cpdef preload(
+    endpoint=*
+)
+
+cpdef evict(
     endpoint=*
 )
 
+cpdef clear()
+
+cpdef normalize_parallel(
+    source_strings,
+    str word_separator=*,
+    int normalizer_option=*,
+    str control_character=*,
+    bint with_map=*,
+    workers=*,
+    int chunksize=*
+)
+
+cpdef normalize_columnar(
+    source_strings,
+    str word_separator=*,
+    int normalizer_option=*,
+    str control_character=*,
+    bint with_map=*
+)
+
+cpdef normalize_column(
+    column,
+    str word_separator=*,
+    int normalizer_option=*,
+    str control_character=*,
+    workers=*,
+    int chunksize=*
+)
+
+cpdef normalize_tokens(
+    str source_string,
+    str word_separator=*,
+    int normalizer_option=*,
+    str control_character=*,
+    bint as_arrays=*
+)
+
+cpdef normalize_stream(
+    chunks,
+    str word_separator=*,
+    int normalizer_option=*,
+    str control_character=*,
+    bint with_map=*
+)
+
+cpdef anormalize_many(
+    source_strings,
+    str word_separator=*,
+    int normalizer_option=*,
+    str control_character=*,
+    bint with_map=*,
+    executor=*,
+    workers=*,
+    int chunksize=*,
+    int max_pending=*
+)
+
 cpdef result()
 
 cpdef reset()
 
-cpdef save(str filename)
+cpdef save(str filename, bint pickled=*)
 
-cpdef load(str filename)
+cpdef load(str filename, bint mapped=*)
@@ -1,7 +1,11 @@
-from .core import Normalizer, Builder
+import os
+import threading
+from .core import Normalizer, Builder, Model, ResultCache
 
 __normalizer__ = None
 __normalizer_result__ = None
+__normalizers__ = ResultCache(16)
+__registry_lock__ = threading.Lock()
 
 def __getattr__(name):
     global __normalizer_result__
@@ -9,16 +13,93 @@ def __getattr__(name):
         return __normalizer_result__
     raise AttributeError('Module "{__name__}" has no attribute "{name}".')
 
-def build_normalizer(endpoint=None):
+def build_normalizer(endpoint=None, cache_dir=None, cache_size=16):
     """This method loads configuration and constructs Normalizer with this configuration.
 
     Args:
         *endpoint* is either sic.Model instance, or path to XML file defining the configuration of a tokenizer
+        *cache_dir* is directory to cache compiled models in (None to disable caching)
+        *cache_size* is maximum number of compiled models kept in *cache_dir* (0 for no limit)
     """
     global __normalizer__
-    __builder__ = Builder()
+    __builder__ = Builder(cache_dir=cache_dir, cache_size=cache_size)
     __normalizer__ = __builder__.build_normalizer(endpoint)
 
+def registry_key(endpoint):
+    """This function returns key under which normalizer built from *endpoint* is registered:
+    absolute path of XML file, or content of sic.Model instance.
+
+    Args:
+        *endpoint* is either sic.Model instance, or path to XML file defining the configuration of a tokenizer
+            (if None, default configuration is used)
+    """
+    if isinstance(endpoint, Model):
+        return str(endpoint)
+    if not endpoint:
+        endpoint = '%s/tokenizer.standard.xml' % (os.path.dirname(os.path.abspath(__file__)))
+    return os.path.abspath(endpoint)
+
+def registry_stamp(endpoint, imports):
+    """This function returns tuple of modification times of XML file and of files it imports,
+    which normalizer registered for *endpoint* is checked against, or None for sic.Model instance.
+
+    Args:
+        *endpoint* is either sic.Model instance, or path to XML file defining the configuration of a tokenizer
+        *imports* is list of paths to files imported by *endpoint* (see sic.Builder.imports)
+    """
+    if isinstance(endpoint, Model):
+        return None
+    return tuple([os.path.getmtime(x) for x in [registry_key(endpoint)] + imports])
+
+def registered_normalizer(endpoint):
+    """This function returns Normalizer built from *endpoint*, building and registering it
+    if it is not registered yet, or if XML file or any of files it imports has been modified since.
+
+    Args:
+        *endpoint* is either sic.Model instance, or path to XML file defining the configuration of a tokenizer
+    """
+    key = registry_key(endpoint)
+    with __registry_lock__:
+        entry = __normalizers__.get(key)
+    if entry is not None:
+        try:
+            if entry[0] == registry_stamp(endpoint, entry[2]):
+                return entry[1]
+        except OSError:
+            pass
+    builder = Builder()
+    normalizer = builder.build_normalizer(endpoint)
+    stamp = registry_stamp(endpoint, builder.imports)
+    with __registry_lock__:
+        __normalizers__.put(key, (stamp, normalizer, builder.imports))
+    return normalizer
+
+def preload(endpoint=None):
+    """This method builds normalizer and keeps it in registry of normalizers used by normalize(tokenizer_config=...).
+    Registry holds up to 16 normalizers; least recently used ones are evicted.
+
+    Args:
+        *endpoint* is either sic.Model instance, or path to XML file defining the configuration of a tokenizer
+            (if None, default configuration is used)
+    """
+    registered_normalizer(endpoint)
+
+def evict(endpoint=None):
+    """This method removes normalizer from registry of normalizers used by normalize(tokenizer_config=...).
+
+    Args:
+        *endpoint* is either sic.Model instance, or path to XML file defining the configuration of a tokenizer
+            (if None, default configuration is used)
+    """
+    with __registry_lock__:
+        __normalizers__.pop(registry_key(endpoint))
+
+def clear():
+    """This method removes all normalizers from registry of normalizers used by normalize(tokenizer_config=...).
+    """
+    with __registry_lock__:
+        __normalizers__.clear()
+
 def normalize(*args, **kwargs):
     """This function zooms through the provided string character by character
     and returns string which is normalized representation of a given string.
@@ -27,25 +108,155 @@ def normalize(*args, **kwargs):
         *source_string* is input string to normalize
         *word_separator* is word separator to consider (must be single character)
         *normalizer_option* is integer either 0 (normal, default), 1 (list), or 2 (set)
+        *control_character* is character masking word separator (must be single character)
+        *with_map*: when False, character location maps are neither tracked nor stored in sic.result
     """
     kwargs['source_string'] = args[0] if len(args) > 0 else kwargs['source_string'] if 'source_string' in kwargs else ''
     kwargs['word_separator'] = args[1] if len(args) > 1 else kwargs['word_separator'] if 'word_separator' in kwargs else ' '
     kwargs['normalizer_option'] = args[2] if len(args) > 2 else kwargs['normalizer_option'] if 'normalizer_option' in kwargs else 0
     kwargs['control_character'] = args[3] if len(args) > 3 else kwargs['control_character'] if 'control_character' in kwargs else '\x00'
+    kwargs['with_map'] = args[4] if len(args) > 4 else kwargs['with_map'] if 'with_map' in kwargs else True
     global __normalizer_result__
     if 'tokenizer_config' in kwargs:
-        builder = Builder()
-        normalizer = builder.build_normalizer(kwargs['tokenizer_config'])
-        result = normalizer.normalize(kwargs['source_string'], kwargs['word_separator'], kwargs['normalizer_option'], kwargs['control_character'])
-        __normalizer_result__ = normalizer.normalizer_result
-        return result
+        # registered normalizer is shared by threads, so its normalizer_result must not be relied upon
+        normalizer = registered_normalizer(kwargs['tokenizer_config'])
+        __normalizer_result__ = normalizer.normalize_ex(kwargs['source_string'], kwargs['word_separator'], kwargs['normalizer_option'], kwargs['control_character'], kwargs['with_map'])
+        return __normalizer_result__.normalized
     global __normalizer__
     if not  __normalizer__:
         build_normalizer()
-    result = __normalizer__.normalize(kwargs['source_string'], kwargs['word_separator'], kwargs['normalizer_option'], kwargs['control_character'])
+    result = __normalizer__.normalize(kwargs['source_string'], kwargs['word_separator'], kwargs['normalizer_option'], kwargs['control_character'], kwargs['with_map'])
     __normalizer_result__ = __normalizer__.normalizer_result
     return result
 
+def normalize_ex(*args, **kwargs):
+    """This function normalizes the provided string and returns sic.NormalizerResult object.
+    Unlike normalize(), it does not update sic.result, so it is safe to call from multiple threads.
+
+    Args:
+        *source_string* is input string to normalize
+        *word_separator* is word separator to consider (must be single character)
+        *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+        *control_character* is character masking word separator (must be single character)
+        *with_map*: when False, character location maps are not tracked
+    """
+    kwargs['source_string'] = args[0] if len(args) > 0 else kwargs['source_string'] if 'source_string' in kwargs else ''
+    kwargs['word_separator'] = args[1] if len(args) > 1 else kwargs['word_separator'] if 'word_separator' in kwargs else ' '
+    kwargs['normalizer_option'] = args[2] if len(args) > 2 else kwargs['normalizer_option'] if 'normalizer_option' in kwargs else 0
+    kwargs['control_character'] = args[3] if len(args) > 3 else kwargs['control_character'] if 'control_character' in kwargs else '\x00'
+    kwargs['with_map'] = args[4] if len(args) > 4 else kwargs['with_map'] if 'with_map' in kwargs else True
+    if 'tokenizer_config' in kwargs:
+        normalizer = registered_normalizer(kwargs['tokenizer_config'])
+    else:
+        if not __normalizer__:
+            build_normalizer()
+        normalizer = __normalizer__
+    return normalizer.normalize_ex(kwargs['source_string'], kwargs['word_separator'], kwargs['normalizer_option'], kwargs['control_character'], kwargs['with_map'])
+
+def normalize_parallel(source_strings, word_separator=' ', normalizer_option=0, control_character='\x00', with_map=False, workers=None, chunksize=1000):
+    """This function normalizes strings in a pool of worker processes using global Normalizer
+    and returns generator that yields results in the same order as in input.
+
+    Args:
+        *source_strings* is iterable of input strings to normalize
+        *word_separator* is word separator to consider (must be single character)
+        *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+        *control_character* is character masking word separator (must be single character)
+        *with_map*: when True, dict objects shaped as sic.result are yielded instead of strings
+        *workers* is number of worker processes (defaults to number of CPUs)
+        *chunksize* is number of strings sent to a worker process at once
+    """
+    global __normalizer__
+    if not __normalizer__:
+        build_normalizer()
+    return __normalizer__.normalize_parallel(source_strings, word_separator, normalizer_option, control_character, with_map, workers, chunksize)
+
+def normalize_columnar(source_strings, word_separator=' ', normalizer_option=0, control_character='\x00', with_map=False):
+    """This function normalizes strings using global Normalizer and returns sic.ColumnarResult object
+    where normalized strings (and character location maps) are concatenated into flat buffers with offsets.
+
+    Args:
+        *source_strings* is iterable of input strings to normalize
+        *word_separator* is word separator to consider (must be single character)
+        *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+        *control_character* is character masking word separator (must be single character)
+        *with_map*: when True, character location maps are concatenated as well
+    """
+    global __normalizer__
+    if not __normalizer__:
+        build_normalizer()
+    return __normalizer__.normalize_columnar(source_strings, word_separator, normalizer_option, control_character, with_map)
+
+def normalize_column(column, word_separator=' ', normalizer_option=0, control_character='\x00', workers=1, chunksize=1000):
+    """This function normalizes column of strings (pandas.Series, pyarrow.Array, pyarrow.ChunkedArray, or iterable)
+    using global Normalizer, normalizing each distinct string once (see sic.Normalizer.normalize_column()).
+
+    Args:
+        *column* is pandas.Series, pyarrow.Array, pyarrow.ChunkedArray, or iterable of input strings to normalize
+        *word_separator* is word separator to consider (must be single character)
+        *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+        *control_character* is character masking word separator (must be single character)
+        *workers* is number of worker processes distinct strings are normalized in
+        *chunksize* is number of strings sent to a worker process at once
+    """
+    global __normalizer__
+    if not __normalizer__:
+        build_normalizer()
+    return __normalizer__.normalize_column(column, word_separator, normalizer_option, control_character, workers, chunksize)
+
+def normalize_tokens(source_string, word_separator=' ', normalizer_option=0, control_character='\x00', as_arrays=False):
+    """This function normalizes the provided string using global Normalizer and returns list of tuples
+    (token, start, end) locating each token of normalized string in the input (see sic.Normalizer.normalize_tokens()).
+    Unlike normalize(), it does not update sic.result.
+
+    Args:
+        *source_string* is input string to normalize
+        *word_separator* is word separator to consider (must be single character)
+        *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+        *control_character* is character masking word separator (must be single character)
+        *as_arrays*: when True, tuple (tokens, starts, ends) is returned instead
+    """
+    global __normalizer__
+    if not __normalizer__:
+        build_normalizer()
+    return __normalizer__.normalize_tokens(source_string, word_separator, normalizer_option, control_character, as_arrays)
+
+def normalize_stream(chunks, word_separator=' ', normalizer_option=0, control_character='\x00', with_map=False):
+    """This function normalizes text that comes in chunks using global Normalizer and returns generator
+    that yields normalized text piece by piece (see sic.Normalizer.normalize_stream()).
+
+    Args:
+        *chunks* is iterable of strings to normalize as one text
+        *word_separator* is word separator to consider (must be single character)
+        *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+        *control_character* is character masking word separator (must be single character)
+        *with_map*: when True, tuples (piece, map) are yielded instead of strings
+    """
+    global __normalizer__
+    if not __normalizer__:
+        build_normalizer()
+    return __normalizer__.normalize_stream(chunks, word_separator, normalizer_option, control_character, with_map)
+
+def anormalize_many(source_strings, word_separator=' ', normalizer_option=0, control_character='\x00', with_map=False, executor=None, workers=None, chunksize=1000, max_pending=4):
+    """This function normalizes strings in batches offloaded to executor using global Normalizer
+    and returns asynchronous generator that yields results in the same order as in input.
+
+    Args:
+        *source_strings* is iterable or asynchronous iterable of input strings to normalize
+        *word_separator* is word separator to consider (must be single character)
+        *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+        *control_character* is character masking word separator (must be single character)
+        *with_map*: when True, dict objects shaped as sic.result are yielded instead of strings
+        *executor* is either None (default executor of event loop), 'thread', 'process', or concurrent.futures.Executor instance
+        *workers* is number of workers when *executor* is 'thread' or 'process'
+        *chunksize* is number of strings in a batch
+        *max_pending* is maximum number of batches being normalized at once
+    """
+    global __normalizer__
+    if not __normalizer__:
+        build_normalizer()
+    return __normalizer__.anormalize_many(source_strings, word_separator, normalizer_option, control_character, with_map, executor, workers, chunksize, max_pending)
+
 def result():
     """This function returns normalization results of most recent normalization task.
     """
@@ -57,21 +268,23 @@ def reset():
     global __normalizer__
     __normalizer__ = None
 
-def save(filename):
-    """This method pickles normalizer to a file.
+def save(filename, pickled=False):
+    """This method saves normalizer to a file.
 
     Args:
         *filename* is path/filename to save Normalizer object to
+        *pickled*: when True, trie is pickled as nested dictionary structure
     """
     global __normalizer__
-    __normalizer__.save(filename)
+    __normalizer__.save(filename, pickled)
 
-def load(filename):
-    """This function unpickles normalizer from a file.
+def load(filename, mapped=False):
+    """This function loads normalizer from a file.
 
     Args:
         *filename* is path/filename to load Normalizer object from
+        *mapped*: when True, binary model file is memory-mapped and queried in place
     """
     global __normalizer__
     build_normalizer()
-    __normalizer__.load(filename)
+    __normalizer__.load(filename, mapped)
@@ -0,0 +1,672 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, initializedcheck=False
+"""Compiled scanner used by Normalizer when its engine is 'kernel'.
+
+It walks the trie packed into flat arrays (see Normalizer.compile_kernel()) over UCS-4 code point buffers
+with the GIL released, so that threads sharing one Normalizer can normalize strings in parallel.
+The kernel follows Normalizer.scan() statement by statement (with 'trie' engine), and gives up on inputs
+that Normalizer.scan() would fail on, so that Normalizer.scan() deals with them instead.
+"""
+
+from libc.stdlib cimport malloc, realloc, free
+from libc.string cimport memmove, memcpy, memset
+from cpython.ref cimport PyObject
+from cpython.mem cimport PyMem_Free
+
+cdef extern from "Python.h":
+    Py_UCS4* PyUnicode_AsUCS4Copy(object u) except NULL
+    object PyUnicode_FromKindAndData(int kind, const void* buffer, Py_ssize_t size)
+    int PyUnicode_4BYTE_KIND
+    bint Py_UNICODE_ISALPHA(Py_UCS4 ch) nogil
+    bint Py_UNICODE_ISNUMERIC(Py_UCS4 ch) nogil
+
+# return codes of scan_kernel()
+cdef enum:
+    KERNEL_OK = 0
+    KERNEL_NO_MEMORY = -1
+    KERNEL_GIVE_UP = -2
+
+cdef struct CharBuffer:
+    Py_UCS4* data
+    Py_ssize_t length
+    Py_ssize_t capacity
+
+cdef struct MapBuffer:
+    Py_ssize_t* data
+    Py_ssize_t length
+    Py_ssize_t capacity
+
+cdef struct FlatTrie:
+    const int* first_edge
+    const int* edge_chars
+    const int* edge_targets
+    const unsigned char* flags
+    const int* replacements
+    const int* string_offsets
+    const unsigned int* string_data
+    const int* chmap_keys
+    const int* chmap_offsets
+    const unsigned int* chmap_data
+    Py_ssize_t chmap_length
+
+cdef struct Workspace:
+    CharBuffer fragment
+    MapBuffer f_map
+    CharBuffer buffer
+    MapBuffer b_map
+    CharBuffer last_buffer
+    CharBuffer last_replacement
+    MapBuffer l_map
+    CharBuffer temp_buffer
+    MapBuffer t_map
+    CharBuffer aligned
+    Py_ssize_t counters[5]
+
+# scanner counters (see sic.core.NormalizerStats)
+cdef enum:
+    COUNT_CHARACTERS = 0
+    COUNT_STEPS = 1
+    COUNT_BACKTRACKS = 2
+    COUNT_REPLACEMENTS = 3
+    COUNT_SPLITS = 4
+
+# flags of trie nodes (see CompactTrie.action_flags)
+cdef enum:
+    FLAG_REPLACE = 1
+    FLAG_LEFT = 2
+    FLAG_MIDDLE = 4
+    FLAG_RIGHT = 8
+
+cdef inline int reserve_chars(CharBuffer* b, Py_ssize_t n) noexcept nogil:
+    cdef Py_ssize_t capacity
+    cdef Py_UCS4* data
+    if b.length + n <= b.capacity:
+        return KERNEL_OK
+    capacity = max(2 * b.capacity, b.length + n, 16)
+    data = <Py_UCS4*>realloc(b.data, capacity * sizeof(Py_UCS4))
+    if data == NULL:
+        return KERNEL_NO_MEMORY
+    b.data, b.capacity = data, capacity
+    return KERNEL_OK
+
+cdef inline int reserve_map(MapBuffer* b, Py_ssize_t n) noexcept nogil:
+    cdef Py_ssize_t capacity
+    cdef Py_ssize_t* data
+    if b.length + n <= b.capacity:
+        return KERNEL_OK
+    capacity = max(2 * b.capacity, b.length + n, 16)
+    data = <Py_ssize_t*>realloc(b.data, capacity * sizeof(Py_ssize_t))
+    if data == NULL:
+        return KERNEL_NO_MEMORY
+    b.data, b.capacity = data, capacity
+    return KERNEL_OK
+
+cdef inline int extend_chars(CharBuffer* b, const Py_UCS4* s, Py_ssize_t n) noexcept nogil:
+    if n == 0:
+        return KERNEL_OK
+    if reserve_chars(b, n) != KERNEL_OK:
+        return KERNEL_NO_MEMORY
+    memcpy(b.data + b.length, s, n * sizeof(Py_UCS4))
+    b.length += n
+    return KERNEL_OK
+
+cdef inline int extend_codes(CharBuffer* b, const unsigned int* s, Py_ssize_t n) noexcept nogil:
+    cdef Py_ssize_t i
+    if reserve_chars(b, n) != KERNEL_OK:
+        return KERNEL_NO_MEMORY
+    for i in range(n):
+        b.data[b.length + i] = <Py_UCS4>s[i]
+    b.length += n
+    return KERNEL_OK
+
+cdef inline int append_char(CharBuffer* b, Py_UCS4 c) noexcept nogil:
+    if reserve_chars(b, 1) != KERNEL_OK:
+        return KERNEL_NO_MEMORY
+    b.data[b.length] = c
+    b.length += 1
+    return KERNEL_OK
+
+cdef inline int prepend_char(CharBuffer* b, Py_UCS4 c) noexcept nogil:
+    if reserve_chars(b, 1) != KERNEL_OK:
+        return KERNEL_NO_MEMORY
+    memmove(b.data + 1, b.data, b.length * sizeof(Py_UCS4))
+    b.data[0] = c
+    b.length += 1
+    return KERNEL_OK
+
+cdef inline int extend_map(MapBuffer* b, const Py_ssize_t* s, Py_ssize_t n) noexcept nogil:
+    if n == 0:
+        return KERNEL_OK
+    if reserve_map(b, n) != KERNEL_OK:
+        return KERNEL_NO_MEMORY
+    memcpy(b.data + b.length, s, n * sizeof(Py_ssize_t))
+    b.length += n
+    return KERNEL_OK
+
+cdef inline int fill_map(MapBuffer* b, Py_ssize_t value, Py_ssize_t n) noexcept nogil:
+    cdef Py_ssize_t i
+    b.length = 0
+    if reserve_map(b, n) != KERNEL_OK:
+        return KERNEL_NO_MEMORY
+    for i in range(n):
+        b.data[i] = value
+    b.length = n
+    return KERNEL_OK
+
+cdef inline int append_map(MapBuffer* b, Py_ssize_t value) noexcept nogil:
+    if reserve_map(b, 1) != KERNEL_OK:
+        return KERNEL_NO_MEMORY
+    b.data[b.length] = value
+    b.length += 1
+    return KERNEL_OK
+
+cdef inline int prepend_map(MapBuffer* b, Py_ssize_t value) noexcept nogil:
+    if reserve_map(b, 1) != KERNEL_OK:
+        return KERNEL_NO_MEMORY
+    memmove(b.data + 1, b.data, b.length * sizeof(Py_ssize_t))
+    b.data[0] = value
+    b.length += 1
+    return KERNEL_OK
+
+cdef inline int append_or_set_map(MapBuffer* b, Py_ssize_t target_length, Py_ssize_t value) noexcept nogil:
+    # if len(b_map) == len(buffer): b_map[-1] = value; else: b_map.append(value)
+    if b.length == target_length:
+        if b.length == 0:
+            return KERNEL_GIVE_UP
+        b.data[b.length - 1] = value
+        return KERNEL_OK
+    return append_map(b, value)
+
+cdef inline bint is_separator(Py_UCS4 c, Py_UCS4 word_separator, Py_UCS4 control_character) noexcept nogil:
+    return c == word_separator or c == control_character
+
+cdef inline bint is_separator_string(const Py_UCS4* s, Py_ssize_t n, Py_UCS4 word_separator, Py_UCS4 control_character) noexcept nogil:
+    # x in (word_separator, control_character)
+    return n == 1 and (s[0] == word_separator or s[0] == control_character)
+
+cdef inline bint starts_with_separator(CharBuffer* b, Py_UCS4 word_separator, Py_UCS4 control_character) noexcept nogil:
+    return b.length > 0 and is_separator(b.data[0], word_separator, control_character)
+
+cdef inline bint ends_with_separator(CharBuffer* b, Py_UCS4 word_separator, Py_UCS4 control_character) noexcept nogil:
+    return b.length > 0 and is_separator(b.data[b.length - 1], word_separator, control_character)
+
+cdef int chargroup(const Py_UCS4* s, Py_ssize_t n) noexcept nogil:
+    # same as Normalizer.chargroup(): str.isalpha() and str.isnumeric() are True for non-empty strings only
+    cdef Py_ssize_t i
+    cdef bint alpha = n > 0
+    cdef bint numeric = n > 0
+    for i in range(n):
+        alpha = alpha and Py_UNICODE_ISALPHA(s[i])
+        numeric = numeric and Py_UNICODE_ISNUMERIC(s[i])
+    if alpha:
+        return 1
+    if numeric:
+        return 2
+    return 0
+
+cdef int find(FlatTrie* trie, int state, const Py_UCS4* s, Py_ssize_t n) noexcept nogil:
+    # same as CompactTrie.find()
+    cdef int lo = trie.first_edge[state]
+    cdef int hi = trie.first_edge[state + 1]
+    cdef int i, j, string_id, string_start, mid
+    cdef int code
+    if n != 1:
+        for i in range(lo, hi):
+            if trie.edge_chars[i] > -1:
+                break
+            string_id = -1 - trie.edge_chars[i]
+            string_start = trie.string_offsets[string_id]
+            if trie.string_offsets[string_id + 1] - string_start != n:
+                continue
+            j = 0
+            while j < n and trie.string_data[string_start + j] == s[j]:
+                j += 1
+            if j == n:
+                return trie.edge_targets[i]
+        return -1
+    code = <int>s[0]
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if trie.edge_chars[mid] < code:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo < trie.first_edge[state + 1] and trie.edge_chars[lo] == code:
+        return trie.edge_targets[lo]
+    return -1
+
+cdef Py_ssize_t find_chmap(FlatTrie* trie, Py_UCS4 c) noexcept nogil:
+    cdef Py_ssize_t lo = 0
+    cdef Py_ssize_t hi = trie.chmap_length
+    cdef Py_ssize_t mid
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if trie.chmap_keys[mid] < <int>c:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo < trie.chmap_length and trie.chmap_keys[lo] == <int>c:
+        return lo
+    return -1
+
+cdef int align_case(Workspace* ws, FlatTrie* trie, int state, CharBuffer* original, int normalizer_option, PyObject* align_case_function) noexcept nogil:
+    # ws.aligned = Normalizer.align_case(replacement of *state*, *original*, *normalizer_option*)
+    cdef int string_id = trie.replacements[state]
+    cdef int string_start = trie.string_offsets[string_id]
+    cdef int string_length = trie.string_offsets[string_id + 1] - string_start
+    cdef Py_UCS4* aligned = NULL
+    cdef int rc = KERNEL_OK
+    ws.aligned.length = 0
+    if normalizer_option != 3:
+        return extend_codes(&ws.aligned, trie.string_data + string_start, string_length)
+    with gil:
+        try:
+            replacement = PyUnicode_FromKindAndData(PyUnicode_4BYTE_KIND, trie.string_data + string_start, string_length) if string_length > 0 else ''
+            source = PyUnicode_FromKindAndData(PyUnicode_4BYTE_KIND, original.data, original.length) if original.length > 0 else ''
+            result = (<object>align_case_function)(replacement, source, normalizer_option)
+            if len(result) > 0:
+                aligned = PyUnicode_AsUCS4Copy(result)
+                rc = extend_chars(&ws.aligned, aligned, len(result))
+                PyMem_Free(aligned)
+        except Exception:
+            rc = KERNEL_GIVE_UP
+    return rc
+
+cdef int scan_kernel(
+    FlatTrie* trie,
+    const Py_UCS4* parsed_string,
+    const Py_UCS4* original_string,
+    Py_ssize_t total_length,
+    Py_UCS4 word_separator,
+    Py_UCS4 control_character,
+    int normalizer_option,
+    bint with_map,
+    PyObject* align_case_function,
+    Workspace* ws
+) noexcept nogil:
+    cdef CharBuffer* this_fragment = &ws.fragment
+    cdef MapBuffer* f_map = &ws.f_map
+    cdef CharBuffer* buffer = &ws.buffer
+    cdef MapBuffer* b_map = &ws.b_map
+    cdef CharBuffer* last_buffer = &ws.last_buffer
+    cdef CharBuffer* last_replacement = &ws.last_replacement
+    cdef MapBuffer* l_map = &ws.l_map
+    cdef CharBuffer* temp_buffer = &ws.temp_buffer
+    cdef MapBuffer* t_map = &ws.t_map
+    cdef CharBuffer swap_chars
+    cdef MapBuffer swap_map
+    cdef const Py_UCS4* character = NULL
+    cdef const Py_UCS4* original_character = NULL
+    cdef Py_ssize_t character_length = 0
+    cdef const Py_UCS4* last_character = NULL
+    cdef Py_ssize_t last_character_length = 0
+    cdef Py_UCS4 mapped[1]
+    cdef Py_UCS4* chmap_value = NULL
+    cdef Py_ssize_t chmap_index, chmap_start, i, n
+    cdef int this_group, last_group
+    cdef int subtrie = 0
+    cdef int next_state
+    cdef int flags
+    cdef Py_ssize_t current_index = 0
+    cdef Py_ssize_t temp_index = -1
+    cdef bint began_reading = False
+    cdef bint on_the_left = True
+    cdef bint on_the_right = False
+    cdef bint added_separator = False
+    cdef bint character_is_separator, last_character_is_separator
+    cdef int rc = KERNEL_OK
+    this_group = last_group = chargroup(parsed_string, 1)
+    while current_index < total_length:
+        character = parsed_string + current_index
+        original_character = original_string + current_index
+        character_length = 1
+        if trie.chmap_length > 0:
+            chmap_index = find_chmap(trie, parsed_string[current_index])
+            if chmap_index > -1:
+                chmap_start = trie.chmap_offsets[chmap_index]
+                character_length = trie.chmap_offsets[chmap_index + 1] - chmap_start
+                # chmap values are copied to buffer, so they are read as UCS-4 right from chmap_data
+                character = <const Py_UCS4*>(trie.chmap_data + chmap_start)
+                original_character = character
+        this_group = chargroup(character, character_length)
+        on_the_right = False
+        added_separator = False
+        character_is_separator = is_separator_string(character, character_length, word_separator, control_character)
+        last_character_is_separator = is_separator_string(last_character, last_character_length, word_separator, control_character)
+        if not character_is_separator and not last_character_is_separator:
+            if (this_group == 0 or this_group != last_group) and (subtrie == 0 or find(trie, subtrie, character, character_length) == -1):
+                if not ends_with_separator(buffer, word_separator, control_character):
+                    if append_char(buffer, control_character) != KERNEL_OK:
+                        return KERNEL_NO_MEMORY
+                    if with_map:
+                        rc = append_or_set_map(b_map, buffer.length, current_index)
+                        if rc != KERNEL_OK:
+                            return rc
+                began_reading = False
+                on_the_right = True
+                added_separator = True
+        if subtrie != 0 and temp_index == -1 and find(trie, 0, character, character_length) > -1:
+            # mark this as potential head
+            temp_index = current_index
+            temp_buffer.length = 0
+            t_map.length = 0
+            if extend_chars(temp_buffer, buffer.data, buffer.length) != KERNEL_OK or extend_map(t_map, b_map.data, b_map.length) != KERNEL_OK:
+                return KERNEL_NO_MEMORY
+        next_state = find(trie, subtrie, character, character_length)
+        if next_state > -1:
+            if not began_reading:
+                if on_the_left and this_fragment.length > 0 and not is_separator(this_fragment.data[this_fragment.length - 1], word_separator, control_character):
+                    if append_char(this_fragment, control_character) != KERNEL_OK:
+                        return KERNEL_NO_MEMORY
+                    if with_map:
+                        rc = append_or_set_map(f_map, this_fragment.length, current_index)
+                        if rc != KERNEL_OK:
+                            return rc
+                if this_fragment.length > 0 and is_separator(this_fragment.data[this_fragment.length - 1], word_separator, control_character) and starts_with_separator(buffer, word_separator, control_character):
+                    if with_map:
+                        if f_map.length == 0:
+                            return KERNEL_GIVE_UP
+                        f_map.length -= 1
+                    this_fragment.length -= 1
+                if extend_map(f_map, b_map.data, b_map.length) != KERNEL_OK or extend_chars(this_fragment, buffer.data, buffer.length) != KERNEL_OK:
+                    return KERNEL_NO_MEMORY
+                buffer.length = 0
+                b_map.length = 0
+            on_the_left = on_the_left or added_separator or last_character_is_separator
+            began_reading = True
+            subtrie = next_state
+            ws.counters[COUNT_STEPS] += 1
+            if extend_chars(buffer, original_character, character_length) != KERNEL_OK:
+                return KERNEL_NO_MEMORY
+            if with_map:
+                for i in range(character_length):
+                    if append_map(b_map, current_index) != KERNEL_OK:
+                        return KERNEL_NO_MEMORY
+        else:
+            on_the_right = on_the_right or character_is_separator
+            on_the_left = this_fragment.length == 0 or is_separator(this_fragment.data[this_fragment.length - 1], word_separator, control_character)
+            began_reading = False
+            # check what's in the buffer, and do the right thing
+            flags = trie.flags[subtrie]
+            if flags & FLAG_REPLACE:
+                # we may need to apply this replacement in future, so keep buffer value and replacement
+                last_buffer.length = 0
+                if extend_chars(last_buffer, buffer.data, buffer.length) != KERNEL_OK:
+                    return KERNEL_NO_MEMORY
+                rc = align_case(ws, trie, subtrie, last_buffer, normalizer_option, align_case_function)
+                if rc != KERNEL_OK:
+                    return rc
+                last_replacement.length = 0
+                if extend_chars(last_replacement, ws.aligned.data, ws.aligned.length) != KERNEL_OK:
+                    return KERNEL_NO_MEMORY
+                if with_map:
+                    if last_replacement.length > 0 and b_map.length == 0:
+                        return KERNEL_GIVE_UP
+                    if fill_map(l_map, b_map.data[0] if b_map.length > 0 else 0, last_replacement.length) != KERNEL_OK:
+                        return KERNEL_NO_MEMORY
+            if flags & FLAG_REPLACE and ((on_the_left and on_the_right) or flags & FLAG_MIDDLE or (flags & FLAG_LEFT and on_the_left) or (flags & FLAG_RIGHT and on_the_right)):
+                # now buffer has token to be replaced
+                rc = align_case(ws, trie, subtrie, buffer, normalizer_option, align_case_function)
+                if rc != KERNEL_OK:
+                    return rc
+                buffer.length = 0
+                if extend_chars(buffer, ws.aligned.data, ws.aligned.length) != KERNEL_OK or append_char(buffer, control_character) != KERNEL_OK:
+                    return KERNEL_NO_MEMORY
+                if with_map:
+                    if b_map.length == 0:
+                        return KERNEL_GIVE_UP
+                    if fill_map(b_map, b_map.data[0], buffer.length) != KERNEL_OK:
+                        return KERNEL_NO_MEMORY
+                last_buffer.length = 0
+                l_map.length = 0
+                temp_index = -1
+                ws.counters[COUNT_REPLACEMENTS] += 1
+                # now buffer has replaced token
+            if flags & FLAG_LEFT and on_the_left:
+                ws.counters[COUNT_SPLITS] += 1
+                if not ends_with_separator(buffer, word_separator, control_character):
+                    if append_char(buffer, control_character) != KERNEL_OK:
+                        return KERNEL_NO_MEMORY
+                    if with_map:
+                        rc = append_or_set_map(b_map, buffer.length, current_index)
+                        if rc != KERNEL_OK:
+                            return rc
+                temp_index = -1
+            if flags & FLAG_MIDDLE and not on_the_left and not on_the_right:
+                ws.counters[COUNT_SPLITS] += 1
+                if not starts_with_separator(buffer, word_separator, control_character):
+                    if prepend_char(buffer, control_character) != KERNEL_OK:
+                        return KERNEL_NO_MEMORY
+                    if with_map:
+                        if prepend_map(b_map, current_index) != KERNEL_OK:
+                            return KERNEL_NO_MEMORY
+                if not ends_with_separator(buffer, word_separator, control_character):
+                    if append_char(buffer, control_character) != KERNEL_OK:
+                        return KERNEL_NO_MEMORY
+                    if with_map:
+                        rc = append_or_set_map(b_map, buffer.length, current_index)
+                        if rc != KERNEL_OK:
+                            return rc
+                if last_buffer.length > 0:
+                    if with_map:
+                        f_map.length = max(f_map.length - last_buffer.length, 0)
+                        if extend_map(f_map, l_map.data, l_map.length) != KERNEL_OK:
+                            return KERNEL_NO_MEMORY
+                    this_fragment.length = max(this_fragment.length - last_buffer.length, 0)
+                    if extend_chars(this_fragment, last_replacement.data, last_replacement.length) != KERNEL_OK:
+                        return KERNEL_NO_MEMORY
+                    ws.counters[COUNT_REPLACEMENTS] += 1
+                temp_index = -1
+            if flags & FLAG_RIGHT and on_the_right:
+                ws.counters[COUNT_SPLITS] += 1
+                if not starts_with_separator(buffer, word_separator, control_character):
+                    if prepend_char(buffer, control_character) != KERNEL_OK:
+                        return KERNEL_NO_MEMORY
+                    if with_map:
+                        if prepend_map(b_map, current_index) != KERNEL_OK:
+                            return KERNEL_NO_MEMORY
+                temp_index = -1
+            if temp_index > -1:
+                # read again from potential head
+                subtrie = 0
+                ws.counters[COUNT_BACKTRACKS] += 1
+                ws.counters[COUNT_CHARACTERS] += current_index - temp_index + 1
+                current_index = temp_index
+                swap_chars = ws.buffer
+                ws.buffer = ws.temp_buffer
+                ws.temp_buffer = swap_chars
+                swap_map = ws.b_map
+                ws.b_map = ws.t_map
+                ws.t_map = swap_map
+                temp_index = -1
+                temp_buffer.length = 0
+                t_map.length = 0
+                continue
+            subtrie = 0
+            if on_the_left and this_fragment.length > 0 and not is_separator(this_fragment.data[this_fragment.length - 1], word_separator, control_character) and not character_is_separator and not added_separator:
+                if append_char(this_fragment, control_character) != KERNEL_OK:
+                    return KERNEL_NO_MEMORY
+                if with_map:
+                    rc = append_or_set_map(f_map, this_fragment.length, current_index)
+                    if rc != KERNEL_OK:
+                        return rc
+            if this_fragment.length > 0 and is_separator(this_fragment.data[this_fragment.length - 1], word_separator, control_character) and starts_with_separator(buffer, word_separator, control_character):
+                if with_map:
+                    if f_map.length == 0:
+                        return KERNEL_GIVE_UP
+                    f_map.length -= 1
+                this_fragment.length -= 1
+            if extend_map(f_map, b_map.data, b_map.length) != KERNEL_OK or extend_chars(this_fragment, buffer.data, buffer.length) != KERNEL_OK:
+                return KERNEL_NO_MEMORY
+            buffer.length = 0
+            b_map.length = 0
+            if extend_chars(buffer, original_character, character_length) != KERNEL_OK:
+                return KERNEL_NO_MEMORY
+            if with_map:
+                if fill_map(b_map, current_index, character_length) != KERNEL_OK:
+                    return KERNEL_NO_MEMORY
+            on_the_left = False
+            next_state = find(trie, 0, character, character_length)
+            if next_state > -1:
+                on_the_left = added_separator or last_character_is_separator
+                began_reading = True
+                subtrie = next_state
+                ws.counters[COUNT_STEPS] += 1
+        last_group = this_group
+        last_character = character
+        last_character_length = character_length
+        current_index += 1
+    # check what's in the buffer, and do the right thing
+    on_the_right = True
+    on_the_left = this_fragment.length == 0 or is_separator(this_fragment.data[this_fragment.length - 1], word_separator, control_character)
+    flags = trie.flags[subtrie]
+    if flags & FLAG_REPLACE and ((on_the_left and on_the_right) or flags & FLAG_MIDDLE or (flags & FLAG_LEFT and on_the_left) or (flags & FLAG_RIGHT and on_the_right)):
+        rc = align_case(ws, trie, subtrie, buffer, normalizer_option, align_case_function)
+        if rc != KERNEL_OK:
+            return rc
+        buffer.length = 0
+        if extend_chars(buffer, ws.aligned.data, ws.aligned.length) != KERNEL_OK:
+            return KERNEL_NO_MEMORY
+        if with_map:
+            if buffer.length > 0 and b_map.length == 0:
+                return KERNEL_GIVE_UP
+            if fill_map(b_map, b_map.data[0] if b_map.length > 0 else 0, buffer.length) != KERNEL_OK:
+                return KERNEL_NO_MEMORY
+        last_buffer.length = 0
+        l_map.length = 0
+        ws.counters[COUNT_REPLACEMENTS] += 1
+    if flags & FLAG_RIGHT and on_the_right:
+        ws.counters[COUNT_SPLITS] += 1
+        if not starts_with_separator(buffer, word_separator, control_character):
+            if prepend_char(buffer, word_separator) != KERNEL_OK:
+                return KERNEL_NO_MEMORY
+            if with_map:
+                if prepend_map(b_map, total_length - 1) != KERNEL_OK:
+                    return KERNEL_NO_MEMORY
+        if last_buffer.length > 0:
+            if extend_map(f_map, l_map.data, l_map.length) != KERNEL_OK:
+                return KERNEL_NO_MEMORY
+            this_fragment.length = max(this_fragment.length - last_buffer.length, 0)
+            if extend_chars(this_fragment, last_replacement.data, last_replacement.length) != KERNEL_OK:
+                return KERNEL_NO_MEMORY
+            ws.counters[COUNT_REPLACEMENTS] += 1
+    if on_the_left and (this_fragment.length == 0 or not is_separator(this_fragment.data[this_fragment.length - 1], word_separator, control_character)):
+        if append_char(this_fragment, control_character) != KERNEL_OK:
+            return KERNEL_NO_MEMORY
+        if with_map:
+            if append_map(f_map, total_length - 1) != KERNEL_OK:
+                return KERNEL_NO_MEMORY
+    if this_fragment.length > 0 and is_separator(this_fragment.data[this_fragment.length - 1], word_separator, control_character) and starts_with_separator(buffer, word_separator, control_character):
+        if with_map:
+            if f_map.length == 0:
+                return KERNEL_GIVE_UP
+            f_map.length -= 1
+        this_fragment.length -= 1
+    if extend_map(f_map, b_map.data, b_map.length) != KERNEL_OK or extend_chars(this_fragment, buffer.data, buffer.length) != KERNEL_OK:
+        return KERNEL_NO_MEMORY
+    # strip separators
+    i = 0
+    while i < this_fragment.length and is_separator(this_fragment.data[i], word_separator, control_character):
+        i += 1
+    memmove(this_fragment.data, this_fragment.data + i, (this_fragment.length - i) * sizeof(Py_UCS4))
+    this_fragment.length -= i
+    n = min(i, f_map.length)
+    memmove(f_map.data, f_map.data + n, (f_map.length - n) * sizeof(Py_ssize_t))
+    f_map.length -= n
+    while this_fragment.length > 0 and is_separator(this_fragment.data[this_fragment.length - 1], word_separator, control_character):
+        this_fragment.length -= 1
+        if f_map.length > 0:
+            f_map.length -= 1
+    ws.counters[COUNT_CHARACTERS] += total_length
+    return KERNEL_OK
+
+cdef void free_workspace(Workspace* ws) noexcept nogil:
+    free(ws.fragment.data)
+    free(ws.f_map.data)
+    free(ws.buffer.data)
+    free(ws.b_map.data)
+    free(ws.last_buffer.data)
+    free(ws.last_replacement.data)
+    free(ws.l_map.data)
+    free(ws.temp_buffer.data)
+    free(ws.t_map.data)
+    free(ws.aligned.data)
+
+def scan(
+    tuple flat_trie,
+    str parsed_string,
+    str original_string,
+    str word_separator,
+    str control_character,
+    int normalizer_option,
+    bint with_map,
+    align_case_function,
+    list counters=None
+):
+    """This function scans non-empty string with the GIL released and returns tuple (fragment, map), where "fragment"
+    is normalized string before post-processing (see Normalizer.finish_scan()), and "map" is character location map;
+    or None if the string is to be scanned by Normalizer.scan() instead. Arguments are assumed to be validated
+    by the caller, and *parsed_string* and *original_string* are assumed to be of the same length.
+
+    Args:
+        *flat_trie* is tuple of arrays returned by Normalizer.compile_kernel()
+        *parsed_string* is string being normalized (lowercased if normalization is case-insensitive)
+        *original_string* is string characters are copied from when no replacement is applied
+        *word_separator* is word separator to consider (must be single character)
+        *control_character* is character masking word separator (must be single character)
+        *normalizer_option* is integer either 0 (normal, default), 1 (list), 2 (set), 3 (join split tokens back)
+        *with_map*: when False, character location map is not tracked at all
+        *align_case_function* is Normalizer.align_case (only called if *normalizer_option* is 3)
+        *counters* is list that scanner counters are added to (see Normalizer.scan_fragment()), or None
+    """
+    cdef const int[::1] first_edge = flat_trie[0]
+    cdef const int[::1] edge_chars = flat_trie[1]
+    cdef const int[::1] edge_targets = flat_trie[2]
+    cdef const unsigned char[::1] flags = flat_trie[3]
+    cdef const int[::1] replacements = flat_trie[4]
+    cdef const int[::1] string_offsets = flat_trie[5]
+    cdef const unsigned int[::1] string_data = flat_trie[6]
+    cdef const int[::1] chmap_keys = flat_trie[7]
+    cdef const int[::1] chmap_offsets = flat_trie[8]
+    cdef const unsigned int[::1] chmap_data = flat_trie[9]
+    cdef FlatTrie trie
+    cdef Workspace ws
+    cdef Py_UCS4* parsed = NULL
+    cdef Py_UCS4* original = NULL
+    cdef Py_ssize_t total_length = len(parsed_string)
+    cdef Py_UCS4 ws_character = word_separator[0]
+    cdef Py_UCS4 cc_character = control_character[0]
+    cdef PyObject* align_case_pointer = <PyObject*>align_case_function
+    cdef Py_ssize_t i
+    cdef int rc
+    trie.first_edge = &first_edge[0]
+    trie.edge_chars = &edge_chars[0] if edge_chars.shape[0] > 0 else NULL
+    trie.edge_targets = &edge_targets[0] if edge_targets.shape[0] > 0 else NULL
+    trie.flags = &flags[0]
+    trie.replacements = &replacements[0]
+    trie.string_offsets = &string_offsets[0]
+    trie.string_data = &string_data[0] if string_data.shape[0] > 0 else NULL
+    trie.chmap_keys = &chmap_keys[0] if chmap_keys.shape[0] > 0 else NULL
+    trie.chmap_offsets = &chmap_offsets[0]
+    trie.chmap_data = &chmap_data[0] if chmap_data.shape[0] > 0 else NULL
+    trie.chmap_length = chmap_keys.shape[0]
+    memset(&ws, 0, sizeof(Workspace))
+    try:
+        parsed = PyUnicode_AsUCS4Copy(parsed_string)
+        original = parsed if original_string is parsed_string else PyUnicode_AsUCS4Copy(original_string)
+        with nogil:
+            rc = scan_kernel(&trie, parsed, original, total_length, ws_character, cc_character, normalizer_option, with_map, align_case_pointer, &ws)
+        if rc == KERNEL_NO_MEMORY:
+            raise MemoryError()
+        if rc == KERNEL_GIVE_UP:
+            return None
+        if counters is not None:
+            for i in range(5):
+                counters[i] += ws.counters[i]
+        fragment = PyUnicode_FromKindAndData(PyUnicode_4BYTE_KIND, ws.fragment.data, ws.fragment.length) if ws.fragment.length > 0 else ''
+        return (fragment, [ws.f_map.data[i] for i in range(ws.f_map.length)])
+    finally:
+        free_workspace(&ws)
+        if original != NULL and original != parsed:
+            PyMem_Free(original)
+        if parsed != NULL:
+            PyMem_Free(parsed)
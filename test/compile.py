@@ -3,7 +3,8 @@ from Cython.Build import cythonize
 
 src = [
     'sic/core.py',
-    'sic/implicit.py'
+    'sic/implicit.py',
+    'sic/kernel.pyx'
 ]
 
 setup(ext_modules=cythonize(src, compiler_directives={'language_level': '3'}, build_dir='cythonized'))
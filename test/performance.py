@@ -1,39 +1,595 @@
+"""Benchmark suite for sic.
+
+Usage:
+    python test/performance.py [-b] [--quick] [--only REGEX] [-o results.json] [--compare baseline.json]
+
+Each benchmark yields measurements for a matrix of parameters, and results are written as JSON
+(to standard output unless -o is given). Pure Python package (./sic) is benchmarked by default;
+compiled modules built into ./bin (see scripts/*/buildso.sh) are added with -b, and every package
+is then benchmarked in its own process. With --compare, results are matched against stored baseline
+and regressions are flagged (exit code is 1 if there are any).
+"""
+
 import sys; sys.path.insert(0, '')
-import timeit
-
-def perf_normalizer_many_short_strings():
-    n = 10000
-    sample_label = 'acetyl(salicyllic)ac¡d,acid==alpha-labelled-base gentamycinnn nf-bkappa'
-    for x in [('sic.core', '0'), ('sic.core', '1'), ('sic.core', '2'), ('sic.core', '3'), ('bin.core', '0'), ('bin.core', '1'), ('bin.core', '2'), ('bin.core', '3')]:
-        print(
-            '%s: processed %d entr%s "%s" in %s seconds' % (
-                x, n, 'y' if n==1 else 'ies', sample_label, str(
-                    timeit.timeit(
-                        setup='import %s; builder = %s.Builder(); machine = builder.build_normalizer(\'./sic/tokenizer.standard.xml\')' % (x[0], x[0]),
-                        stmt='_ = machine.normalize(\'%s\', \' \', %s)' % (sample_label, x[1]),
-                        number=n
-                    )
-                )
-            )
-        )
-
-def perf_normalizer_one_long_string():
-    n = 1
-    sample_label = 'acetyl(salicyllic)ac¡d,acid==alpha-labelled-base gentamycinnn nf-bkappa' * 10000
-    sample_label_length = len(sample_label)
-    for x in [('sic.core', '0'), ('sic.core', '1'), ('sic.core', '2'), ('sic.core', '3'), ('bin.core', '0'), ('bin.core', '1'), ('bin.core', '2'), ('bin.core', '3')]:
-        print(
-            '%s: processed %d entr%s (len=%d) in %s seconds' % (
-                x, n, 'y' if n==1 else 'ies', sample_label_length, str(
-                    timeit.timeit(
-                        setup='import %s; builder = %s.Builder(); machine = builder.build_normalizer(\'./sic/tokenizer.standard.xml\')' % (x[0], x[0]),
-                        stmt='_ = machine.normalize(\'%s\', \' \', %s)' % (sample_label, x[1]),
-                        number=n
-                    )
+import os
+import re
+import gc
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import importlib
+import importlib.util
+import subprocess
+import tracemalloc
+from collections import OrderedDict
+
+BENCHMARKS = OrderedDict()
+
+WORDS = [
+    'acetyl', 'salicyllic', 'acid', 'alpha', 'beta', 'gamma', 'kappa', 'labelled', 'base', 'gentamycin',
+    'nf', 'ifn', 'il', 'tnf', 'receptor', 'protein', 'kinase', 'Dr.Smith', 'mg/kg', 'façade', 'naïve',
+    'Straße', 'Ålesund', 'κόσμε', 'ΔΕΛΤΑ', 'ψυχή'
+]
+PUNCTUATION = ['(', ')', '-', ',', '==', '.', '/', '¡', ':', '+']
+
+def benchmark(func):
+    """This decorator registers benchmark function named bench_*name* under *name*."""
+    BENCHMARKS[func.__name__[len('bench_'):]] = func
+    return func
+
+def scaled(n, scale):
+    """This function returns *n* multiplied by *scale*, but not less than 1."""
+    return max(1, int(n * scale))
+
+def best_of(func, repeat):
+    """This function calls *func* *repeat* times and returns the shortest duration in seconds."""
+    durations = []
+    for i in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return min(durations)
+
+def peak_memory(func):
+    """This function calls *func* once and returns peak size of memory (in bytes) allocated during the call."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def retained_memory(func):
+    """This function calls *func* once and returns size of memory (in bytes) allocated during the call
+    that is still held after it returns, e.g. size of data structure built by *func*.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+def measurement(params, seconds, count, unit, **extra):
+    """This function returns measurement as dict object: *count* *unit*s are processed in *seconds*."""
+    ret = {'params': params, 'seconds': seconds, 'count': count, 'unit': unit, 'rate': count / seconds if seconds > 0 else None}
+    ret.update(extra)
+    return ret
+
+def generate_words(count, seed, length=(3, 12)):
+    """This function returns list of *count* distinct random lowercase words."""
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    ret = OrderedDict()
+    while len(ret) < count:
+        ret[''.join([rng.choice(letters) for i in range(rng.randint(*length))])] = None
+    return list(ret)
+
+def generate_corpus(count, length, seed, vocabulary=None):
+    """This function returns list of *count* strings of *length* characters each, made of words
+    from *vocabulary* (or built-in list of words), numbers, and punctuation, joined with or without spaces.
+    """
+    rng = random.Random(seed)
+    vocabulary = vocabulary or WORDS
+    ret = []
+    for i in range(count):
+        parts, size = [], 0
+        while size < length:
+            roll = rng.random()
+            part = rng.choice(vocabulary) if roll < 0.7 else str(rng.randint(0, 999)) if roll < 0.8 else rng.choice(PUNCTUATION)
+            if rng.random() < 0.2:
+                part = part.capitalize()
+            part += ' ' if rng.random() < 0.7 else ''
+            parts.append(part)
+            size += len(part)
+        ret.append(''.join(parts)[:length])
+    return ret
+
+def generate_rules(count, seed):
+    """This function returns list of *count* tokenization rules as tuples (action, key, value)
+    in format of Normalizer.make_tokenizer(): split rules, token replacements (half of them chained),
+    and a few character replacements.
+    """
+    rng = random.Random(seed)
+    words = generate_words(count + 1, seed)
+    ret = [('c', 'a', 'á'), ('c', 'e', 'é'), ('c', 'ss', 'ß')]
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.5:
+            ret.append(('s', rng.choice(['l', 'r', 'lr', 'm', 'lmr']), words[i]))
+        elif roll < 0.75:
+            ret.append(('r', words[i + 1], words[i]))
+        else:
+            ret.append(('r', words[i].upper()[:3], words[i]))
+    return ret
+
+def rules_text(rules, case_sensitive=False):
+    """This function returns *rules* (see generate_rules()) as string accepted by Normalizer.make_tokenizer()."""
+    return 'set\tcs\t%d\n' % (int(case_sensitive)) + ''.join(['%s\t%s\t%s\n' % rule for rule in rules])
+
+def write_config(filename, rules, name='benchmark', imports=None):
+    """This function writes *rules* (see generate_rules()) to XML tokenizer config *filename*."""
+    tags = {'s': '<split where="%s" value="%s" />', 'r': '<token to="%s" from="%s" />', 'c': '<character to="%s" from="%s" />'}
+    with open(filename, mode='w', encoding='utf8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<tokenizer name="%s">\n' % (name))
+        for x in imports or []:
+            f.write('  <import file="%s" />\n' % (x))
+        f.write('  <setting name="cs" value="0" />\n')
+        for (action, key, value) in rules:
+            f.write('  %s\n' % (tags[action] % (key, value)))
+        f.write('</tokenizer>\n')
+
+@benchmark
+def bench_throughput(package, scale, repeat):
+    """normalize() over matrix of input length, normalizer_option, and engine"""
+    machine = package.Builder().build_normalizer()
+    total = scaled(100000, scale)
+    for length in [10, 100, 1000, 10000]:
+        corpus = generate_corpus(max(1, total // length), length, length)
+        for engine in ['trie', 'automaton', 'kernel']:
+            machine.engine = engine
+            machine.normalize(corpus[0])
+            for option in [0, 1, 2, 3]:
+                seconds = best_of(lambda: [machine.normalize(x, ' ', option) for x in corpus], repeat)
+                yield measurement({'length': length, 'engine': engine, 'option': option}, seconds, len(corpus) * length, 'characters')
+
+@benchmark
+def bench_input_scaling(package, scale, repeat):
+    """normalize() of single string from 10 KB to 100 MB, without character maps"""
+    machine = package.Builder().build_normalizer()
+    label = 'acetyl(salicyllic)ac¡d,acid==alpha-labelled-base gentamycinnn nf-bkappa '
+    machine.normalize(label)
+    for size in [scaled(x, scale) for x in [10**4, 10**5, 10**6, 10**7, 10**8]]:
+        sample = (label * (size // len(label) + 1))[:size]
+        seconds = best_of(lambda: machine.normalize(sample, with_map=False), repeat if size < 10**7 else 1)
+        yield measurement({'size': size}, seconds, size, 'characters')
+        del sample
+
+@benchmark
+def bench_long_string(package, scale, repeat):
+    """normalize() of one long string made of repeated label, by normalizer_option"""
+    machine = package.Builder().build_normalizer()
+    sample = 'acetyl(salicyllic)ac¡d,acid==alpha-labelled-base gentamycinnn nf-bkappa' * scaled(10000, scale)
+    machine.normalize(sample[:1000])
+    for option in [0, 1, 2, 3]:
+        seconds = best_of(lambda: machine.normalize(sample, ' ', option), repeat)
+        yield measurement({'option': option}, seconds, len(sample), 'characters')
+
+@benchmark
+def bench_rules(package, scale, repeat):
+    """normalize() with synthetic rule sets of growing size, by engine"""
+    total = scaled(50000, scale)
+    for count in [scaled(x, scale) for x in [100, 1000, 10000, 100000]]:
+        rules = generate_rules(count, count)
+        machine = package.Normalizer()
+        machine.make_tokenizer(rules_text(rules))
+        corpus = generate_corpus(max(1, total // 100), 100, count, [rule[2] for rule in rules if rule[0] != 'c'])
+        for engine in ['trie', 'automaton', 'kernel']:
+            machine.engine = engine
+            machine.normalize(corpus[0])
+            seconds = best_of(lambda: [machine.normalize(x) for x in corpus], repeat)
+            yield measurement({'rules': count, 'engine': engine}, seconds, len(corpus) * 100, 'characters')
+
+@benchmark
+def bench_build(package, scale, repeat):
+    """Builder.build_normalizer() from XML config: cold (compiled), store (compiled and cached), warm (loaded from cache)"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename, cache_dir = os.path.join(temp_dir, 'benchmark.xml'), os.path.join(temp_dir, 'cache')
+        for count in [scaled(x, scale) for x in [1000, 10000, 100000]]:
+            write_config(filename, generate_rules(count, count))
+            package.Builder().build_normalizer(filename)
+            seconds = best_of(lambda: package.Builder().build_normalizer(filename), repeat)
+            yield measurement({'rules': count, 'mode': 'cold'}, seconds, count, 'rules')
+            durations = []
+            for i in range(repeat):
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                durations.append(best_of(lambda: package.Builder(cache_dir=cache_dir).build_normalizer(filename), 1))
+            yield measurement({'rules': count, 'mode': 'store'}, min(durations), count, 'rules')
+            seconds = best_of(lambda: package.Builder(cache_dir=cache_dir).build_normalizer(filename), repeat)
+            yield measurement({'rules': count, 'mode': 'warm'}, seconds, count, 'rules')
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+@benchmark
+def bench_convert_xml(package, scale, repeat):
+    """Builder.expose_tokenizer() for config split into files chained with imports"""
+    count, files = scaled(100000, scale), 10
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filenames = [os.path.join(temp_dir, 'part%d.xml' % (i)) for i in range(files)] + [os.path.join(temp_dir, 'top.xml')]
+        rules = generate_rules(count, count)
+        for i in range(files):
+            write_config(filenames[i], rules[i::files], 'part%d' % (i), ['part%d.xml' % (i + 1)] if i + 1 < files else [])
+        write_config(filenames[files], [], 'top', ['part%d.xml' % (i) for i in range(files)])
+        seconds = best_of(lambda: package.Builder().expose_tokenizer(filenames[files]), repeat)
+        yield measurement({'rules': count, 'files': files}, seconds, count, 'rules')
+
+@benchmark
+def bench_model_load(package, scale, repeat):
+    """Normalizer.load() of saved model: pickle, binary, memory-mapped binary"""
+    count = scaled(100000, scale)
+    machine = package.Normalizer()
+    machine.make_tokenizer(rules_text(generate_rules(count, count)))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for (name, pickled, mapped) in [('pickle', True, False), ('binary', False, False), ('mapped', False, True)]:
+            filename = os.path.join(temp_dir, name)
+            machine.save(filename, pickled=pickled)
+            seconds = best_of(lambda: package.Normalizer().load(filename, mapped=mapped), repeat)
+            yield measurement({'rules': count, 'format': name}, seconds, count, 'rules', size=os.path.getsize(filename))
+
+@benchmark
+def bench_add_rules(package, scale, repeat):
+    """Normalizer.add_rules() on large trie"""
+    count = scaled(100000, scale)
+    machine = package.Normalizer()
+    machine.make_tokenizer(rules_text(generate_rules(count, count)))
+    words = generate_words(100, 1)
+    for k in range(3):
+        new_rules = [package.ReplaceToken(words[i], 'patch%d_%d' % (k, i)) for i in range(100)] + [package.SplitToken('patch%d_%d' % (k, i), 'lr') for i in range(100)]
+        seconds = best_of(lambda: machine.add_rules(new_rules), 1)
+        yield measurement({'rules': count, 'round': k}, seconds, len(new_rules), 'rules')
+
+@benchmark
+def bench_merge_replacements(package, scale, repeat):
+    """Normalizer.merge_replacements() for long chains of replacements"""
+    chain_length = 1000
+    machine = package.Normalizer()
+    for count in [scaled(x, scale) for x in [10**4, 10**5, 10**6]]:
+        rules = ''.join(['r\tt%d\tt%d\n' % (i + 1, i) if (i + 1) % chain_length else 'r\tend%d\tt%d\n' % (i // chain_length, i) for i in range(count)])
+        seconds = best_of(lambda: machine.merge_replacements(rules), repeat)
+        yield measurement({'rules': count, 'chain': chain_length}, seconds, count, 'rules')
+
+@benchmark
+def bench_near_miss(package, scale, repeat):
+    """normalize() of input that repeatedly almost matches long token, by engine"""
+    model = package.Model()
+    model.add_rule(package.SplitToken('a' * 40 + 'b', 'lmr'))
+    machine = package.Builder().build_normalizer(model)
+    sample = ('a' * 39 + 'c') * scaled(1000, scale)
+    for engine in ['trie', 'automaton', 'kernel']:
+        machine.engine = engine
+        machine.normalize(sample[:100])
+        seconds = best_of(lambda: machine.normalize(sample), repeat)
+        yield measurement({'engine': engine}, seconds, len(sample), 'characters')
+
+@benchmark
+def bench_char_classes(package, scale, repeat):
+    """normalize() with each of shipped tokenizers"""
+    corpus = {
+        'standard': generate_corpus(scaled(1000, scale), 100, 1),
+        'western': generate_corpus(scaled(1000, scale), 100, 2, ['Ça', 'été', 'très-bien', 'naïve', 'coöperation', 'façade', 'Straße', 'Ålesund', 'ÆØÅ']),
+        'greek': generate_corpus(scaled(1000, scale), 100, 3, ['Καλημέρα', 'κόσμε', 'αλφα-βήτα', 'γάμμα12', 'ΔΕΛΤΑ', 'ΩΜΕΓΑ', 'ψυχή'])
+    }
+    for name in corpus:
+        machine = package.Builder().build_normalizer('%s/tokenizer.%s.xml' % (os.path.dirname(package.__file__), name))
+        seconds = best_of(lambda: [machine.normalize(x) for x in corpus[name]], repeat)
+        yield measurement({'tokenizer': name}, seconds, len(corpus[name]) * 100, 'characters')
+
+@benchmark
+def bench_with_map(package, scale, repeat):
+    """normalize() with and without tracking of character maps"""
+    machine = package.Builder().build_normalizer()
+    corpus = generate_corpus(scaled(10000, scale), 80, 1)
+    for with_map in [True, False]:
+        seconds = best_of(lambda: [machine.normalize(x, with_map=with_map) for x in corpus], repeat)
+        yield measurement({'with_map': with_map}, seconds, len(corpus), 'strings')
+
+@benchmark
+def bench_result_memory(package, scale, repeat):
+    """memory taken by result of normalize() for long string, before and after r_map is read"""
+    machine = package.Builder().build_normalizer()
+    sample = generate_corpus(1, scaled(100000, scale), 1)[0]
+    seconds = best_of(lambda: machine.normalize(sample), repeat)
+    yield measurement({'r_map': False}, seconds, len(sample), 'characters', memory=peak_memory(lambda: machine.normalize(sample)))
+    yield measurement({'r_map': True}, seconds, len(sample), 'characters', memory=peak_memory(lambda: machine.normalize(sample) and machine.result['r_map']))
+
+@benchmark
+def bench_cache(package, scale, repeat):
+    """normalize() of repetitive strings with and without result cache"""
+    machine = package.Builder().build_normalizer()
+    corpus = generate_corpus(100, 80, 1) * scaled(100, scale)
+    for cache_size in [0, 1000]:
+        machine.set_cache(cache_size)
+        seconds = best_of(lambda: [machine.normalize(x) for x in corpus], repeat)
+        yield measurement({'cache_size': cache_size}, seconds, len(corpus), 'strings')
+
+@benchmark
+def bench_instrumentation(package, scale, repeat):
+    """normalize() with instrumentation disabled and enabled, by engine"""
+    machine = package.Builder().build_normalizer()
+    corpus = generate_corpus(scaled(10000, scale), 80, 1)
+    for engine in ['automaton', 'kernel']:
+        machine.engine = engine
+        for enabled in [False, True]:
+            machine.set_instrumentation(enabled, slowest=10)
+            seconds = best_of(lambda: [machine.normalize(x) for x in corpus], repeat)
+            yield measurement({'engine': engine, 'enabled': enabled}, seconds, len(corpus), 'strings')
+    machine.set_instrumentation(False)
+
+@benchmark
+def bench_compact(package, scale, repeat):
+    """memory kept by trie as nested dictionaries and as CompactTrie, and normalize() with each"""
+    count = scaled(100000, scale)
+    rules = generate_rules(count, count)
+    corpus = generate_corpus(scaled(1000, scale), 80, 1, [rule[2] for rule in rules if rule[0] != 'c'])
+    machine = package.Normalizer()
+    text = rules_text(rules)
+    memory = retained_memory(lambda: machine.make_tokenizer(text))
+    for compacted in [False, True]:
+        if compacted:
+            memory = retained_memory(lambda: machine.compact())
+        seconds = best_of(lambda: [machine.normalize(x) for x in corpus], repeat)
+        yield measurement({'rules': count, 'compacted': compacted}, seconds, len(corpus), 'strings', memory=memory)
+
+@benchmark
+def bench_batch(package, scale, repeat):
+    """list of strings with normalize(), normalize_ex(), normalize_batch(), normalize_columnar(), normalize_tokens()"""
+    machine = package.Builder().build_normalizer()
+    corpus = generate_corpus(scaled(10000, scale), 80, 1)
+    methods = OrderedDict([
+        ('normalize', lambda: [machine.normalize(x) for x in corpus]),
+        ('normalize_ex', lambda: [machine.normalize_ex(x) for x in corpus]),
+        ('normalize_batch', lambda: list(machine.normalize_batch(corpus, with_map=True))),
+        ('normalize_columnar', lambda: machine.normalize_columnar(corpus, with_map=True)),
+        ('normalize_tokens', lambda: [machine.normalize_tokens(x) for x in corpus])
+    ])
+    for name in methods:
+        seconds = best_of(methods[name], repeat)
+        yield measurement({'method': name}, seconds, len(corpus), 'strings')
+
+@benchmark
+def bench_column(package, scale, repeat):
+    """normalize_column() for column with repeated values"""
+    machine = package.Builder().build_normalizer()
+    rows = scaled(1000000, scale)
+    for distinct in [100, 10000]:
+        uniques = generate_corpus(distinct, 80, distinct)
+        column = [uniques[i % distinct] for i in range(rows)]
+        seconds = best_of(lambda: machine.normalize_column(column), repeat)
+        yield measurement({'distinct': distinct}, seconds, rows, 'rows')
+
+@benchmark
+def bench_stream(package, scale, repeat):
+    """normalize_stream() of long text in chunks, compared with normalize_ex() of the whole text"""
+    machine = package.Builder().build_normalizer()
+    text = ' '.join(generate_corpus(scaled(10000, scale), 100, 1))
+    chunks = lambda size: (text[i:i + size] for i in range(0, len(text), size))
+    runs = OrderedDict([
+        ('whole', lambda: machine.normalize_ex(text)),
+        ('4096', lambda: sum([len(x) for (x, _) in machine.normalize_stream(chunks(4096), with_map=True)])),
+        ('65536', lambda: sum([len(x) for (x, _) in machine.normalize_stream(chunks(65536), with_map=True)]))
+    ])
+    for name in runs:
+        seconds = best_of(runs[name], repeat)
+        yield measurement({'chunk': name}, seconds, len(text), 'characters', memory=peak_memory(runs[name]))
+
+@benchmark
+def bench_parallel(package, scale, repeat):
+    """normalize_parallel() with pool of worker processes"""
+    machine = package.Builder().build_normalizer()
+    corpus = generate_corpus(scaled(100000, scale), 80, 1)
+    for workers in [1, 2, 4]:
+        seconds = best_of(lambda: list(machine.normalize_parallel(corpus, workers=workers, chunksize=1000)), repeat)
+        yield measurement({'workers': workers}, seconds, len(corpus), 'strings')
+
+@benchmark
+def bench_threads(package, scale, repeat):
+    """normalize_ex() on one Normalizer shared by threads, by engine"""
+    corpus = generate_corpus(scaled(10000, scale), 80, 1)
+    def run(machine, threads):
+        workers = [threading.Thread(target=lambda i: [machine.normalize_ex(x, with_map=False) for x in corpus[i::threads]], args=(i,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    machine = package.Builder().build_normalizer()
+    for engine in ['automaton', 'kernel']:
+        machine.engine = engine
+        for threads in [1, 4]:
+            seconds = best_of(lambda: run(machine, threads), repeat)
+            yield measurement({'engine': engine, 'threads': threads}, seconds, len(corpus), 'strings')
+
+@benchmark
+def bench_async(package, scale, repeat):
+    """anormalize_many() with default and process executors, and how long event loop is blocked"""
+    machine = package.Builder().build_normalizer()
+    corpus = generate_corpus(scaled(100000, scale), 80, 1)
+    async def run(executor):
+        lags, running = [], [True]
+        async def ticker():
+            while running[0]:
+                started = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - started - 0.001)
+        task = asyncio.ensure_future(ticker())
+        started = time.perf_counter()
+        async for _ in machine.anormalize_many(corpus, executor=executor, chunksize=1000):
+            pass
+        elapsed = time.perf_counter() - started
+        running[0] = False
+        await task
+        return (elapsed, max(lags) if lags else 0.0)
+    def run_loop(executor):
+        # asyncio.run() is not available in Python 3.6
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(run(executor))
+        finally:
+            loop.close()
+    for executor in [None, 'process']:
+        (seconds, lag) = min([run_loop(executor) for i in range(repeat)])
+        yield measurement({'executor': executor or 'default'}, seconds, len(corpus), 'strings', max_lag=lag)
+
+@benchmark
+def bench_implicit(package, scale, repeat):
+    """sic.normalize() with global normalizer, and with tokenizer_config"""
+    implicit = importlib.import_module('%s.implicit' % (package.__name__))
+    config = '%s/tokenizer.standard.xml' % (os.path.dirname(package.__file__))
+    implicit.build_normalizer(config)
+    corpus = generate_corpus(scaled(10000, scale), 80, 1)
+    for with_config in [False, True]:
+        kwargs = {'tokenizer_config': config} if with_config else {}
+        seconds = best_of(lambda: [implicit.normalize(x, **kwargs) for x in corpus], repeat)
+        yield measurement({'tokenizer_config': with_config}, seconds, len(corpus), 'strings')
+
+@benchmark
+def bench_cli(package, scale, repeat):
+    """python -m sic over file of lines, with one and two worker processes"""
+    cli = importlib.import_module('%s.__main__' % (package.__name__))
+    count = scaled(50000, scale)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, 'input.txt')
+        with open(filename, mode='w', encoding='utf8') as f:
+            f.write('\n'.join(generate_corpus(count, 80, 1)) + '\n')
+        for workers in [1, 2]:
+            seconds = best_of(lambda: cli.main([filename, '-q', '-o', os.devnull, '-j', str(workers)]), repeat)
+            yield measurement({'workers': workers}, seconds, count, 'lines')
+
+def result_key(result):
+    """This function returns string that identifies measurement across runs: benchmark[param=value,...]."""
+    return '%s[%s]' % (result['benchmark'], ','.join(['%s=%s' % (x, result['params'][x]) for x in sorted(result['params'])]))
+
+def load_package(name):
+    """This function imports package *name* ("sic", or "bin" with compiled modules) and returns it.
+    Compiled modules are named sic.* internally, so "bin" is also registered as "sic" for pickle
+    (and worker processes) to find them.
+    """
+    package = importlib.import_module(name)
+    if name != 'sic':
+        sys.modules['sic'] = package
+        for x in ['core', 'implicit']:
+            sys.modules['sic.%s' % (x)] = importlib.import_module('%s.%s' % (name, x))
+    return package
+
+def run_benchmarks(name, pattern, scale, repeat):
+    """This function runs benchmarks with names matching *pattern* against package *name*,
+    reports each measurement to standard error, and returns list of results.
+    """
+    package = load_package(name)
+    ret = []
+    for benchmark_name in BENCHMARKS:
+        if not re.search(pattern, benchmark_name):
+            continue
+        for result in BENCHMARKS[benchmark_name](package, scale, repeat):
+            result = OrderedDict([('benchmark', benchmark_name), ('module', name)] + sorted(result.items()))
+            result['key'] = result_key(result)
+            ret.append(result)
+            sys.stderr.write(
+                '%s %s: %.6f seconds (%s %s/s)%s\n' % (
+                    name, result['key'], result['seconds'], '%.1f' % (result['rate']) if result['rate'] is not None else '-', result['unit'],
+                    ', %.1f MB' % (result['memory'] / 1048576) if 'memory' in result else ''
                 )
             )
-        )
+            sys.stderr.flush()
+    return ret
+
+def compare(results, baseline, threshold):
+    """This function matches *results* against *baseline* (by package and measurement key), prints
+    report, and returns number of regressions: measurements that took longer (or more memory) than
+    baseline by more than *threshold* (fraction). Measurements of benchmarks that were not run are ignored.
+    """
+    stored = OrderedDict([((x['module'], x['key']), x) for x in baseline])
+    regressions = 0
+    for result in results:
+        base = stored.pop((result['module'], result['key']), None)
+        if base is None:
+            print('NEW         %s %s: %.6f seconds' % (result['module'], result['key'], result['seconds']))
+            continue
+        for (metric, unit, divisor) in [('seconds', 'seconds', 1), ('memory', 'MB', 1048576)]:
+            if metric not in result or metric not in base or base[metric] <= 0:
+                continue
+            change = result[metric] / base[metric] - 1
+            status = 'REGRESSION' if change > threshold else 'IMPROVED' if change < -threshold / (1 + threshold) else 'OK'
+            regressions += status == 'REGRESSION'
+            print('%-11s %s %s: %s %.6f -> %.6f %s (%+.1f%%)' % (status, result['module'], result['key'], metric, base[metric] / divisor, result[metric] / divisor, unit, change * 100))
+    benchmarks = set([(x['module'], x['benchmark']) for x in results])
+    for (module, key) in stored:
+        if (module, stored[(module, key)]['benchmark']) in benchmarks:
+            print('MISSING     %s %s' % (module, key))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark suite for sic.')
+    parser.add_argument('-b', '--bin', action='store_true', help='also benchmark compiled modules in ./bin')
+    parser.add_argument('--module', action='append', default=None, help='package to benchmark, "sic" or "bin" (can be repeated)')
+    parser.add_argument('--only', default='', help='regular expression selecting benchmarks to run')
+    parser.add_argument('--list', action='store_true', help='list benchmarks and exit')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier for size of inputs (default is 1.0)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs per measurement, the best one is kept (default is 3)')
+    parser.add_argument('--quick', action='store_true', help='same as --scale 0.1 --repeat 1')
+    parser.add_argument('-o', '--output', default=None, help='JSON file to write results to (standard output if not given, or "-")')
+    parser.add_argument('--results', default=None, help='JSON file with results to use instead of running benchmarks')
+    parser.add_argument('--compare', default=None, help='JSON file with baseline results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown reported as regression (default is 0.2)')
+    args = parser.parse_args(argv)
+    if args.list:
+        for name in BENCHMARKS:
+            print('%-20s %s' % (name, BENCHMARKS[name].__doc__))
+        return 0
+    if args.quick:
+        (args.scale, args.repeat) = (args.scale * 0.1, 1)
+    if args.results is not None:
+        with open(args.results, mode='r', encoding='utf8') as f:
+            report = json.load(f)
+    else:
+        modules = args.module or (['sic', 'bin'] if args.bin else ['sic'])
+        report = OrderedDict([
+            ('created', time.strftime('%Y-%m-%dT%H:%M:%S')), ('python', platform.python_version()), ('platform', platform.platform()),
+            ('cpu_count', os.cpu_count()), ('scale', args.scale), ('repeat', args.repeat), ('results', [])
+        ])
+        for module in modules:
+            if importlib.util.find_spec(module) is None:
+                sys.stderr.write('Could not import module from /%s, benchmarks skipped.\n' % (module))
+            elif len(modules) == 1:
+                report['results'] += run_benchmarks(module, args.only, args.scale, args.repeat)
+            else:
+                # every package is benchmarked in its own process, so that compiled and pure Python modules never meet
+                command = [sys.executable, os.path.abspath(__file__), '--module', module, '--only', args.only, '--scale', str(args.scale), '--repeat', str(args.repeat), '-o', '-']
+                child = subprocess.run(command, stdout=subprocess.PIPE, check=True)
+                report['results'] += json.loads(child.stdout.decode('utf8'))['results']
+        if args.output is not None and args.output != '-':
+            with open(args.output, mode='w', encoding='utf8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        elif args.compare is None or args.output == '-':
+            json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+            sys.stdout.write('\n')
+    if args.compare is not None:
+        with open(args.compare, mode='r', encoding='utf8') as f:
+            baseline = json.load(f)
+        if baseline.get('scale') != report.get('scale'):
+            print('Warning: baseline was measured with scale %s, results with scale %s' % (baseline.get('scale'), report.get('scale')))
+        regressions = compare(report['results'], baseline['results'], args.threshold)
+        print('%d regression%s found' % (regressions, '' if regressions == 1 else 's'))
+        return 1 if regressions > 0 else 0
+    return 0
 
 if __name__ == '__main__':
-    perf_normalizer_many_short_strings()
-    perf_normalizer_one_long_string()
+    sys.exit(main())
@@ -1,5 +1,14 @@
 import os
 import sys
+import pickle
+import asyncio
+import threading
+import tempfile
+import concurrent.futures
+import json
+import logging
+import importlib
+import importlib.util
 import unittest
 
 class TestNormalizer(unittest.TestCase):
@@ -73,6 +82,104 @@ class TestNormalizer(unittest.TestCase):
             ret = builder.build_normalizer('%s/%s' % (self.assets_dir, filename))
             assert type(ret) == sic.Normalizer, 'Expected Normalizer, returned %s' % str(type(ret))
 
+    def test_convert_xml_imports(self):
+        configs = {
+            'top': '<tokenizer name="top"><import file="%s" /><import file="%s" /><token to="x" from="y" /></tokenizer>',
+            'left': '<tokenizer name="left"><import file="%s" /><split where="l" value="-" /></tokenizer>',
+            'right': '<tokenizer name="right"><import file="%s" /><split where="r" value="+" /></tokenizer>',
+            'base': '<tokenizer name="base"><setting name="cs" value="0" /><character to="a" from="b" /></tokenizer>',
+            'loop': '<tokenizer name="loop"><import file="%s" /></tokenizer>'
+        }
+        filenames = {key: 'test_convert_xml_imports.%s.xml' % (key) for key in configs}
+        contents = {
+            'top': configs['top'] % (filenames['left'], filenames['right']),
+            'left': configs['left'] % (filenames['base']),
+            'right': configs['right'] % (filenames['base']),
+            'base': configs['base'],
+            'loop': configs['loop'] % (filenames['loop'])
+        }
+        for key in configs:
+            with open('%s/%s' % (self.assets_dir, filenames[key]), mode='w', encoding='utf8') as f:
+                f.write(contents[key])
+        builder = sic.Builder()
+        try:
+            data = builder.convert_xml('%s/%s' % (self.assets_dir, filenames['top']), None, '')
+            expected_rules = [('set', 'cs', '0'), ('c', 'a', 'b'), ('s', 'l', '-'), ('s', 'r', '+'), ('r', 'x', 'y')]
+            assert data['name'] == 'top', 'Expected name "top", got "%s".' % (data['name'])
+            assert list(data['rules']) == expected_rules, 'Expected rules %s, got %s.' % (str(expected_rules), str(list(data['rules'])))
+            assert len(data['loaded']) == 4, 'Expected 4 files loaded, got %d.' % (len(data['loaded']))
+            name, rules = builder.expose_tokenizer('%s/%s' % (self.assets_dir, filenames['top']))
+            expected = 'set\tcs\t0\ns\tl\t-\ns\tr\t+\nr\tx\ty\nc\ta\tb\n'
+            assert rules == expected, 'Expected "%s", got "%s".' % (expected, rules)
+            try:
+                builder.convert_xml('%s/%s' % (self.assets_dir, filenames['loop']), None, '')
+                assert False, 'Expected RecursionError for circular import.'
+            except RecursionError:
+                pass
+        finally:
+            for key in configs:
+                os.remove('%s/%s' % (self.assets_dir, filenames[key]))
+
+    def test_wrap_result(self):
+        import xml.etree.ElementTree as ElementTree
+        root = ElementTree.fromstring('<tokenizer name="test"><token to="xyz" from="abc" /><token to="xyz" from="def" /><split where="r" value="def" /><import file="other.xml" /></tokenizer>')
+        builder = sic.Builder()
+        keyhole = dict()
+        builder.wrap_result(root, 'token', keyhole, 'tokens', 'to', 'from')
+        builder.wrap_result(root, 'split', keyhole, 'splits', 'where', 'value')
+        builder.wrap_result(root, 'import', keyhole, 'imports', 'file', 'file')
+        expected = {'tokens': {'xyz': {'abc', 'def'}}, 'splits': {'r': {'def'}}, 'imports': {'other.xml': {'other.xml'}}}
+        assert expected == keyhole, 'Expected %s, got %s.' % (str(expected), str(keyhole))
+
+    def test_build_normalizer_cache(self):
+        cache_dir = '%s/test_build_normalizer_cache' % (self.assets_dir)
+        parent_filename = '%s/test_build_normalizer_cache.parent.xml' % (self.assets_dir)
+        child_filename = '%s/test_build_normalizer_cache.child.xml' % (self.assets_dir)
+        test_string = 'abc-def'
+        with open(parent_filename, mode='w', encoding='utf8') as f:
+            f.write('<tokenizer name="parent"><import file="test_build_normalizer_cache.child.xml" /><split where="r" value="def" /></tokenizer>')
+        with open(child_filename, mode='w', encoding='utf8') as f:
+            f.write('<tokenizer name="child"><token to="xyz" from="abc" /></tokenizer>')
+        builder = sic.Builder(cache_dir=cache_dir, cache_size=2)
+        def build_normalizer(endpoint):
+            with self.assertLogs(level='DEBUG') as logs:
+                logging.debug('Building normalizer')
+                normalizer = builder.build_normalizer(endpoint)
+            return (normalizer, any(['from cache' in x for x in logs.output]))
+        try:
+            (normalizer1, cached1) = build_normalizer(parent_filename)
+            (normalizer2, cached2) = build_normalizer(parent_filename)
+            assert not cached1, 'Expected trie to be freshly built.'
+            assert cached2, 'Expected trie to be loaded from cache.'
+            assert type(normalizer2.data) == dict, 'Expected trie loaded from cache to be dict, got %s.' % (str(type(normalizer2.data)))
+            assert normalizer2.compile_automaton()[0] is not None, 'Automaton is not compiled for trie loaded from cache.'
+            assert normalizer2.name == 'parent', 'Expected name "parent", got "%s".' % (normalizer2.name)
+            expected = normalizer1.normalize(test_string)
+            result = normalizer2.normalize(test_string)
+            assert expected == result, 'Expected "%s", got "%s".' % (expected, result)
+            with open(child_filename, mode='w', encoding='utf8') as f:
+                f.write('<tokenizer name="child"><token to="uvw" from="abc" /></tokenizer>')
+            (normalizer3, cached3) = build_normalizer(parent_filename)
+            assert not cached3, 'Expected changed import to invalidate cache.'
+            expected = 'uvw - def'
+            result = normalizer3.normalize(test_string)
+            assert expected == result, 'Expected "%s", got "%s".' % (expected, result)
+            model = sic.Model()
+            model.add_rule(sic.SplitToken('beta', 'lmr'))
+            builder.build_normalizer(model)
+            builder.build_normalizer(model)
+            builder.build_normalizer()
+            cached = sorted(os.listdir(cache_dir))
+            assert len(cached) == 4, 'Expected 2 cached models, got %s.' % (str(cached))
+            assert not build_normalizer(parent_filename)[1], 'Expected least recently used model to be evicted.'
+        finally:
+            for filename in os.listdir(cache_dir) if os.path.isdir(cache_dir) else []:
+                os.remove('%s/%s' % (cache_dir, filename))
+            if os.path.isdir(cache_dir):
+                os.rmdir(cache_dir)
+            os.remove(parent_filename)
+            os.remove(child_filename)
+
     def test_tokenizer_basic_ci(self):
         testcases = [
             {
@@ -727,6 +834,64 @@ class TestNormalizer(unittest.TestCase):
         for i in range(0, len(result)-1):
             assert result[i] == expected[i], 'Test case #%d: expected "%s", got "%s".' % (i, expected[i], result[i])
 
+    def test_implicit_registry(self):
+        config = '%s/tokenizer_basic_ci.xml' % (self.assets_dir)
+        registry = sic.implicit.__normalizers__
+        sic.clear()
+        assert len(registry) == 0, 'Expected empty registry, got %d normalizers.' % (len(registry))
+        hits = registry.info()['hits']
+        for i in range(3):
+            result = sic.normalize('abc,Def123ghi', tokenizer_config=config)
+            assert result == 'abc , def 123 ghi', 'Expected "abc , def 123 ghi", got "%s".' % (result)
+        assert len(registry) == 1, 'Expected 1 registered normalizer, got %d.' % (len(registry))
+        assert registry.info()['hits'] - hits == 2, 'Expected 2 registry hits, got %d.' % (registry.info()['hits'] - hits)
+        normalizer = registry.get(os.path.abspath(config))[1]
+        assert normalizer.result['normalized'] == '', 'Expected registered normalizer to keep empty result, got "%s".' % (normalizer.result['normalized'])
+        assert sic.result()['normalized'] == 'abc , def 123 ghi', 'Expected "abc , def 123 ghi", got "%s".' % (sic.result()['normalized'])
+        stat = os.stat(config)
+        os.utime(config, (stat.st_atime, stat.st_mtime + 1))
+        try:
+            sic.normalize('abc,Def123ghi', tokenizer_config=config)
+        finally:
+            os.utime(config, (stat.st_atime, stat.st_mtime))
+        assert registry.get(os.path.abspath(config))[1] is not normalizer, 'Expected modified config to be rebuilt.'
+        model = sic.Model()
+        model.add_rule(sic.ReplaceToken('bad', 'good'))
+        sic.preload(model)
+        assert len(registry) == 2, 'Expected 2 registered normalizers, got %d.' % (len(registry))
+        result = sic.normalize('so bad', tokenizer_config=model)
+        assert result == 'so good', 'Expected "so good", got "%s".' % (result)
+        sic.evict(config)
+        assert len(registry) == 1, 'Expected 1 registered normalizer, got %d.' % (len(registry))
+        sic.preload()
+        assert len(registry) == 2, 'Expected 2 registered normalizers, got %d.' % (len(registry))
+        sic.evict()
+        assert len(registry) == 1, 'Expected default normalizer to be evicted, got %d normalizers.' % (len(registry))
+        assert registry.get(str(model)) is not None, 'Expected normalizer built from sic.Model to stay registered.'
+        sic.clear()
+        assert len(registry) == 0, 'Expected empty registry, got %d normalizers.' % (len(registry))
+
+    def test_implicit_registry_imports(self):
+        parent_filename = '%s/test_implicit_registry_imports.parent.xml' % (self.assets_dir)
+        child_filename = '%s/test_implicit_registry_imports.child.xml' % (self.assets_dir)
+        with open(parent_filename, mode='w', encoding='utf8') as f:
+            f.write('<tokenizer name="parent"><import file="test_implicit_registry_imports.child.xml" /></tokenizer>')
+        with open(child_filename, mode='w', encoding='utf8') as f:
+            f.write('<tokenizer name="child"><token to="xyz" from="abc" /></tokenizer>')
+        try:
+            result = sic.normalize('abc', tokenizer_config=parent_filename)
+            assert result == 'xyz', 'Expected "xyz", got "%s".' % (result)
+            stat = os.stat(child_filename)
+            with open(child_filename, mode='w', encoding='utf8') as f:
+                f.write('<tokenizer name="child"><token to="uvw" from="abc" /></tokenizer>')
+            os.utime(child_filename, (stat.st_atime, stat.st_mtime + 1))
+            result = sic.normalize('abc', tokenizer_config=parent_filename)
+            assert result == 'uvw', 'Expected modified import to be rebuilt, got "%s".' % (result)
+        finally:
+            sic.evict(parent_filename)
+            os.remove(parent_filename)
+            os.remove(child_filename)
+
     def test_ad_hoc_model_empty(self):
         model = sic.Model()
         model.case_sensitive = False
@@ -987,12 +1152,608 @@ class TestNormalizer(unittest.TestCase):
         assert expected16 == normalized16, 'Expected "%s", got "%s".' % (expected16, normalized16)
         assert expected17 == normalized17, 'Expected "%s", got "%s".' % (expected17, normalized17)
 
+    def test_normalize_batch(self):
+        builder = sic.Builder()
+        worker = builder.build_normalizer()
+        test_strings = ['nfkappab', '', 'abc123xyzalphabetagammag', 'Acetyl(salicyllic)ac¡d,acid', 'ifngamma']
+        for option in [0, 1, 2, 3]:
+            expected = [worker.normalize(x, '|', option) for x in test_strings]
+            normalized = list(worker.normalize_batch(test_strings, '|', option))
+            assert expected == normalized, 'Option %d: expected "%s", got "%s".' % (option, str(expected), str(normalized))
+        expected_results = []
+        for x in test_strings:
+            _ = worker.normalize(x)
+            expected_results.append(dict(worker.result))
+        results = list(worker.normalize_batch(iter(test_strings), with_map=True))
+        assert expected_results == results, 'Expected "%s", got "%s".' % (str(expected_results), str(results))
+
+    def test_invalid_arguments(self):
+        builder = sic.Builder()
+        worker = builder.build_normalizer()
+        for (word_separator, control_character) in [('ab', '\x00'), ('', '\x00'), (' ', 'xx'), (' ', ' ')]:
+            self.assertRaises(AssertionError, worker.normalize, 'abc def', word_separator, 0, control_character)
+            self.assertRaises(AssertionError, worker.normalize_ex, 'abc def', word_separator, 0, control_character)
+            self.assertRaises(AssertionError, lambda: list(worker.normalize_batch(['abc def'], word_separator, 0, control_character)))
+
+    def test_normalize_without_map(self):
+        builder = sic.Builder()
+        test_strings = ['nfkappab', 'abc123xyzalphabetagammag', 'Acetyl(salicyllic)ac¡d,acid αβγ', 'original string, transformed string', 'ab(p)(p)cd']
+        for filename in self.tokenizer_filenames + ['tokenizer_replace_token.xml', 'tokenizer_bypass.xml', None]:
+            worker = builder.build_normalizer('%s/%s' % (self.assets_dir, filename) if filename else None)
+            for test_string in test_strings:
+                for option in [0, 1, 2, 3]:
+                    expected = worker.normalize(test_string, ' ', option)
+                    normalized = worker.normalize(test_string, ' ', option, with_map=False)
+                    assert expected == normalized, 'Option %d: expected "%s", got "%s".' % (option, expected, normalized)
+                    assert len(worker.result['map']) == 0 and len(worker.result['r_map']) == 0, 'Expected empty maps, got %s.' % (str(worker.result))
+        sic.build_normalizer()
+        expected = sic.normalize('nfkappab')
+        normalized = sic.normalize('nfkappab', with_map=False)
+        assert expected == normalized, 'Expected "%s", got "%s".' % (expected, normalized)
+        assert len(sic.result()['map']) == 0, 'Expected empty map, got %s.' % (str(sic.result()))
+
+    def test_normalizer_result(self):
+        builder = sic.Builder()
+        worker = builder.build_normalizer()
+        _ = worker.normalize('nfkappab')
+        result = worker.result
+        assert isinstance(result, sic.NormalizerResult), 'Expected NormalizerResult, got %s' % (str(type(result)))
+        assert result.r_map is None, 'Reverse map was computed before it was accessed.'
+        assert isinstance(result['map'], memoryview), 'Expected memoryview, got %s' % (str(type(result['map'])))
+        assert result['r_map'][7, 1] == 9, 'Expected 9, got %d.' % (result['r_map'][7, 1])
+        expected = {'original': 'nfkappab', 'normalized': 'nf kappa b', 'map': [0, 1, 7, 2, 3, 4, 5, 6, 7, 7], 'r_map': [[0, 0], [1, 1], [3, 3], [4, 4], [5, 5], [6, 6], [7, 7], [2, 9]]}
+        assert expected == result.to_dict(), 'Expected %s, got %s.' % (str(expected), str(result.to_dict()))
+        assert result == pickle.loads(pickle.dumps(result)), 'Unpickled result does not match original one.'
+        self.assertRaises(KeyError, result.__getitem__, 'unknown')
+
+    def test_normalize_ex(self):
+        builder = sic.Builder()
+        worker = builder.build_normalizer()
+        worker.set_cache(10)
+        test_strings = ['nfkappab', '', 'abc123xyzalphabetagammag', 'Acetyl(salicyllic)ac¡d,acid', 'ifngamma'] * 20
+        expected = [worker.normalize_ex(x).to_dict() for x in test_strings]
+        normalized = [None for x in test_strings]
+        _ = worker.normalize('gentamycin')
+        last_result = worker.result
+        def run(offset):
+            for i in range(offset, len(test_strings), 4):
+                normalized[i] = worker.normalize_ex(test_strings[i]).to_dict()
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert expected == normalized, 'Expected "%s", got "%s".' % (str(expected), str(normalized))
+        assert worker.result is last_result, 'normalize_ex() changed Normalizer.result.'
+        assert worker.cache_info()['length'] == 1, 'normalize_ex() used result cache.'
+        result = worker.normalize_ex('nfkappab', with_map=False)
+        assert result['normalized'] == 'nf kappa b' and len(result['map']) == 0, 'Unexpected result %s.' % (str(result))
+        result = worker.normalize_ex('nfkappab')
+        self.assertRaises(AttributeError, setattr, result, 'normalized', 'x')
+        self.assertRaises(TypeError, result['map'].__setitem__, 0, 1)
+        self.assertRaises(TypeError, result['r_map'].__setitem__, (0, 0), 1)
+        sic.build_normalizer()
+        last_result = sic.result()
+        result = sic.normalize_ex('nfkappab', '|')
+        assert result['normalized'] == 'nf|kappa|b', 'Expected "nf|kappa|b", got "%s".' % (result['normalized'])
+        assert sic.result() is last_result, 'sic.normalize_ex() changed sic.result.'
+
+    def test_normalize_columnar(self):
+        builder = sic.Builder()
+        worker = builder.build_normalizer()
+        test_strings = ['nfkappab', '', 'abc123xyzalphabetagammag', 'Acetyl(salicyllic)ac¡d,acid αβγ', 'ifngamma']
+        for option in [0, 1, 2, 3]:
+            expected = list(worker.normalize_batch(test_strings, '|', option, with_map=True))
+            result = worker.normalize_columnar(iter(test_strings), '|', option, with_map=True)
+            assert len(result) == len(test_strings), 'Expected %d strings, got %d.' % (len(test_strings), len(result))
+            assert [x['normalized'] for x in expected] == list(result), 'Expected "%s", got "%s".' % (str([x['normalized'] for x in expected]), str(list(result)))
+            for i in range(len(test_strings)):
+                assert expected[i]['map'].tolist() == result.get_map(i).tolist(), 'Expected %s, got %s.' % (str(expected[i]['map'].tolist()), str(result.get_map(i).tolist()))
+                assert expected[i]['normalized'].encode('utf8') == bytes(result.data[result.offsets[i]:result.offsets[i+1]]), 'Unexpected buffer %s.' % (str(bytes(result.data)))
+            assert result.offsets.format == 'q' and result.map_offsets.format == 'q' and result.maps.format == 'q', 'Expected 64-bit offsets and maps.'
+            assert len(result.maps) == result.map_offsets[-1], 'Expected %d items in maps, got %d.' % (result.map_offsets[-1], len(result.maps))
+        result = worker.normalize_columnar(test_strings)
+        assert result.maps is None and result.map_offsets is None, 'Expected maps not to be tracked.'
+        assert result[-1] == 'ifn gamma', 'Expected "ifn gamma", got "%s".' % (result[-1])
+        self.assertRaises(IndexError, result.__getitem__, len(test_strings))
+        self.assertRaises(ValueError, result.get_map, 0)
+        self.assertRaises(AttributeError, setattr, result, 'normalized', bytearray())
+        self.assertRaises(TypeError, result.offsets.__setitem__, 0, 1)
+        unpickled = pickle.loads(pickle.dumps(result))
+        assert list(unpickled) == list(result), 'Expected "%s", got "%s".' % (str(list(result)), str(list(unpickled)))
+        assert len(worker.normalize_columnar([])) == 0, 'Expected empty result.'
+        sic.build_normalizer()
+        result = sic.normalize_columnar(test_strings, '|')
+        assert result[0] == 'nf|kappa|b', 'Expected "nf|kappa|b", got "%s".' % (result[0])
+
+    def test_normalize_column(self):
+        worker = sic.Builder().build_normalizer()
+        column = ['nfkappab', None, 'ifngamma', 'nfkappab', 3, '', 'ifngamma'] * 5
+        for option in [0, 1, 2, 3]:
+            expected = [worker.normalize(x, '|', option) if isinstance(x, str) else x for x in column]
+            normalized = worker.normalize_column(iter(column), '|', option)
+            assert expected == normalized, 'Expected "%s", got "%s".' % (str(expected), str(normalized))
+        expected = [worker.normalize(x) if isinstance(x, str) else x for x in column]
+        normalized = worker.normalize_column(tuple(column), workers=2, chunksize=1)
+        assert expected == normalized, 'Expected "%s", got "%s".' % (str(expected), str(normalized))
+        assert worker.normalize_column([]) == [], 'Expected empty list.'
+        sic.build_normalizer()
+        normalized = sic.normalize_column(column, '|')
+        assert normalized[0] == 'nf|kappa|b', 'Expected "nf|kappa|b", got "%s".' % (normalized[0])
+
+    def test_normalize_column_pandas(self):
+        try:
+            import pandas
+        except ImportError:
+            self.skipTest('pandas is not installed')
+        worker = sic.Builder().build_normalizer()
+        values = ['nfkappab', None, 'ifngamma', 'nfkappab', 'ifngamma'] * 5
+        for dtype in [object, 'string', 'category']:
+            column = pandas.Series(values, index=range(100, 100 + len(values)), name='label', dtype=dtype)
+            normalized = worker.normalize_column(column)
+            assert normalized.index.equals(column.index) and normalized.name == 'label', 'Expected index and name of the column to be kept.'
+            assert str(normalized.dtype) == str(column.dtype), 'Expected dtype %s, got %s.' % (str(column.dtype), str(normalized.dtype))
+            assert normalized.isna().tolist() == column.isna().tolist(), 'Expected missing values to be kept.'
+            expected = [worker.normalize(x) for x in values if x is not None]
+            assert normalized.dropna().tolist() == expected, 'Expected "%s", got "%s".' % (str(expected), str(normalized.dropna().tolist()))
+
+    def test_normalize_column_arrow(self):
+        try:
+            import pyarrow
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+        worker = sic.Builder().build_normalizer()
+        values = ['nfkappab', None, 'ifngamma', 'nfkappab', 'ifngamma'] * 5
+        expected = [worker.normalize(x) if x is not None else None for x in values]
+        for column in [pyarrow.array(values), pyarrow.array(values, type=pyarrow.large_string()), pyarrow.chunked_array([values[:7], values[7:]])]:
+            normalized = worker.normalize_column(column)
+            assert type(normalized) == type(column) and normalized.type == column.type, 'Expected %s of %s, got %s of %s.' % (str(type(column)), str(column.type), str(type(normalized)), str(normalized.type))
+            assert normalized.to_pylist() == expected, 'Expected "%s", got "%s".' % (str(expected), str(normalized.to_pylist()))
+
+    def test_normalize_tokens(self):
+        worker = sic.Builder().build_normalizer()
+        test_strings = ['nfkappab', 'Alpha-2  beta, alpha-2', '  ifngamma  ', 'alpha|beta', '']
+        for test_string in test_strings:
+            for option in [0, 1, 2, 3]:
+                expected = [x for x in worker.normalize(test_string, '|', option).split('|') if x]
+                tokens = worker.normalize_tokens(test_string, '|', option)
+                assert [x[0] for x in tokens] == expected, 'Expected "%s", got "%s".' % (str(expected), str(tokens))
+                assert all([0 <= x[1] < x[2] <= len(test_string) for x in tokens]), 'Expected offsets within "%s", got "%s".' % (test_string, str(tokens))
+        expected = [('nf', 0, 2), ('kappa', 2, 7), ('b', 7, 8)]
+        tokens = worker.normalize_tokens('nfkappab')
+        assert tokens == expected, 'Expected "%s", got "%s".' % (str(expected), str(tokens))
+        expected = [('alpha', 0, 5), ('-', 5, 6), ('2', 6, 7), ('beta', 9, 13), (',', 13, 14), ('alpha', 15, 20), ('-', 20, 21), ('2', 21, 22)]
+        tokens = worker.normalize_tokens('Alpha-2  beta, alpha-2')
+        assert tokens == expected, 'Expected "%s", got "%s".' % (str(expected), str(tokens))
+        expected = [(',', 13, 14), ('-', 5, 6), ('2', 6, 7), ('alpha', 0, 5), ('beta', 9, 13)]
+        tokens = worker.normalize_tokens('Alpha-2  beta, alpha-2', normalizer_option=2)
+        assert tokens == expected, 'Expected "%s", got "%s".' % (str(expected), str(tokens))
+        (tokens, starts, ends) = worker.normalize_tokens('nfkappab', as_arrays=True)
+        assert starts.typecode == 'q' and ends.typecode == 'q', 'Expected arrays of 64-bit integers.'
+        assert (tokens, list(starts), list(ends)) == (['nf', 'kappa', 'b'], [0, 2, 7], [2, 7, 8]), 'Unexpected arrays %s, %s, %s.' % (str(tokens), str(starts), str(ends))
+        assert worker.normalize_tokens('') == [], 'Expected empty list.'
+        sic.build_normalizer()
+        tokens = sic.normalize_tokens('nfkappab')
+        assert tokens[1] == ('kappa', 2, 7), 'Expected "(\'kappa\', 2, 7)", got "%s".' % (str(tokens[1]))
+
+    def test_normalize_stream(self):
+        worker = sic.Builder().build_normalizer()
+        text = 'Acetyl(salicyllic)ac¡d,acid==alpha-labelled-base  gentamycinnn nf-bkappa ΑΣ ifngamma ' * 20
+        for option in [0, 1, 2, 3]:
+            expected = worker.normalize_ex(text, ' ', option)
+            expected_map = list(expected.f_map) if expected.f_map is not None else []
+            for size in [1, 7, 100, len(text)]:
+                chunks = [text[i:i + size] for i in range(0, len(text), size)]
+                pieces = list(worker.normalize_stream(iter(chunks), ' ', option, with_map=True))
+                normalized = ''.join([x[0] for x in pieces])
+                assert normalized == expected.normalized, 'Expected "%s", got "%s".' % (expected.normalized, normalized)
+                f_map = [y for x in pieces for y in x[1]]
+                assert f_map == expected_map, 'Expected map %s, got %s.' % (str(expected_map), str(f_map))
+                normalized = ''.join(worker.normalize_stream(chunks, ' ', option))
+                assert normalized == expected.normalized, 'Expected "%s", got "%s".' % (expected.normalized, normalized)
+        pieces = list(worker.normalize_stream(['nfkappab ', 'ifn', 'gamma ', 'x']))
+        assert pieces == ['nf kappa b', ' ifn gamma', ' x'], 'Expected "[\'nf kappa b\', \' ifn gamma\', \' x\']", got "%s".' % (str(pieces))
+        assert list(worker.normalize_stream([])) == [] and list(worker.normalize_stream(['', '  '])) == [], 'Expected no output.'
+        model = sic.Model()
+        model.add_rule(sic.ReplaceToken('alpha beta', 'ab'))
+        worker = sic.Builder().build_normalizer(model)
+        assert not worker.splits_at(' ') and worker.splits_at('|'), 'Expected text to be split at "|" but not at " ".'
+        normalized = ''.join(worker.normalize_stream(['x alpha', ' beta y']))
+        assert normalized == 'x ab y', 'Expected "x ab y", got "%s".' % (normalized)
+        sic.build_normalizer()
+        normalized = ''.join(sic.normalize_stream(['nfkap', 'pab']))
+        assert normalized == 'nf kappa b', 'Expected "nf kappa b", got "%s".' % (normalized)
+
+    def test_command_line(self):
+        cli = __import__('%s.__main__' % (sic.__name__), fromlist=['main'])
+        worker = sic.Builder().build_normalizer()
+        labels = ['nfkappab', 'IFNgamma-1  test', '', 'alpha-beta']
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_filename, output_filename = os.path.join(temp_dir, 'input'), os.path.join(temp_dir, 'output')
+            with open(input_filename, mode='w', encoding='utf8') as f:
+                f.write('\n'.join(labels) + '\n')
+            for (workers, option) in [(1, 0), (1, 3), (2, 2)]:
+                code = cli.main([input_filename, '-o', output_filename, '-q', '-j', str(workers), '-b', '3', '-n', str(option), '-w', '|'])
+                with open(output_filename, mode='r', encoding='utf8') as f:
+                    normalized = f.read().split('\n')[:-1]
+                expected = [worker.normalize(x, '|', option) for x in labels]
+                assert code == 0 and normalized == expected, 'Expected "%s", got "%s".' % (str(expected), str(normalized))
+            with open(input_filename, mode='w', encoding='utf8') as f:
+                f.write('id\tlabel\n1\tnfkappab\n2\n')
+            cli.main([input_filename, '-o', output_filename, '-q', '-f', 'tsv', '-c', '2', '--header'])
+            with open(output_filename, mode='r', encoding='utf8') as f:
+                normalized = f.read()
+            assert normalized == 'id\tlabel\n1\tnf kappa b\n2\n', 'Unexpected TSV output "%s".' % (normalized)
+            with open(input_filename, mode='w', encoding='utf8') as f:
+                f.write('{"id": 1, "label": "nfkappab"}\n{"id": 2, "label": null}\n')
+            cli.main([input_filename, '-o', output_filename, '-q', '-f', 'jsonl', '-k', 'label', '-j', '2', '-b', '1'])
+            with open(output_filename, mode='r', encoding='utf8') as f:
+                normalized = [json.loads(x) for x in f]
+            expected = [{'id': 1, 'label': 'nf kappa b'}, {'id': 2, 'label': None}]
+            assert normalized == expected, 'Expected "%s", got "%s".' % (str(expected), str(normalized))
+            with open(input_filename, mode='w', encoding='utf8') as f:
+                f.write('{"id": 1, "label": "nfkappab"}\n{"id": 2, "label": \n{"id": 3, "label": "ifngamma"}\n')
+            code = cli.main([input_filename, '-o', output_filename, '-q', '-f', 'jsonl', '-k', 'label'])
+            with open(output_filename, mode='r', encoding='utf8') as f:
+                normalized = f.read()
+            expected = '{"id": 1, "label": "nf kappa b"}\n{"id": 2, "label": \n{"id": 3, "label": "ifn gamma"}\n'
+            assert code == 0 and normalized == expected, 'Expected "%s", got "%s".' % (expected, normalized)
+
+    def test_add_remove_rules(self):
+        base_rules = [sic.SplitToken('beta', 'lmr'), sic.ReplaceToken('ab', 'xy'), sic.ReplaceToken('xy', 'zz'), sic.ReplaceCharacter('ß', 's')]
+        extra_rules = [sic.ReplaceToken('zz', 'qq'), sic.SplitToken('gamma', 'r'), sic.ReplaceCharacter('e', '3'), sic.ReplaceToken('foo', 'ab')]
+        test_strings = ['ab xy zz foo betagamma', 'abbetaxyzz', 'ßeta foo-ab', 'beta gamma zz', 'betaxgamma foo']
+        builder = sic.Builder()
+        model = sic.Model()
+        for rule in base_rules + extra_rules:
+            model.add_rule(rule)
+        expected_worker = builder.build_normalizer(model)
+        for compacted in [False, True]:
+            model = sic.Model()
+            for rule in base_rules:
+                model.add_rule(rule)
+            worker = builder.build_normalizer(model)
+            if compacted:
+                worker.compact()
+            worker.add_rules(extra_rules)
+            assert isinstance(worker.data, sic.CompactTrie) == compacted, 'Unexpected type of trie: %s' % (str(type(worker.data)))
+            for test_string in test_strings:
+                expected = expected_worker.normalize(test_string)
+                normalized = worker.normalize(test_string)
+                assert expected == normalized, 'Expected "%s", got "%s".' % (expected, normalized)
+            worker.remove_rules(''.join([rule.decode() for rule in extra_rules[:2]]))
+            model = sic.Model()
+            for rule in base_rules + extra_rules[2:]:
+                model.add_rule(rule)
+            data = worker.data.decompile() if compacted else worker.data
+            expected = builder.build_normalizer(model).data
+            assert expected == data, 'Expected %s, got %s.' % (str(expected), str(data))
+        data = worker.data.decompile()
+        self.assertRaises(RecursionError, worker.add_rules, [sic.ReplaceToken('zz', 'ab')])
+        assert data == worker.data.decompile(), 'Trie was modified by rule that failed to be added.'
+        self.assertRaises(ValueError, worker.add_rules, [sic.ReplaceCharacter('e', '4')])
+        self.assertRaises(ValueError, worker.remove_rules, [sic.ReplaceCharacter('e', '3')])
+
+    def test_merge_replacements(self):
+        worker = sic.Normalizer()
+        n = 5000
+        rules = ''.join(['r\tt%d\tt%d\n' % (i + 1, i) for i in range(n)])
+        expected = ''.join(['r\tt%d\tt%d\n' % (n, i) for i in range(n)])
+        merged = worker.merge_replacements(rules)
+        assert expected == merged, 'Unexpected resolution of long chain of replacements.'
+        with self.assertRaises(ValueError) as context:
+            worker.merge_replacements('r\tb\ta\nr\tc\tb\nr\td\tx\nr\tx\ta\n')
+        expected = 'Conflicting instruction: (replace "a" --> "b") vs (replace "a" --> "x")'
+        assert expected == str(context.exception), 'Expected "%s", got "%s".' % (expected, str(context.exception))
+        self.assertRaises(RecursionError, worker.merge_replacements, 'r\tb\ta\nr\tc\tb\nr\td\tc\nr\tc\td\n')
+        g = {'a': {'b'}, 'b': {'c'}, 'x': {'y', 'z'}, 'p': {'q'}, 'q': {'p'}}
+        expanded = [worker.expand_instruction(g, x) for x in ['a', 'b', 'c']]
+        assert expanded == [{'c'}, {'c'}, {'c'}], 'Expected [{"c"}, {"c"}, {"c"}], got %s.' % (str(expanded))
+        self.assertRaises(ValueError, worker.expand_instruction, g, 'x')
+        self.assertRaises(RecursionError, worker.expand_instruction, g, 'p')
+
+    def test_normalize_parallel(self):
+        builder = sic.Builder()
+        worker = builder.build_normalizer('%s/tokenizer_split_replace.xml' % (self.assets_dir))
+        test_strings = ['nfkappab', '', 'abc123xyzalphabetagammag', 'Acetyl(salicyllic)ac¡d,acid', 'ifngamma'] * 7
+        expected = list(worker.normalize_batch(test_strings, with_map=True))
+        normalized = list(worker.normalize_parallel(test_strings, with_map=True, workers=2, chunksize=3))
+        assert expected == normalized, 'Expected "%s", got "%s".' % (str(expected), str(normalized))
+        sic.build_normalizer()
+        expected = [sic.normalize(x, '|', 1) for x in test_strings]
+        normalized = list(sic.normalize_parallel(test_strings, '|', 1, workers=2, chunksize=4))
+        assert expected == normalized, 'Expected "%s", got "%s".' % (str(expected), str(normalized))
+
+    def test_anormalize_many(self):
+        builder = sic.Builder()
+        worker = builder.build_normalizer('%s/tokenizer_split_replace.xml' % (self.assets_dir))
+        test_strings = ['nfkappab', '', 'abc123xyzalphabetagammag', 'Acetyl(salicyllic)ac¡d,acid', 'ifngamma'] * 7
+        async def source():
+            for x in test_strings:
+                await asyncio.sleep(0)
+                yield x
+        async def collect(results, limit=None):
+            ret = []
+            try:
+                async for result in results:
+                    ret.append(result)
+                    if limit is not None and len(ret) == limit:
+                        break
+            finally:
+                await results.aclose()
+            return ret
+        def run(coroutine):
+            # asyncio.run() is not available in Python 3.6
+            loop = asyncio.new_event_loop()
+            try:
+                return loop.run_until_complete(coroutine)
+            finally:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.close()
+        expected = list(worker.normalize_batch(test_strings, with_map=True))
+        for executor in [None, 'thread', 'process']:
+            normalized = run(collect(worker.anormalize_many(test_strings, with_map=True, executor=executor, workers=2, chunksize=3, max_pending=2)))
+            assert expected == normalized, 'Executor %s: expected "%s", got "%s".' % (executor, str(expected), str(normalized))
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            temp_filenames = set(os.listdir(tempfile.gettempdir()))
+            normalized = run(collect(worker.anormalize_many(test_strings, with_map=True, executor=executor, chunksize=3)))
+            assert expected == normalized, 'Process pool: expected "%s", got "%s".' % (str(expected), str(normalized))
+            worker.compact()
+            worker.save('%s/test_anormalize_many.bin' % (self.assets_dir))
+            mapped_worker = sic.Normalizer(worker.name)
+            mapped_worker.load('%s/test_anormalize_many.bin' % (self.assets_dir), mapped=True)
+            normalized = run(collect(mapped_worker.anormalize_many(test_strings, with_map=True, executor=executor, chunksize=3)))
+            mapped_worker.data = dict()
+            os.remove('%s/test_anormalize_many.bin' % (self.assets_dir))
+            assert expected == normalized, 'Process pool, memory-mapped trie: expected "%s", got "%s".' % (str(expected), str(normalized))
+            assert temp_filenames == set(os.listdir(tempfile.gettempdir())), 'Expected temporary model files to be removed.'
+        normalized = run(collect(worker.anormalize_many(source(), with_map=True, chunksize=4, max_pending=1)))
+        assert expected == normalized, 'Expected "%s", got "%s".' % (str(expected), str(normalized))
+        normalized = run(collect(worker.anormalize_many(source(), with_map=True, chunksize=2), limit=5))
+        assert expected[:5] == normalized, 'Expected "%s", got "%s".' % (str(expected[:5]), str(normalized))
+        self.assertRaises(AssertionError, worker.anormalize_many, test_strings, 'xx')
+        self.assertRaises(AssertionError, worker.anormalize_many, test_strings, chunksize=0)
+        self.assertRaises(AssertionError, worker.anormalize_many, test_strings, max_pending=0)
+        self.assertRaises(AssertionError, worker.anormalize_many, test_strings, executor='pool')
+        sic.build_normalizer()
+        expected = [sic.normalize(x, '|', 1) for x in test_strings]
+        normalized = run(collect(sic.anormalize_many(test_strings, '|', 1, chunksize=4)))
+        assert expected == normalized, 'Expected "%s", got "%s".' % (str(expected), str(normalized))
+
+    def test_automaton_engine(self):
+        model = sic.Model()
+        model.add_rule(sic.SplitToken('aaaaab', 'lmr'))
+        model.add_rule(sic.SplitToken('aac', 'r'))
+        model.add_rule(sic.ReplaceToken('aab', 'x y'))
+        model.add_rule(sic.ReplaceToken('caa', 'z'))
+        builder = sic.Builder()
+        workers = [
+            builder.build_normalizer(model),
+            builder.build_normalizer('%s/tokenizer_split_replace.xml' % (self.assets_dir)),
+            builder.build_normalizer()
+        ]
+        fragments = ['a', 'A', 'aa', 'aaaa', 'b', 'c', 'ab', 'aab', 'caa', ' ', '-', '1', 'nf', 'kappa', 'alpha', 'beta', 'gentamycin', 'Ë']
+        test_strings = []
+        for i in range(300):
+            test_strings.append(''.join([fragments[(i * 7 + j * j * 13) % len(fragments)] for j in range(i % 17 + 1)]))
+        for worker in workers:
+            legacy = sic.Normalizer(worker.name, engine='trie')
+            legacy.data = worker.data
+            for test_string in test_strings:
+                for option in [0, 1, 2, 3]:
+                    expected = legacy.normalize(test_string, ' ', option)
+                    normalized = worker.normalize(test_string, ' ', option)
+                    assert expected == normalized, 'Option %d: "%s" => expected "%s", got "%s".' % (option, test_string, expected, normalized)
+                    assert legacy.result == worker.result, 'Option %d: "%s" => expected %s, got %s.' % (option, test_string, str(legacy.result), str(worker.result))
+
+    def test_kernel_engine(self):
+        builder = sic.Builder()
+        workers = [
+            builder.build_normalizer('%s/tokenizer_split_replace.xml' % (self.assets_dir)),
+            builder.build_normalizer('%s/tokenizer_expanded.xml' % (self.assets_dir)),
+            builder.build_normalizer()
+        ]
+        fragments = ['a', 'A', 'aa', 'b', 'c', 'ab', ' ', '-', '1', 'nf', 'kappa', 'Alpha', 'beta', 'gentamycin', 'Ë', '(p)', 'αβγ', ',']
+        test_strings = []
+        for i in range(300):
+            test_strings.append(''.join([fragments[(i * 7 + j * j * 13) % len(fragments)] for j in range(i % 17 + 1)]))
+        for worker in workers:
+            legacy = sic.Normalizer(worker.name, engine='trie')
+            legacy.data = worker.data
+            kernel_workers = [sic.Normalizer(worker.name, engine='kernel'), sic.Normalizer(worker.name, engine='kernel')]
+            kernel_workers[0].data = worker.data
+            kernel_workers[1].data = worker.data
+            kernel_workers[1].compact()
+            for kernel_worker in kernel_workers:
+                for test_string in test_strings:
+                    for option in [0, 1, 2, 3]:
+                        expected = legacy.normalize_ex(test_string, ' ', option)
+                        result = kernel_worker.normalize_ex(test_string, ' ', option)
+                        assert expected == result, 'Option %d: "%s" => expected %s, got %s.' % (option, test_string, str(expected), str(result))
+                        result = kernel_worker.normalize_ex(test_string, ' ', option, with_map=False)
+                        assert expected.normalized == result.normalized, 'Option %d: "%s" => expected "%s", got "%s".' % (option, test_string, expected.normalized, result.normalized)
+        worker = workers[2]
+        worker.engine = 'kernel'
+        assert worker.normalize('nfkappab') == 'nf kappa b', 'Expected "nf kappa b", got "%s".' % (worker.normalize('nfkappab'))
+        worker.add_rules([sic.ReplaceToken('kappa', 'k')])
+        assert worker.normalize('nfkappab') == 'nf k b', 'Expected "nf k b", got "%s".' % (worker.normalize('nfkappab'))
+
+    def test_char_classes(self):
+        model = sic.Model()
+        for rule in [sic.ReplaceCharacter('1', 'x'), sic.ReplaceCharacter('𝔘', 'u'), sic.ReplaceCharacter('ä', 'ae'), sic.SplitToken('ux', 'lr'), sic.ReplaceToken('aeb', 'q')]:
+            model.add_rule(rule)
+        worker = sic.Builder().build_normalizer(model)
+        table = worker.char_classes
+        assert len(table) == 0x10000, 'Expected table of %d classes, got %d.' % (0x10000, len(table))
+        for x in ['a', 'Z', 'ß', 'σ', '2', '٣', ' ', '-', '\x00', '¡']:
+            assert table[ord(x)] == worker.chargroup(x), 'Character "%s": expected class %d, got %d.' % (x, worker.chargroup(x), table[ord(x)])
+        for (x, expected) in [('1', 5), ('ä', 5)]:
+            assert table[ord(x)] == expected, 'Character "%s": expected class %d, got %d.' % (x, expected, table[ord(x)])
+        expected = [('a1b', 'axb', [0, 1, 2]), ('a2b', 'a 2 b', [0, 1, 1, 2, 2]), ('x𝔘1y', 'xuxy', [0, 1, 2, 3]), ('käb', 'kaeb', [0, 1, 1, 2]), ('Käb 𝟙2', 'kaeb 𝟙2', [0, 1, 1, 2, 3, 4, 5]), ('𝔘𝔘', 'uu', [0, 1])]
+        for (test_string, expected_string, expected_map) in expected:
+            normalized = worker.normalize(test_string)
+            assert expected_string == normalized, 'Expected "%s", got "%s".' % (expected_string, normalized)
+            assert expected_map == list(worker.result['map']), 'Expected %s, got %s.' % (str(expected_map), str(list(worker.result['map'])))
+        worker.data = worker.data
+        assert worker.char_classes is None, 'Expected character classes to be reset.'
+        worker.normalize('a1b')
+        assert worker.char_classes == table, 'Expected character classes to be compiled again.'
+
+    def test_compact_trie(self):
+        builder = sic.Builder()
+        test_strings = ['nfkappab', 'abc123xyzalphabetagammag', 'Acetyl(salicyllic)ac¡d,acid αβγ', 'original string, transformed string', 'ab(p)(p)cd']
+        for filename in self.tokenizer_filenames + ['tokenizer_replace_token.xml', 'tokenizer_expanded.xml', None]:
+            worker = builder.build_normalizer('%s/%s' % (self.assets_dir, filename) if filename else None)
+            compact_worker = sic.Normalizer(worker.name)
+            compact_worker.data = worker.data
+            compact_worker.compact()
+            assert isinstance(compact_worker.data, sic.CompactTrie), 'Expected CompactTrie, got %s' % (str(type(compact_worker.data)))
+            assert compact_worker.data.decompile() == worker.data, 'Decompiled trie does not match original one for %s.' % (filename)
+            for test_string in test_strings:
+                for option in [0, 1, 2, 3]:
+                    expected = worker.normalize(test_string, ' ', option)
+                    normalized = compact_worker.normalize(test_string, ' ', option)
+                    assert expected == normalized, 'Option %d: expected "%s", got "%s".' % (option, expected, normalized)
+                    assert worker.result == compact_worker.result, 'Option %d: expected %s, got %s.' % (option, str(worker.result), str(compact_worker.result))
+        compact_worker = builder.build_normalizer('%s/tokenizer_replace_token.xml' % (self.assets_dir))
+        compact_worker.compact()
+        compact_worker.make_tokenizer(sic.ReplaceCharacter('t', 'n').decode(), update=True)
+        assert isinstance(compact_worker.data, sic.CompactTrie), 'Expected CompactTrie, got %s' % (str(type(compact_worker.data)))
+        expected = 'transformed snring , nransformed snring'
+        normalized = compact_worker.normalize('original string, transformed string')
+        assert expected == normalized, 'Expected "%s", got "%s".' % (expected, normalized)
+
+    def test_save_load_model_formats(self):
+        test_strings = ['original string, transformed string', 'nfkappab αβγ', 'ab(p)(p)cd']
+        model_path = '%s/test_save_load_model_formats.bin' % (self.assets_dir)
+        builder = sic.Builder()
+        normalizer1 = builder.build_normalizer('%s/tokenizer_split_replace.xml' % (self.assets_dir))
+        expected = [normalizer1.normalize(x) for x in test_strings]
+        normalizer1.save(model_path, pickled=True)
+        normalizer2 = sic.Normalizer()
+        normalizer2.load(model_path)
+        assert normalizer2.data == normalizer1.data, 'Pickled trie does not match original one.'
+        normalizer2.compact()
+        normalizer2.save(model_path)
+        normalizer3 = sic.Normalizer()
+        normalizer3.load(model_path, mapped=True)
+        assert isinstance(normalizer3.data, sic.CompactTrie), 'Expected CompactTrie, got %s' % (str(type(normalizer3.data)))
+        normalized3 = [normalizer3.normalize(x) for x in test_strings]
+        normalized4 = list(normalizer3.normalize_parallel(test_strings, workers=2, chunksize=1))
+        assert normalizer3.data.decompile() == normalizer1.data, 'Memory-mapped trie does not match original one.'
+        normalizer3.data = dict()
+        with open(model_path, mode='r+b') as f:
+            f.seek(4)
+            f.write(b'\xff')
+        self.assertRaises(ValueError, sic.Normalizer().load, model_path)
+        os.remove(model_path)
+        assert expected == normalized3, 'Expected "%s", got "%s".' % (str(expected), str(normalized3))
+        assert expected == normalized4, 'Expected "%s", got "%s".' % (str(expected), str(normalized4))
+
+    def test_save_load_keeps_engine(self):
+        test_strings = ['original string, transformed string', 'nfkappab αβγ', 'ab(p)(p)cd']
+        model_path = '%s/test_save_load_keeps_engine.bin' % (self.assets_dir)
+        builder = sic.Builder()
+        normalizer1 = builder.build_normalizer('%s/tokenizer_split_replace.xml' % (self.assets_dir))
+        expected = [normalizer1.normalize(x) for x in test_strings]
+        normalizer1.save(model_path)
+        normalizer2 = sic.Normalizer()
+        normalizer2.load(model_path)
+        os.remove(model_path)
+        assert isinstance(normalizer2.data, dict), 'Expected dict, got %s' % (str(type(normalizer2.data)))
+        assert normalizer2.data == normalizer1.data, 'Loaded trie does not match original one.'
+        assert normalizer2.compile_automaton()[0] is not None, 'Automaton is not compiled for loaded trie.'
+        normalized = [normalizer2.normalize(x) for x in test_strings]
+        assert expected == normalized, 'Expected "%s", got "%s".' % (str(expected), str(normalized))
+
+    def test_result_cache(self):
+        test_strings = ['original string, transformed string', 'nfkappab αβγ', 'original string, transformed string', 'ab(p)(p)cd', 'nfkappab αβγ']
+        builder = sic.Builder()
+        worker = builder.build_normalizer('%s/tokenizer_split_replace.xml' % (self.assets_dir))
+        cached_worker = sic.Normalizer(worker.name, cache_size=2)
+        cached_worker.data = worker.data
+        for test_string in test_strings:
+            for option in [0, 1, 3]:
+                expected = worker.normalize(test_string, ' ', option)
+                normalized = cached_worker.normalize(test_string, ' ', option)
+                assert expected == normalized, 'Option %d: expected "%s", got "%s".' % (option, expected, normalized)
+                assert worker.result == cached_worker.result, 'Option %d: expected %s, got %s.' % (option, str(worker.result), str(cached_worker.result))
+                normalized = cached_worker.normalize(test_string, ' ', option)
+                assert expected == normalized, 'Option %d: expected "%s", got "%s".' % (option, expected, normalized)
+                assert worker.result == cached_worker.result, 'Option %d: expected %s, got %s.' % (option, str(worker.result), str(cached_worker.result))
+        info = cached_worker.cache_info()
+        expected = {'size': 2, 'policy': 'lru', 'length': 2, 'hits': 15, 'misses': 15, 'evictions': 13}
+        assert expected == info, 'Expected %s, got %s.' % (str(expected), str(info))
+        cached_worker.make_tokenizer(sic.ReplaceCharacter('t', 'n').decode(), update=True)
+        assert cached_worker.cache_info()['length'] == 0, 'Cache was not invalidated by make_tokenizer().'
+        expected = 'original snring , nransformed snring'
+        normalized = cached_worker.normalize('original string, transformed string')
+        assert expected == normalized, 'Expected "%s", got "%s".' % (expected, normalized)
+        cached_worker.data = worker.data
+        assert cached_worker.cache_info()['length'] == 0, 'Cache was not invalidated by data setter.'
+        cached_worker.set_cache(2, 'fifo')
+        for test_string in ['a', 'b', 'a', 'c', 'a']:
+            cached_worker.normalize(test_string)
+        info = cached_worker.cache_info()
+        expected = {'size': 2, 'policy': 'fifo', 'length': 2, 'hits': 1, 'misses': 4, 'evictions': 2}
+        assert expected == info, 'Expected %s, got %s.' % (str(expected), str(info))
+        cached_worker.set_cache(0)
+        assert cached_worker.cache_info() is None, 'Expected None, got %s.' % (str(cached_worker.cache_info()))
+        self.assertRaises(AssertionError, cached_worker.set_cache, 2, 'random')
+
+    def test_instrumentation(self):
+        rules = 'set\tcs\t0\nr\tbeta\tb\ns\tlr\tnf\nr\tX\taaab\n'
+        worker = sic.Normalizer(engine='trie')
+        worker.make_tokenizer(rules)
+        assert worker.stats() is None, 'Expected None, got %s.' % (str(worker.stats()))
+        test_strings = {'nfkb b': [6, 4, 0, 1, 1], 'aaaab': [8, 7, 1, 0, 0], 'aaac': [9, 6, 2, 0, 0]}
+        for test_string in test_strings:
+            counters = [0, 0, 0, 0, 0]
+            worker.normalize_ex(test_string, counters=counters)
+            assert test_strings[test_string] == counters, 'String "%s": expected %s, got %s.' % (test_string, str(test_strings[test_string]), str(counters))
+        for engine in ['automaton', 'kernel']:
+            engine_worker = sic.Normalizer(engine=engine)
+            engine_worker.make_tokenizer(rules)
+            for test_string in test_strings:
+                counters = [0, 0, 0, 0, 0]
+                engine_worker.normalize_ex(test_string, counters=counters)
+                assert test_strings[test_string][2:] == counters[2:], 'Engine "%s", string "%s": expected %s, got %s.' % (engine, test_string, str(test_strings[test_string][2:]), str(counters[2:]))
+                assert len(test_string) <= counters[0] <= test_strings[test_string][0], 'Engine "%s", string "%s": %d characters read.' % (engine, test_string, counters[0])
+        calls = []
+        worker.set_cache(3)
+        worker.set_instrumentation(callback=lambda source_string, metrics: calls.append((source_string, metrics)), slowest=2)
+        for test_string in list(test_strings) + ['nfkb b', '']:
+            worker.normalize(test_string)
+        stats = worker.stats(reset=True)
+        expected = {'calls': 5, 'cached': 1, 'characters': 23, 'steps': 17, 'backtracks': 3, 'replacements': 1, 'splits': 1}
+        actual = {x: stats[x] for x in expected}
+        assert expected == actual, 'Expected %s, got %s.' % (str(expected), str(actual))
+        assert 0 < stats['p50'] <= stats['p99'] <= stats['max'] <= stats['seconds'], 'Latency percentiles are inconsistent: %s.' % (str(stats))
+        assert sum([x[2] for x in stats['histogram']]) == 5, 'Expected 5 calls in histogram, got %s.' % (str(stats['histogram']))
+        assert len(stats['slowest']) == 2 and stats['slowest'][0]['seconds'] >= stats['slowest'][1]['seconds'], 'Expected 2 slowest inputs, got %s.' % (str(stats['slowest']))
+        slowest = stats['slowest'][0]
+        expected = (' ', 0, '\x00', True)
+        actual = (slowest['word_separator'], slowest['normalizer_option'], slowest['control_character'], slowest['with_map'])
+        assert slowest['source_string'] in test_strings and expected == actual, 'Unexpected slowest input: %s.' % (str(slowest))
+        assert len(calls) == 5 and calls[0][0] == 'nfkb b' and calls[0][1]['replacements'] == 1 and calls[3][1]['cached'], 'Unexpected callback calls: %s.' % (str(calls))
+        assert worker.stats()['calls'] == 0, 'Expected metrics to be reset, got %s.' % (str(worker.stats()))
+        worker.set_instrumentation(False)
+        assert worker.stats() is None, 'Expected None, got %s.' % (str(worker.stats()))
+        self.assertRaises(AssertionError, worker.set_instrumentation, True, 'not callable')
+
 if __name__ == '__main__':
     sys.path.insert(0, '')
     import sic # pylint: disable=E0611,F0401
     unittest.main(exit=False)
-    try:
-        import bin as sic # pylint: disable=E0611,F0401
+    if os.path.isfile('bin/__init__.py'):
+        # compiled modules are named sic.* internally, so compiled package is imported as sic in place of pure Python one:
+        # its modules then import each other, and pickle (and worker processes) find them, under that name
+        for x in [x for x in sys.modules if x == 'sic' or x.startswith('sic.')]:
+            del sys.modules[x]
+        spec = importlib.util.spec_from_file_location('sic', 'bin/__init__.py', submodule_search_locations=['bin'])
+        sic = importlib.util.module_from_spec(spec)
+        sys.modules['sic'] = sic
+        spec.loader.exec_module(sic)
         unittest.main()
-    except ModuleNotFoundError:
+    else:
         print('Could not import module from /bin, test skipped.')